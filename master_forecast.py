@@ -4,30 +4,31 @@ MASTER FORECAST TOOL - Institutional-Grade 3-Year Analysis
 Combines ROIC.ai, Finviz Elite, Polygon, and FRED data
 """
 
-from openbb import obb
 import os
 from datetime import datetime
 import requests
 
+from roic_data_sources import get_data_source
+from roic_scoring import implied_growth, moat_rating, quality_label
+from roic_statement_store import fetch_statement
+
 # Set all API keys
 os.environ['ROIC_API_KEY'] = 'a365bff224a6419fac064dd52e1f80d9'
 os.environ['FINVIZ_API_KEY'] = 'be56a0a4-c7b3-4094-85b6-0ad5a3b49fc6'
 os.environ['POLYGON_API_KEY'] = 'Po4bGB8fz_u3AA9TNkwt5CAeUnSLarai'
 os.environ['FRED_API_KEY'] = '7c26de454d31a77bfdf9aaa33f2f55a8'
-
-obb.user.credentials.finviz_api_key = 'be56a0a4-c7b3-4094-85b6-0ad5a3b49fc6'
-obb.user.credentials.polygon_api_key = 'Po4bGB8fz_u3AA9TNkwt5CAeUnSLarai'
-obb.user.credentials.fred_api_key = '7c26de454d31a77bfdf9aaa33f2f55a8'
+# OpenBBDataSource copies these keys into obb.user.credentials on first use
 
 def calculate_roic(symbol):
     """Calculate Return on Invested Capital"""
     try:
-        income = obb.equity.fundamental.income(symbol=symbol, provider='yfinance')
-        balance = obb.equity.fundamental.balance(symbol=symbol, provider='yfinance')
+        # Statements come from the local store until a new filing is due
+        income = fetch_statement(symbol, 'income')
+        balance = fetch_statement(symbol, 'balance')
         
-        if income and income.results and balance and balance.results:
-            latest_income = income.results[0]
-            latest_balance = balance.results[0]
+        if income and balance:
+            latest_income = income[0]
+            latest_balance = balance[0]
             
             if hasattr(latest_income, 'operating_income') and hasattr(latest_balance, 'total_assets'):
                 nopat = latest_income.operating_income * 0.75  # Assume 25% tax
@@ -41,22 +42,17 @@ def calculate_roic(symbol):
         pass
     return None
 
+# Printed description per moat rating
+MOAT_DESCRIPTIONS = {
+    "Wide": "WIDE (Sustainable advantage)",
+    "Narrow": "NARROW (Some advantage)",
+    "None": "NONE (Commodity business)",
+}
+
 def get_quality_rating(roic):
     """Determine quality rating based on ROIC"""
-    if roic is None:
-        return "N/A", 10  # Default growth rate
-    elif roic > 30:
-        return "⭐⭐⭐⭐⭐ Exceptional", 18
-    elif roic > 20:
-        return "⭐⭐⭐⭐⭐ Excellent", 15
-    elif roic > 15:
-        return "⭐⭐⭐⭐ Very Good", 12
-    elif roic > 10:
-        return "⭐⭐⭐ Good", 10
-    elif roic > 5:
-        return "⭐⭐ Fair", 7
-    else:
-        return "⭐ Poor", 5
+    # Growth defaults to 10% when ROIC is unknown
+    return quality_label(roic), implied_growth(roic, default=10)
 
 def master_forecast(symbol):
     """Generate comprehensive 3-year forecast using all data sources"""
@@ -68,25 +64,27 @@ def master_forecast(symbol):
     print(f"Data Sources: ROIC.ai | Finviz Elite | Polygon | FRED")
     print('='*90)
     
+    source = get_data_source()
+    
     # 1. CURRENT MARKET DATA (Polygon/Yahoo)
     current_price = None
     market_cap = None
     
     try:
-        quote = obb.equity.price.quote(symbol=symbol, provider='polygon')
-        if quote and quote.results:
-            current_price = quote.results[0].last_price
+        quote = source.quote(symbol, provider='polygon')
+        if quote:
+            current_price = quote[0].last_price
             print(f"\n📊 CURRENT MARKET DATA (Polygon)")
             print("-"*60)
             print(f"Stock Price: ${current_price:.2f}")
             
-            if hasattr(quote.results[0], 'change_percent'):
-                print(f"Today's Change: {quote.results[0].change_percent:.2f}%")
+            if hasattr(quote[0], 'change_percent'):
+                print(f"Today's Change: {quote[0].change_percent:.2f}%")
     except:
         try:
-            quote = obb.equity.price.quote(symbol=symbol, provider='yfinance')
-            if quote and quote.results:
-                current_price = quote.results[0].last_price
+            quote = source.quote(symbol, provider='yfinance')
+            if quote:
+                current_price = quote[0].last_price
                 print(f"\n📊 CURRENT MARKET DATA")
                 print("-"*60)
                 print(f"Stock Price: ${current_price:.2f}")
@@ -95,10 +93,10 @@ def master_forecast(symbol):
     
     # Get market cap
     try:
-        profile = obb.equity.profile(symbol=symbol, provider='yfinance')
-        if profile and profile.results:
-            if hasattr(profile.results[0], 'market_cap'):
-                market_cap = profile.results[0].market_cap
+        profile = source.profile(symbol, provider='yfinance')
+        if profile:
+            if hasattr(profile[0], 'market_cap'):
+                market_cap = profile[0].market_cap
                 print(f"Market Cap: ${market_cap/1e9:.1f}B")
     except:
         pass
@@ -116,12 +114,7 @@ def master_forecast(symbol):
         print(f"Implied Growth Potential: {quality_growth}% annually")
         
         # Competitive advantage assessment
-        if roic > 20:
-            print("Competitive Moat: WIDE (Sustainable advantage)")
-        elif roic > 15:
-            print("Competitive Moat: NARROW (Some advantage)")
-        else:
-            print("Competitive Moat: NONE (Commodity business)")
+        print(f"Competitive Moat: {MOAT_DESCRIPTIONS[moat_rating(roic)]}")
     
     # 3. ANALYST TARGETS (Finviz Elite)
     analyst_target = None
@@ -129,9 +122,9 @@ def master_forecast(symbol):
     print("-"*60)
     
     try:
-        target_data = obb.equity.estimates.price_target(symbol=symbol, provider='finviz')
-        if target_data and target_data.results:
-            latest = target_data.results[0]
+        target_data = source.price_target(symbol, provider='finviz')
+        if target_data:
+            latest = target_data[0]
             
             if hasattr(latest, 'adj_price_target'):
                 analyst_target = latest.adj_price_target
@@ -155,9 +148,9 @@ def master_forecast(symbol):
     
     try:
         # Get VIX for market volatility
-        vix = obb.economy.fred_series(symbol='VIXCLS', provider='fred')
-        if vix and vix.results:
-            vix_value = getattr(vix.results[-1], 'VIXCLS', None)
+        vix = source.fred_series('VIXCLS', provider='fred')
+        if vix:
+            vix_value = getattr(vix[-1], 'VIXCLS', None)
             if vix_value:
                 print(f"Market Volatility (VIX): {vix_value:.1f}")
                 if vix_value < 15:
@@ -168,9 +161,9 @@ def master_forecast(symbol):
                     print("  → High volatility (caution)")
         
         # Get 10-Year Treasury
-        treasury = obb.economy.fred_series(symbol='DGS10', provider='fred')
-        if treasury and treasury.results:
-            rate = getattr(treasury.results[-1], 'DGS10', None)
+        treasury = source.fred_series('DGS10', provider='fred')
+        if treasury:
+            rate = getattr(treasury[-1], 'DGS10', None)
             if rate:
                 print(f"10-Year Treasury: {rate:.2f}%")
                 print(f"  → Risk-free alternative return")
@@ -185,12 +178,12 @@ def master_forecast(symbol):
     earnings_growth = None
     
     try:
-        income = obb.equity.fundamental.income(symbol=symbol, provider='yfinance')
-        if income and income.results and len(income.results) >= 2:
+        income = fetch_statement(symbol, 'income')
+        if income and len(income) >= 2:
             revenues = []
             earnings = []
             
-            for stmt in income.results[:3]:
+            for stmt in income[:3]:
                 if hasattr(stmt, 'total_revenue') and stmt.total_revenue:
                     revenues.append(stmt.total_revenue)
                 if hasattr(stmt, 'net_income') and stmt.net_income:
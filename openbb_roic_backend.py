@@ -6,12 +6,14 @@ Similar to OpenBB Platform Pro Backend but for ROIC integration
 Inspired by: https://github.com/OpenBB-finance/openbb-platform-pro-backend
 """
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 import uvicorn
+import asyncio
 import json
 import os
 import sys
@@ -20,22 +22,32 @@ import sys
 sys.path.insert(0, '/Users/sdg223157/OPBB')
 sys.path.insert(0, '/Users/sdg223157/OPBB/openbb_roic_provider_package')
 
-from openbb import obb
 from openbb_roic_provider import roic_provider
+from roic_concurrency import bounded_as_completed
+from roic_encoding import CompressionMiddleware, FastJSONResponse, dumps
+from roic_http_cache import ResponseCacheMiddleware, http_cache_stats, widget_cache_rules
+from roic_prewarm import PrewarmScheduler, Watchlist
+from roic_push import PushHub
+from roic_results import MEDIA_TYPES
+from roic_scoring import combined_score
+from roic_statement_store import DEFAULT_CACHE_DIR
+from roic_telemetry import MetricsMiddleware, add_collector, metrics_response
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the watchlist prewarm scheduler alongside the server"""
+    if os.environ.get('ROIC_PREWARM', '1').lower() not in ('0', 'false', 'no'):
+        await prewarm.start()
+    yield
+    push.close_all()
+    await prewarm.stop()
 
 app = FastAPI(
     title="OpenBB ROIC Backend",
     description="Professional backend for ROIC quality metrics integrated with OpenBB Platform",
-    version="1.0.0"
-)
-
-# Add CORS middleware to allow OpenBB frontend connections
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins for development
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 class AnalysisRequest(BaseModel):
@@ -44,10 +56,27 @@ class AnalysisRequest(BaseModel):
     provider: Optional[str] = "roic"
     include_openbb: Optional[bool] = True
 
+class WatchlistRequest(BaseModel):
+    """Request model for watchlist admin endpoints"""
+    symbols: List[str]
+
+class BatchMetricsRequest(BaseModel):
+    """Request model for the batch metrics endpoint"""
+    symbols: List[str]
+    format: Optional[str] = "json"
+
 class ComparisonRequest(BaseModel):
     """Request model for comparison endpoints"""
     symbols: List[str]
     metrics: Optional[List[str]] = ["roic", "quality_score", "pe_ratio"]
+    stream: Optional[bool] = False
+
+# Compare limits: symbols per request and analyses in flight at once
+MAX_COMPARE_SYMBOLS = int(os.environ.get('ROIC_MAX_COMPARE_SYMBOLS', '500'))
+COMPARE_CONCURRENCY = int(os.environ.get('ROIC_COMPARE_CONCURRENCY', '32'))
+
+# Symbols per batch metrics request
+MAX_BATCH_SYMBOLS = int(os.environ.get('ROIC_MAX_BATCH_SYMBOLS', '2000'))
 
 # Widget configuration for Terminal Pro style interface
 WIDGETS_CONFIG = {
@@ -56,7 +85,7 @@ WIDGETS_CONFIG = {
         "type": "table",
         "endpoint": "/api/v1/roic/metrics",
         "refresh_rate": 300,
-        "columns": ["symbol", "roic", "quality_score", "moat_rating"]
+        "columns": ["symbol", "roic", "quality_score", "moat_rating", "roic_5y_avg", "roic_trend"]
     },
     "roic_forecast": {
         "title": "Quality-Based Forecast",
@@ -73,6 +102,55 @@ WIDGETS_CONFIG = {
     }
 }
 
+# Widget endpoints are served from a response cache for one refresh
+# interval, with ETag/Cache-Control so pollers can revalidate for free.
+# Added before CORS so cached responses still get CORS headers.
+app.add_middleware(ResponseCacheMiddleware, rules=widget_cache_rules(WIDGETS_CONFIG))
+
+# Watchlist symbols are refreshed through the app ahead of their
+# widget refresh_rate expiry, so interactive requests hit warm caches.
+# With several workers only the one holding the lock refreshes the watchlist.
+prewarm = PrewarmScheduler(
+    app, widget_cache_rules(WIDGETS_CONFIG), Watchlist.from_env(),
+    lock_path=os.path.join(DEFAULT_CACHE_DIR, "prewarm.lock")
+)
+
+# Subscribers get widget deltas pushed when a recomputed response changes
+push = PushHub(app, WIDGETS_CONFIG, prewarm)
+
+# Add CORS middleware to allow OpenBB frontend connections
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Allow all origins for development
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Outside the response cache, so cached bodies stay uncompressed for
+# push deltas and are encoded per client Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so latency includes cache hits and CORS handling
+app.add_middleware(MetricsMiddleware, app_name="backend", router=app.router)
+
+def _collect_metrics():
+    """Scrape-time /metrics families for prewarm and push subscribers"""
+    stats = prewarm.stats()
+    yield ("roic_prewarm_refreshes_total", "counter", "Watchlist refreshes by outcome", [
+        ({"result": "ok"}, stats["refreshed"]), ({"result": "failed"}, stats["failed"])
+    ])
+    yield ("roic_prewarm_in_flight", "gauge", "Prewarm refreshes running", [({}, stats["in_flight"])])
+    yield ("roic_prewarm_scheduled", "gauge", "Widget/symbol pairs kept warm", [({}, stats["scheduled"])])
+    push_stats = push.stats()
+    yield ("roic_push_clients", "gauge", "Open SSE/WebSocket subscriptions", [({}, push_stats["clients"])])
+    yield ("roic_push_events_total", "counter", "Recomputed widget values by outcome", [
+        ({"result": "published"}, push_stats["published"]),
+        ({"result": "unchanged"}, push_stats["unchanged"])
+    ])
+
+add_collector(_collect_metrics)
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -83,9 +161,13 @@ async def root():
         "endpoints": {
             "widgets": "/widgets.json",
             "roic_metrics": "/api/v1/roic/metrics/{symbol}",
+            "roic_metrics_batch": "/api/v1/roic/metrics/batch?symbols=AAPL,MSFT&format=arrow",
             "roic_forecast": "/api/v1/roic/forecast/{symbol}",
             "complete_analysis": "/api/v1/analysis/complete/{symbol}",
             "compare": "/api/v1/analysis/compare",
+            "stream": "/api/v1/stream?symbols=AAPL,MSFT",
+            "websocket": "/api/v1/ws",
+            "metrics": "/metrics",
             "openapi": "/docs"
         },
         "powered_by": {
@@ -118,16 +200,67 @@ async def get_apps():
             }]
         })
 
+def _negotiate_format(accept: Optional[str]) -> str:
+    """Batch format from an Accept header, JSON unless Arrow/Parquet is asked for"""
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        for fmt, candidate in MEDIA_TYPES.items():
+            if media_type == candidate:
+                return fmt
+    return "json"
+
+async def _metrics_batch_response(symbols: List[str], fmt: str, cacheable: bool) -> Response:
+    """Score many symbols in one request and encode them column-wise"""
+    symbols = roic_provider.normalize_symbols(symbols)
+    if not symbols:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many symbols ({len(symbols)}); the limit is {MAX_BATCH_SYMBOLS}"
+        )
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{fmt}', use one of {', '.join(MEDIA_TYPES)}")
+
+    batch, errors = await roic_provider.aget_metrics_batch(symbols)
+    try:
+        body, media_type = batch.serialize(fmt, errors)
+    except ImportError:
+        raise HTTPException(status_code=406, detail=f"pyarrow is required for {fmt} output")
+
+    headers = {"X-ROIC-Symbols": str(len(batch)), "X-ROIC-Errors": str(len(errors))}
+    if not cacheable:
+        # Format came from Accept, which the response cache does not key on
+        headers["Cache-Control"] = "no-store"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+# Declared before /metrics/{symbol} so "batch" is not taken for a symbol
+@app.get("/api/v1/roic/metrics/batch")
+async def get_roic_metrics_batch(symbols: str, format: Optional[str] = None,
+                                 accept: Optional[str] = Header(None)):
+    """
+    ROIC metrics for many symbols in one response
+    symbols is comma separated; format is arrow, parquet or json
+    (column-oriented), taken from the Accept header when omitted.
+    """
+    fmt = format.lower() if format else _negotiate_format(accept)
+    return await _metrics_batch_response(symbols.split(","), fmt, cacheable=format is not None)
+
+@app.post("/api/v1/roic/metrics/batch")
+async def post_roic_metrics_batch(request: BatchMetricsRequest):
+    """ROIC metrics for a symbol list too long for a query string"""
+    return await _metrics_batch_response(request.symbols, (request.format or "json").lower(), cacheable=False)
+
 @app.get("/api/v1/roic/metrics/{symbol}")
 async def get_roic_metrics(symbol: str):
     """Get ROIC quality metrics for a symbol"""
     try:
-        metrics = roic_provider.get_metrics(symbol.upper())
-        return {
+        metrics = await roic_provider.aget_metrics(symbol.upper())
+        return FastJSONResponse({
             "symbol": symbol.upper(),
             "data": metrics,
             "provider": "roic"
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -135,19 +268,30 @@ async def get_roic_metrics(symbol: str):
 async def get_roic_forecast(symbol: str, years: int = 3):
     """Get quality-based forecast for a symbol"""
     try:
-        forecast = roic_provider.get_forecast(symbol.upper())
-        return {
+        forecast = await roic_provider.aget_forecast(symbol.upper())
+        return FastJSONResponse({
             "symbol": symbol.upper(),
             "years": years,
             "data": forecast,
             "provider": "roic"
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/analysis/complete/{symbol}")
 async def get_complete_analysis(symbol: str):
     """Get combined OpenBB + ROIC analysis"""
+    return FastJSONResponse(await _complete_analysis(symbol))
+
+async def _complete_analysis(symbol: str) -> Dict[str, Any]:
+    """Combined analysis for one symbol"""
+    # Widgets opening together share one computation per symbol
+    return await roic_provider.singleflight.do(
+        ("complete", symbol.upper()), _compute_complete_analysis, symbol
+    )
+
+async def _compute_complete_analysis(symbol: str):
+    """Build the combined OpenBB + ROIC analysis for one symbol"""
     try:
         result = {
             "symbol": symbol.upper(),
@@ -156,11 +300,19 @@ async def get_complete_analysis(symbol: str):
             "combined_score": None
         }
         
+        # OpenBB key metrics and the ROIC data are fetched concurrently on
+        # the upstream worker pools; the event loop only awaits them
+        key_metrics = asyncio.ensure_future(roic_provider.aget_key_metrics(symbol))
+        # Forecast reuses the in-flight metrics fetch
+        roic_data = asyncio.gather(
+            roic_provider.aget_metrics(symbol.upper()),
+            roic_provider.aget_forecast(symbol.upper())
+        )
+        
         # Get OpenBB data
         try:
-            metrics = obb.equity.fundamental.metrics(symbol=symbol, provider='yfinance')
-            if metrics.results:
-                data = metrics.results[0]
+            data = await key_metrics
+            if data:
                 result["openbb"] = {
                     "pe_ratio": getattr(data, 'pe_ratio', None),
                     "market_cap": getattr(data, 'market_cap', None),
@@ -173,8 +325,7 @@ async def get_complete_analysis(symbol: str):
         
         # Get ROIC data
         try:
-            roic_metrics = roic_provider.get_metrics(symbol.upper())
-            roic_forecast = roic_provider.get_forecast(symbol.upper())
+            roic_metrics, roic_forecast = await roic_data
             
             result["roic"] = {
                 "roic": roic_metrics.get("roic"),
@@ -186,15 +337,10 @@ async def get_complete_analysis(symbol: str):
             
             # Calculate combined score
             if result["roic"]["quality_score"] and result["openbb"].get("pe_ratio"):
-                # Simple combined scoring: Quality vs Valuation
-                quality = result["roic"]["quality_score"]
-                pe = result["openbb"]["pe_ratio"]
-                
-                # Normalize P/E (lower is better, cap at 50)
-                pe_score = max(0, 100 - (pe * 2)) if pe and pe > 0 else 50
-                
                 # Combined score weighted 60% quality, 40% valuation
-                result["combined_score"] = (quality * 0.6 + pe_score * 0.4)
+                result["combined_score"] = combined_score(
+                    result["roic"]["quality_score"], result["openbb"]["pe_ratio"]
+                )
         except:
             pass
         
@@ -203,34 +349,65 @@ async def get_complete_analysis(symbol: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _comparison_row(symbol: str, analysis: Any) -> Dict[str, Any]:
+    """One compare row from a complete analysis (or the error it raised)"""
+    if isinstance(analysis, Exception):
+        detail = getattr(analysis, "detail", None) or str(analysis)
+        return {"symbol": symbol, "combined_score": None, "error": str(detail)[:200]}
+    return {
+        "symbol": symbol,
+        "roic": analysis["roic"].get("roic"),
+        "quality_score": analysis["roic"].get("quality_score"),
+        "pe_ratio": analysis["openbb"].get("pe_ratio"),
+        "market_cap": analysis["openbb"].get("market_cap"),
+        "combined_score": analysis.get("combined_score")
+    }
+
+def _comparison_ranking(results: List[Dict[str, Any]], metrics: List[str]) -> Dict[str, Any]:
+    """Final compare body, sorted by combined score"""
+    results.sort(key=lambda x: x.get("combined_score") or 0, reverse=True)
+    return {
+        "comparison": results,
+        "best_overall": results[0]["symbol"] if results else None,
+        "metrics_used": metrics
+    }
+
+async def _stream_comparison(rows, metrics: List[str]):
+    """NDJSON: one row per symbol as it finishes, then the ranking"""
+    results = []
+    async for symbol, analysis in rows:
+        row = _comparison_row(symbol, analysis)
+        results.append(row)
+        yield dumps({"type": "row", **row}) + b"\n"
+    yield dumps({"type": "ranking", **_comparison_ranking(results, metrics)}) + b"\n"
+
 @app.post("/api/v1/analysis/compare")
-async def compare_stocks(request: ComparisonRequest):
-    """Compare multiple stocks across OpenBB and ROIC metrics"""
+async def compare_stocks(request: ComparisonRequest, http_request: Request):
+    """
+    Compare multiple stocks across OpenBB and ROIC metrics
+    
+    Symbols are analysed concurrently (COMPARE_CONCURRENCY at a time).
+    Send "stream": true or Accept: application/x-ndjson to receive rows
+    as they finish, followed by the final ranking.
+    """
+    symbols = roic_provider.normalize_symbols(request.symbols)
+    if len(symbols) > MAX_COMPARE_SYMBOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many symbols: {len(symbols)} (max {MAX_COMPARE_SYMBOLS})"
+        )
+    
+    rows = bounded_as_completed(_complete_analysis, symbols, COMPARE_CONCURRENCY)
+    
+    if request.stream or "application/x-ndjson" in http_request.headers.get("accept", ""):
+        return StreamingResponse(
+            _stream_comparison(rows, request.metrics),
+            media_type="application/x-ndjson"
+        )
+    
     try:
-        results = []
-        
-        for symbol in request.symbols[:10]:  # Limit to 10 symbols
-            analysis = await get_complete_analysis(symbol)
-            
-            comparison_data = {
-                "symbol": symbol.upper(),
-                "roic": analysis["roic"].get("roic"),
-                "quality_score": analysis["roic"].get("quality_score"),
-                "pe_ratio": analysis["openbb"].get("pe_ratio"),
-                "market_cap": analysis["openbb"].get("market_cap"),
-                "combined_score": analysis.get("combined_score")
-            }
-            
-            results.append(comparison_data)
-        
-        # Sort by combined score
-        results.sort(key=lambda x: x.get("combined_score") or 0, reverse=True)
-        
-        return {
-            "comparison": results,
-            "best_overall": results[0]["symbol"] if results else None,
-            "metrics_used": request.metrics
-        }
+        results = [_comparison_row(symbol, analysis) async for symbol, analysis in rows]
+        return FastJSONResponse(_comparison_ranking(results, request.metrics))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -244,15 +421,148 @@ async def get_providers():
         "integrated": True
     }
 
+@app.get("/api/v1/stats")
+async def get_stats():
+    """Provider cache, ROIC.ai client, request-coalescing and HTTP cache counters"""
+    stats = roic_provider.stats()
+    stats["http_cache"] = http_cache_stats()
+    stats["prewarm"] = prewarm.stats()
+    stats["push"] = push.stats()
+    return stats
+
+# ============= Push: widget updates =============
+
+@app.get("/api/v1/stream")
+async def stream_widget_updates(symbols: str, widgets: Optional[str] = None):
+    """
+    Server-sent events for widget updates
+    symbols and widgets are comma separated (widgets defaults to all).
+    Sends one "snapshot" event per widget/symbol, then "delta" events
+    holding only the fields that changed.
+    """
+    subscription = push.open()
+    try:
+        await push.subscribe(subscription, symbols.split(","), widgets.split(",") if widgets else None)
+    except ValueError as e:
+        push.close(subscription)
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        push.sse(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/v1/ws")
+async def widget_updates_ws(websocket: WebSocket):
+    """
+    WebSocket widget updates
+    Client messages: {"action": "subscribe" | "unsubscribe", "symbols": [...],
+    "widgets": [...]}; server messages are the same events as the SSE stream.
+    """
+    await websocket.accept()
+    subscription = push.open()
+
+    async def receive_commands():
+        while True:
+            message = await websocket.receive_json()
+            action = message.get("action", "subscribe")
+            try:
+                if action == "subscribe":
+                    await push.subscribe(subscription, message.get("symbols", []), message.get("widgets"))
+                elif action == "unsubscribe":
+                    push.unsubscribe(subscription, message.get("symbols"), message.get("widgets"))
+                else:
+                    raise ValueError(f"Unknown action: {action}")
+            except ValueError as e:
+                # Sent by the writer loop so sends never interleave
+                subscription.offer("error", {"type": "error", "detail": str(e)})
+
+    reader = asyncio.ensure_future(receive_commands())
+    reader.add_done_callback(lambda _: subscription.close())
+    try:
+        while not subscription.closed:
+            events = await subscription.next_events(timeout=push.heartbeat)
+            if not events and not subscription.closed:
+                await websocket.send_json({"type": "heartbeat"})
+            for event in events:
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        push.close(subscription)
+
+# ============= Admin: watchlist prewarm =============
+
+def _check_admin(token: Optional[str]):
+    """Admin endpoints require X-Admin-Token when ROIC_ADMIN_TOKEN is set"""
+    expected = os.environ.get('ROIC_ADMIN_TOKEN')
+    if expected and token != expected:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    # Another worker may have saved changes since this one last looked
+    prewarm.watchlist.reload_if_changed()
+
+def _check_watchlist_size(symbols: List[str]):
+    """Every watchlist symbol is polled upstream, so the list is capped like /compare"""
+    if len(symbols) > MAX_COMPARE_SYMBOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many watchlist symbols: {len(symbols)} (max {MAX_COMPARE_SYMBOLS})"
+        )
+
+def _watchlist_response() -> Dict[str, Any]:
+    return {"symbols": prewarm.watchlist.symbols(), "prewarm": prewarm.stats()}
+
+@app.get("/api/v1/admin/watchlist")
+async def get_watchlist(x_admin_token: Optional[str] = Header(None)):
+    """Watchlist symbols and prewarm scheduler status"""
+    _check_admin(x_admin_token)
+    return _watchlist_response()
+
+@app.post("/api/v1/admin/watchlist")
+async def add_to_watchlist(request: WatchlistRequest, x_admin_token: Optional[str] = Header(None)):
+    """Add symbols to the watchlist; they are warmed right away"""
+    _check_admin(x_admin_token)
+    _check_watchlist_size(roic_provider.normalize_symbols(prewarm.watchlist.symbols() + list(request.symbols)))
+    prewarm.watchlist.add(request.symbols)
+    prewarm.watchlist.save()
+    prewarm.notify()
+    return _watchlist_response()
+
+@app.put("/api/v1/admin/watchlist")
+async def replace_watchlist(request: WatchlistRequest, x_admin_token: Optional[str] = Header(None)):
+    """Replace the whole watchlist"""
+    _check_admin(x_admin_token)
+    _check_watchlist_size(roic_provider.normalize_symbols(request.symbols))
+    prewarm.watchlist.replace(request.symbols)
+    prewarm.watchlist.save()
+    prewarm.notify()
+    return _watchlist_response()
+
+@app.delete("/api/v1/admin/watchlist/{symbol}")
+async def remove_from_watchlist(symbol: str, x_admin_token: Optional[str] = Header(None)):
+    """Stop prewarming a symbol"""
+    _check_admin(x_admin_token)
+    if not prewarm.watchlist.remove(symbol):
+        raise HTTPException(status_code=404, detail=f"{symbol.upper()} is not on the watchlist")
+    prewarm.watchlist.save()
+    return _watchlist_response()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "OpenBB ROIC Backend"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: route latency, upstream latency/errors, caches, pools"""
+    return metrics_response()
+
 def main():
     """Launch the backend server"""
     host = os.getenv("OPENBB_API_HOST", "127.0.0.1")
     port = int(os.getenv("OPENBB_API_PORT", "8000"))
+    workers = int(os.getenv("ROIC_WORKERS", "1"))
     
     print(f"""
 ╔════════════════════════════════════════════════════════╗
@@ -267,7 +577,15 @@ def main():
 ╚════════════════════════════════════════════════════════╝
     """)
     
-    uvicorn.run(app, host=host, port=port)
+    if workers > 1:
+        if os.getenv("ROIC_CACHE_BACKEND", "memory") == "memory":
+            print("⚠️  ROIC_WORKERS > 1 with the memory cache backend: each worker keeps its own "
+                  "cache and rate limits. Set ROIC_CACHE_BACKEND=sqlite or redis://... to share them.")
+        # Workers import the app by name, so each builds its own instance
+        uvicorn.run("openbb_roic_backend:app", host=host, port=port, workers=workers,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    else:
+        uvicorn.run(app, host=host, port=port)
 
 if __name__ == "__main__":
     main()
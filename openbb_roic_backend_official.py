@@ -4,11 +4,12 @@ OpenBB ROIC Backend - Official Pattern
 Following the structure from https://github.com/OpenBB-finance/backends-for-openbb
 """
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Dict, Any, List
-import json
+import asyncio
 import os
 import sys
 
@@ -22,18 +23,56 @@ except:
     # Fallback if provider not available
     roic_provider = None
 
-# Import OpenBB
+from roic_concurrency import bounded_as_completed, run_upstream
+from roic_encoding import CompressionMiddleware, FastJSONResponse, dumps
+from roic_http_cache import ResponseCacheMiddleware
+from roic_scanner import RANKINGS, MarketScanner
+from roic_scoring import combined_score
+from roic_telemetry import MetricsMiddleware, add_collector, metrics_response
+
+# Market data source (OpenBB or offline fixtures, see ROIC_DATA_SOURCE)
 try:
-    from openbb import obb
+    from roic_data_sources import get_data_source
+    data_source = get_data_source()
 except:
-    obb = None
+    data_source = None
+
+# Universe scan behind /market/movers (see ROIC_SCAN_UNIVERSE). Opt-in
+# with ROIC_SCAN=1: every pass fetches forecasts and quotes for the whole
+# universe, which should not start just because the server did.
+scanner = MarketScanner(roic_provider) if roic_provider else None
+SCAN_ENABLED = os.environ.get('ROIC_SCAN', '0').lower() not in ('0', 'false', 'no', '')
+if scanner:
+    add_collector(scanner.collect_metrics)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the market scanner alongside the server"""
+    if scanner and SCAN_ENABLED:
+        await scanner.start()
+    yield
+    if scanner:
+        await scanner.stop()
 
 app = FastAPI(
     title="ROIC Backend for OpenBB",
     description="Quality metrics backend following OpenBB official patterns",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# Seconds each data route is served from the response cache; matches the
+# refresh rates of the corresponding widgets. /market/movers is not
+# listed: it is answered from the scanner's in-memory rankings.
+CACHE_TTLS = {
+    "/roic/metrics": 300,
+    "/roic/forecast": 600,
+    "/analysis/complete": 300,
+}
+# Added before CORS so cached responses still get CORS headers
+app.add_middleware(ResponseCacheMiddleware, rules=CACHE_TTLS)
+
 # CORS configuration - REQUIRED for OpenBB Workspace
 app.add_middleware(
     CORSMiddleware,
@@ -43,10 +82,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outside the response cache, so cached bodies are stored once and
+# encoded per client Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so latency includes cache hits and CORS handling
+app.add_middleware(MetricsMiddleware, app_name="backend_official", router=app.router)
+
 # Load widgets configuration
 WIDGETS_FILE = os.path.join(os.path.dirname(__file__), "widgets.json")
 APPS_FILE = os.path.join(os.path.dirname(__file__), "apps.json")
 
+# Compare limits: symbols per request and rows computed at once
+MAX_COMPARE_SYMBOLS = int(os.getenv("ROIC_MAX_COMPARE_SYMBOLS", "500"))
+COMPARE_CONCURRENCY = int(os.getenv("ROIC_COMPARE_CONCURRENCY", "32"))
+
 @app.get("/")
 async def root():
     """Root endpoint - provides backend information"""
@@ -60,7 +110,8 @@ async def root():
             "/roic/metrics?symbol=AAPL",
             "/roic/forecast?symbol=AAPL",
             "/analysis/complete?symbol=AAPL",
-            "/health"
+            "/health",
+            "/metrics"
         ]
     }
 
@@ -95,8 +146,16 @@ async def health():
     """Health check endpoint"""
     return {"status": "healthy", "service": "ROIC Backend"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: route latency, upstream latency/errors, caches, pools"""
+    return metrics_response()
+
 # ============= Data Endpoints =============
 
+# Table cell for the ROIC trend label of the metrics provider
+TREND_ARROWS = {"Improving": "↑", "Stable": "→", "Declining": "↓"}
+
 @app.get("/roic/metrics")
 async def get_roic_metrics(symbol: str):
     """Get ROIC metrics - returns data in OpenBB format"""
@@ -104,18 +163,19 @@ async def get_roic_metrics(symbol: str):
         return {"error": "ROIC provider not available"}
     
     try:
-        metrics = roic_provider.get_metrics(symbol.upper())
+        metrics = await roic_provider.aget_metrics(symbol.upper())
         
         # Format for OpenBB Workspace table widget
-        return {
+        return FastJSONResponse({
             "data": [{
                 "Symbol": symbol.upper(),
                 "ROIC %": metrics.get("roic", 0),
                 "Quality Score": metrics.get("quality_score", 0),
                 "Moat Rating": metrics.get("moat_rating", "N/A"),
-                "Trend": "↑" if metrics.get("roic", 0) > 20 else "↓"
+                "5Y Avg ROIC %": metrics.get("roic_5y_avg"),
+                "Trend": TREND_ARROWS.get(metrics.get("roic_trend"), "N/A")
             }]
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -126,7 +186,7 @@ async def get_roic_forecast(symbol: str, years: int = 3):
         return {"error": "ROIC provider not available"}
     
     try:
-        forecast = roic_provider.get_forecast(symbol.upper())
+        forecast = await roic_provider.aget_forecast(symbol.upper())
         
         # Format for OpenBB Workspace chart widget
         chart_data = []
@@ -160,7 +220,7 @@ async def get_roic_forecast(symbol: str, years: int = 3):
                 "quality_score": forecast.get("roic", 50)
             })
         
-        return {"data": chart_data}
+        return FastJSONResponse({"data": chart_data})
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -170,6 +230,28 @@ async def get_complete_analysis(symbol: str):
     """Combined analysis - OpenBB + ROIC data"""
     symbol = symbol.upper()
     
+    if roic_provider:
+        # Concurrent requests for the same symbol share one computation
+        return FastJSONResponse(await roic_provider.singleflight.do(
+            ("complete_official", symbol), _compute_complete_analysis, symbol
+        ))
+    return FastJSONResponse(await _compute_complete_analysis(symbol))
+
+async def _key_metrics(symbol: str):
+    """
+    Latest OpenBB key metrics row, fetched on the yfinance worker pool
+    Goes through the provider so concurrent requests share one fetch
+    """
+    if roic_provider:
+        return await roic_provider.aget_key_metrics(symbol)
+    data = await run_upstream("yfinance", data_source.key_metrics, symbol, provider='yfinance')
+    return data[0] if data else None
+
+async def _compute_complete_analysis(symbol: str):
+    """Build the combined analysis row for one symbol"""
+    # OpenBB data is fetched while the ROIC data below is computed
+    key_metrics = asyncio.ensure_future(_key_metrics(symbol)) if data_source else None
+    
     result = {
         "Symbol": symbol,
         "ROIC %": None,
@@ -182,8 +264,10 @@ async def get_complete_analysis(symbol: str):
     # Get ROIC data
     if roic_provider:
         try:
-            metrics = roic_provider.get_metrics(symbol)
-            forecast = roic_provider.get_forecast(symbol)
+            metrics, forecast = await asyncio.gather(
+                roic_provider.aget_metrics(symbol),
+                roic_provider.aget_forecast(symbol)
+            )
             
             result["ROIC %"] = metrics.get("roic")
             result["Quality Score"] = metrics.get("quality_score")
@@ -192,79 +276,133 @@ async def get_complete_analysis(symbol: str):
             pass
     
     # Get OpenBB data
-    if obb:
+    if key_metrics:
         try:
-            data = obb.equity.fundamental.metrics(symbol=symbol, provider='yfinance')
-            if data.results:
-                result["P/E Ratio"] = getattr(data.results[0], 'pe_ratio', None)
-                result["Market Cap"] = getattr(data.results[0], 'market_cap', None)
+            data = await key_metrics
+            if data:
+                result["P/E Ratio"] = getattr(data, 'pe_ratio', None)
+                result["Market Cap"] = getattr(data, 'market_cap', None)
         except:
             pass
     
     return result
 
+async def _compare_row(symbol: str) -> Dict[str, Any]:
+    """ROIC, quality, P/E and combined score for one symbol"""
+    # P/E lookup runs while the ROIC metrics are fetched
+    key_metrics = asyncio.ensure_future(_key_metrics(symbol)) if data_source else None
+    
+    row = {
+        "Symbol": symbol,
+        "ROIC %": None,
+        "Quality": None,
+        "P/E": None
+    }
+    
+    # Get ROIC data
+    if roic_provider:
+        try:
+            metrics = await roic_provider.aget_metrics(symbol)
+            row["ROIC %"] = round(metrics.get("roic", 0), 1)
+            row["Quality"] = metrics.get("quality_score", 0)
+        except:
+            pass
+    
+    # Get P/E from OpenBB
+    if key_metrics:
+        try:
+            data = await key_metrics
+            if data:
+                row["P/E"] = getattr(data, 'pe_ratio', None)
+        except:
+            pass
+    
+    # Calculate combined score
+    if row["ROIC %"] and row["P/E"]:
+        quality = row.get("Quality", 50)
+        row["Score"] = round(combined_score(quality, row["P/E"]), 1)
+    
+    return row
+
+def _ranked(comparison_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sort by score"""
+    comparison_data.sort(key=lambda x: x.get("Score", 0), reverse=True)
+    return {"comparison": comparison_data}
+
+async def _stream_compare(rows):
+    """NDJSON rows as they finish, then the ranked comparison"""
+    comparison_data = []
+    async for symbol, row in rows:
+        if isinstance(row, Exception):
+            row = {"Symbol": symbol, "error": str(row)[:200]}
+        comparison_data.append(row)
+        yield dumps({"type": "row", **row}) + b"\n"
+    yield dumps({"type": "ranking", **_ranked(comparison_data)}) + b"\n"
+
 @app.post("/analysis/compare")
-async def compare_stocks(request: Dict[str, Any]):
-    """Compare multiple stocks"""
+async def compare_stocks(request: Dict[str, Any], http_request: Request):
+    """
+    Compare multiple stocks
+    Rows are computed concurrently; pass "stream": true (or
+    Accept: application/x-ndjson) to stream them as they finish
+    """
     symbols = request.get("symbols", [])
     
     if not symbols:
         return {"comparison": [], "error": "No symbols provided"}
     
-    comparison_data = []
+    symbols = roic_provider.normalize_symbols(symbols) if roic_provider else \
+        list(dict.fromkeys(s.upper() for s in symbols))
+    if len(symbols) > MAX_COMPARE_SYMBOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many symbols: {len(symbols)} (max {MAX_COMPARE_SYMBOLS})"
+        )
     
-    for symbol in symbols[:10]:  # Limit to 10 symbols
-        symbol = symbol.upper()
-        row = {
-            "Symbol": symbol,
-            "ROIC %": None,
-            "Quality": None,
-            "P/E": None
-        }
-        
-        # Get ROIC data
-        if roic_provider:
-            try:
-                metrics = roic_provider.get_metrics(symbol)
-                row["ROIC %"] = round(metrics.get("roic", 0), 1)
-                row["Quality"] = metrics.get("quality_score", 0)
-            except:
-                pass
-        
-        # Get P/E from OpenBB
-        if obb:
-            try:
-                data = obb.equity.fundamental.metrics(symbol=symbol, provider='yfinance')
-                if data.results:
-                    row["P/E"] = getattr(data.results[0], 'pe_ratio', None)
-            except:
-                pass
-        
-        # Calculate combined score
-        if row["ROIC %"] and row["P/E"]:
-            quality = row.get("Quality", 50)
-            pe_score = max(0, 100 - (row["P/E"] * 2)) if row["P/E"] else 50
-            row["Score"] = round((quality * 0.6 + pe_score * 0.4), 1)
-        
-        comparison_data.append(row)
+    rows = bounded_as_completed(_compare_row, symbols, COMPARE_CONCURRENCY)
     
-    # Sort by score
-    comparison_data.sort(key=lambda x: x.get("Score", 0), reverse=True)
+    if request.get("stream") or "application/x-ndjson" in http_request.headers.get("accept", ""):
+        return StreamingResponse(_stream_compare(rows), media_type="application/x-ndjson")
     
-    return {"comparison": comparison_data}
+    comparison_data = [
+        row if not isinstance(row, Exception) else {"Symbol": symbol, "error": str(row)[:200]}
+        async for symbol, row in rows
+    ]
+    return FastJSONResponse(_ranked(comparison_data))
 
 @app.get("/market/movers")
-async def get_market_movers():
-    """Get top ROIC quality stocks"""
-    # Example movers - in production would scan market
+async def get_market_movers(by: str = "quality", limit: int = 10, order: str = "desc"):
+    """
+    Top stocks of the scanned universe
+    by: quality, roic, change (gainers; order=asc for losers) or upside
+    (1-year target upside weighted by quality score)
+    """
+    if by not in RANKINGS:
+        raise HTTPException(status_code=400, detail=f"by must be one of: {', '.join(RANKINGS)}")
+    if not scanner:
+        raise HTTPException(status_code=503, detail="ROIC provider not available")
+    if not SCAN_ENABLED:
+        raise HTTPException(status_code=503, detail="Market scanner is disabled (set ROIC_SCAN=1)")
+
+    limit = max(1, min(limit, len(scanner.universe) or 1))
     movers = [
-        {"Symbol": "AAPL", "ROIC %": 51.5, "Quality": 95, "Change": "+2.3%"},
-        {"Symbol": "MSFT", "ROIC %": 20.2, "Quality": 85, "Change": "+1.8%"},
-        {"Symbol": "GOOGL", "ROIC %": 18.7, "Quality": 82, "Change": "-0.5%"},
-        {"Symbol": "NVDA", "ROIC %": 42.3, "Quality": 92, "Change": "+5.2%"},
+        {
+            "Symbol": row.symbol,
+            "ROIC %": round(row.roic, 2) if row.roic is not None else None,
+            "Quality": round(row.quality_score) if row.quality_score is not None else None,
+            "Change": f"{row.change_percent:+.1f}%" if row.change_percent is not None else None,
+            "Price": round(row.price, 2) if row.price is not None else None,
+            "Upside %": round(row.upside, 1) if row.upside is not None else None
+        }
+        for row in scanner.top(by, limit, ascending=order.lower() == "asc")
     ]
-    
-    return {"movers": movers}
+    return FastJSONResponse({
+        "movers": movers,
+        "by": by,
+        "universe": len(scanner.universe),
+        "scanned": len(scanner.rows),
+        "warming": scanner.passes == 0
+    })
 
 def main():
     """Launch the backend server"""
@@ -9,20 +9,26 @@ from fastapi.responses import JSONResponse
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 import uvicorn
+import asyncio
 import sys
 import os
 
 # Add ROIC provider to path
 sys.path.insert(0, '/Users/sdg223157/OPBB')
 from openbb_roic_provider import roic_provider
-from openbb import obb
+from roic_encoding import FastJSONResponse
+from roic_telemetry import MetricsMiddleware, metrics_response
 
 app = FastAPI(
     title="OpenBB ROIC MCP Server",
     description="MCP-compatible server for ROIC quality metrics in OpenBB Workspace",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
+# Per-route latency and in-flight requests for /metrics
+app.add_middleware(MetricsMiddleware, app_name="mcp", router=app.router)
+
 # MCP Tool definitions
 MCP_TOOLS = {
     "roic_quality": {
@@ -89,6 +95,9 @@ MCP_TOOLS = {
     }
 }
 
+# Max symbols accepted by roic_compare
+MAX_COMPARE_SYMBOLS = 50
+
 class MCPRequest(BaseModel):
     """MCP protocol request"""
     method: str
@@ -124,7 +133,7 @@ async def call_tool(request: MCPRequest):
     try:
         if tool_name == "roic_quality":
             symbol = tool_args.get("symbol", "").upper()
-            metrics = roic_provider.get_metrics(symbol)
+            metrics = await roic_provider.aget_metrics(symbol)
             return {
                 "content": [
                     {
@@ -140,7 +149,7 @@ async def call_tool(request: MCPRequest):
         elif tool_name == "roic_forecast":
             symbol = tool_args.get("symbol", "").upper()
             years = tool_args.get("years", 3)
-            forecast = roic_provider.get_forecast(symbol)
+            forecast = await roic_provider.aget_forecast(symbol)
             
             text = f"Quality-Based Forecast for {symbol}:\n"
             if years >= 1 and forecast.get("1_year_target"):
@@ -155,16 +164,18 @@ async def call_tool(request: MCPRequest):
             }
             
         elif tool_name == "roic_compare":
-            symbols = tool_args.get("symbols", [])
+            symbols = roic_provider.normalize_symbols(tool_args.get("symbols", []))
             results = []
             
-            for symbol in symbols[:5]:  # Limit to 5 symbols
-                symbol = symbol.upper()
-                metrics = roic_provider.get_metrics(symbol)
+            # One batched, concurrency-limited fetch for all symbols
+            batch, errors = await roic_provider.aget_metrics_batch(symbols[:MAX_COMPARE_SYMBOLS])
+            for row in batch:
+                if row.symbol in errors:
+                    continue
                 results.append({
-                    "symbol": symbol,
-                    "roic": metrics.get("roic", 0),
-                    "quality": metrics.get("quality_score", 0)
+                    "symbol": row.symbol,
+                    "roic": row.roic or 0,
+                    "quality": row.quality_score or 0
                 })
             
             # Sort by quality score
@@ -172,7 +183,7 @@ async def call_tool(request: MCPRequest):
             
             text = "ROIC Comparison:\n"
             for r in results:
-                text += f"• {r['symbol']}: ROIC {r['roic']:.1f}%, Quality {r['quality']}/100\n"
+                text += f"• {r['symbol']}: ROIC {r['roic']:.1f}%, Quality {r['quality']:.0f}/100\n"
             
             if results:
                 text += f"\nBest Quality: {results[0]['symbol']}"
@@ -184,12 +195,18 @@ async def call_tool(request: MCPRequest):
         elif tool_name == "complete_analysis":
             symbol = tool_args.get("symbol", "").upper()
             
+            # OpenBB and ROIC data are fetched concurrently off the event loop
+            key_metrics = asyncio.ensure_future(roic_provider.aget_key_metrics(symbol))
+            roic_data = asyncio.gather(
+                roic_provider.aget_metrics(symbol),
+                roic_provider.aget_forecast(symbol)
+            )
+            
             # Get OpenBB data
             openbb_text = f"OpenBB Analysis for {symbol}:\n"
             try:
-                metrics = obb.equity.fundamental.metrics(symbol=symbol, provider='yfinance')
-                if metrics.results:
-                    data = metrics.results[0]
+                data = await key_metrics
+                if data:
                     openbb_text += f"• P/E Ratio: {getattr(data, 'pe_ratio', 'N/A')}\n"
                     openbb_text += f"• Market Cap: ${getattr(data, 'market_cap', 0)/1e9:.1f}B\n"
             except:
@@ -198,8 +215,7 @@ async def call_tool(request: MCPRequest):
             # Get ROIC data
             roic_text = f"\nROIC Analysis:\n"
             try:
-                roic_metrics = roic_provider.get_metrics(symbol)
-                roic_forecast = roic_provider.get_forecast(symbol)
+                roic_metrics, roic_forecast = await roic_data
                 roic_text += f"• ROIC: {roic_metrics.get('roic', 'N/A')}%\n"
                 roic_text += f"• Quality: {roic_metrics.get('quality_score', 'N/A')}/100\n"
                 roic_text += f"• 1Y Target: ${roic_forecast.get('1_year_target', 'N/A')}\n"
@@ -226,6 +242,11 @@ async def health():
     """Health check endpoint"""
     return {"status": "healthy", "type": "mcp"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: route latency, upstream latency/errors, caches, pools"""
+    return metrics_response()
+
 def main():
     """Launch MCP server"""
     port = int(os.getenv("MCP_PORT", "6950"))
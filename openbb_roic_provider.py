@@ -5,11 +5,33 @@ Custom provider to use ROIC.ai data within OpenBB CLI
 """
 
 import os
-import requests
-from typing import Dict, Any, Optional
+import asyncio
+import threading
+import time
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from datetime import datetime
 import json
 
+import pandas as pd
+
+from roic_analytics import ROLLING_WINDOW, quality_arrays
+from roic_api_client import ROICClient
+from roic_cache_backends import make_cache
+from roic_concurrency import SingleFlight, get_upstream_pool, run_sync, upstream_stats
+from roic_data_sources import get_data_source
+from roic_price_cache import get_price_cache
+from roic_results import ForecastBatch, MetricsBatch, ROICForecast, ROICMetrics, to_batch
+from roic_scoring import TARGET_YEARS, implied_growth, moat_rating, quality_score
+from roic_statement_store import fetch_statement
+from roic_telemetry import Histogram, add_collector, register_cache
+
+# Time from queuing an upstream fetch to its result (pool wait included)
+FETCH_LATENCY = Histogram(
+    "roic_provider_fetch_duration_seconds",
+    "Provider upstream fetches, including time queued for a pool worker",
+    ("upstream", "dataset")
+)
+
 class ROICProvider:
     """
     ROIC.ai data provider for OpenBB
@@ -23,172 +45,421 @@ class ROICProvider:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        # Pooled session that remembers working/dead ROIC.ai endpoints
+        self.client = ROICClient(self.api_key, self.base_url)
+        # Fundamentals snapshots shared by get_metrics/get_forecast (and by
+        # every worker process when ROIC_CACHE_BACKEND is sqlite/redis)
+        self.cache = make_cache("snapshots")
+        # Blocking upstream calls (obb, ROIC.ai) run on per-upstream pools
+        # (see roic_concurrency.get_upstream_pool); identical concurrent
+        # requests share one in-flight future
+        self._inflight: Dict[tuple, Any] = {}
+        self._inflight_lock = threading.Lock()
+        # Concurrent callers asking for the same (dataset, symbol) share one fetch
+        self.singleflight = SingleFlight()
+        # Default number of symbols in flight for the batch APIs
+        self.batch_concurrency = int(os.environ.get('ROIC_BATCH_CONCURRENCY', '16'))
+    
+    # ============= Upstream plumbing =============
+    
+    def _inflight_done(self, key, future):
+        with self._inflight_lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+    
+    async def _shared(self, key, upstream: str, fn, *args):
+        """
+        Run a blocking upstream call on that upstream's worker pool
+        Concurrent callers asking for the same key share one in-flight fetch;
+        a caller that is cancelled stops waiting without cancelling the
+        fetch for the others
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            started = future is None
+            if started:
+                future = get_upstream_pool(upstream).submit(fn, *args)
+                self._inflight[key] = future
+        if started:
+            queued_at = time.perf_counter()
+            future.add_done_callback(lambda f: self._inflight_done(key, f))
+            future.add_done_callback(lambda f: FETCH_LATENCY.observe(
+                time.perf_counter() - queued_at, upstream=upstream, dataset=key[0]
+            ))
+        return await asyncio.shield(asyncio.wrap_future(future))
+    
+    async def _aget_statements(self, symbol: str, provider: str = 'yfinance', period: str = 'annual') -> Optional[Dict[str, Any]]:
+        """
+        Get the income/balance snapshot for a symbol
+        Served from the snapshot cache so repeated calls share one download
+        """
+        key = self.cache.make_key(symbol, provider, period)
+        snapshot = self.cache.get(key)
+        if snapshot is not None:
+            return snapshot
+        
+        # Persistent store only touches the network after a new filing is due
+        income, balance = await asyncio.gather(
+            self._shared(("income",) + key, provider, fetch_statement, symbol, 'income', provider, period),
+            self._shared(("balance",) + key, provider, fetch_statement, symbol, 'balance', provider, period)
+        )
+        
+        if income and balance:
+            snapshot = {"income": income, "balance": balance}
+            self.cache.set(key, snapshot)
+            return snapshot
+        return None
     
-    def get_metrics(self, symbol: str) -> Dict[str, Any]:
+    def _get_statements(self, symbol: str, provider: str = 'yfinance', period: str = 'annual') -> Optional[Dict[str, Any]]:
+        """Synchronous wrapper around _aget_statements"""
+        return run_sync(self._aget_statements(symbol, provider, period))
+    
+    def _fetch_quote(self, symbol: str) -> Optional[Any]:
+        """Blocking quote lookup - runs on the upstream executor"""
+        quote = get_data_source().quote(symbol, provider='yfinance')
+        return quote[0] if quote else None
+    
+    async def aget_quote(self, symbol: str) -> Optional[Any]:
+        """Latest quote row (last_price, prev_close, ...); concurrent callers share one request"""
+        return await self._shared(("quote", symbol), 'yfinance', self._fetch_quote, symbol)
+    
+    async def _aget_quote_price(self, symbol: str) -> Optional[float]:
+        quote = await self.aget_quote(symbol)
+        price = getattr(quote, 'last_price', None) if quote is not None else None
+        if price is None:
+            # No live quote (e.g. market closed for this provider): last
+            # daily close from the shared price history cache
+            try:
+                price = await self._shared(
+                    ("latest_close", symbol.upper()), 'yfinance', get_price_cache().latest_close, symbol.upper()
+                )
+            except Exception as e:
+                print(f"Price history error ({symbol}): {str(e)[:100]}")
+        return price
+    
+    def _fetch_key_metrics(self, symbol: str, provider: str) -> Optional[Any]:
+        """Blocking key metrics lookup - runs on the upstream pool"""
+        metrics = get_data_source().key_metrics(symbol, provider=provider)
+        return metrics[0] if metrics else None
+    
+    async def aget_key_metrics(self, symbol: str, provider: str = 'yfinance') -> Optional[Any]:
+        """
+        Latest OpenBB key metrics row (P/E, market cap, ...) for a symbol
+        Runs off the event loop; concurrent callers share one request
+        """
+        return await self._shared(
+            ("key_metrics", provider, symbol.upper()), provider, self._fetch_key_metrics, symbol.upper(), provider
+        )
+    
+    # ============= Metrics =============
+    
+    async def aget_metrics(self, symbol: str) -> ROICMetrics:
         """
         Get ROIC and quality metrics for a symbol
         Returns data in OpenBB-compatible format
         """
+        return await self.singleflight.do(("metrics", symbol), self._fetch_metrics, symbol)
+    
+    async def _fetch_metrics(self, symbol: str) -> ROICMetrics:
+        """
+        Uncoalesced metrics fetch
         
-        # Calculate ROIC using OpenBB data as fallback
-        from openbb import obb
-        
-        result = {
-            "symbol": symbol,
-            "provider": "roic",
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "roic": None,
-            "quality_score": None,
-            "moat_rating": None,
-            "fair_value": None,
-            "margin_of_safety": None
-        }
+        The ROIC.ai probe and the statement fallback are fetched concurrently,
+        so a miss on the API costs no extra latency.
+        """
+        result = ROICMetrics(
+            symbol=symbol,
+            provider="roic",
+            date=datetime.now().strftime("%Y-%m-%d")
+        )
         
         try:
-            # Try ROIC.ai API endpoints
-            endpoints = [
-                f"/companies/{symbol}/roic",
-                f"/quality/{symbol}",
-                f"/metrics/{symbol}"
-            ]
+            # ROIC.ai API (memoized endpoint, negative-cached failures) and
+            # the statements for the manual calculation, side by side
+            data, statements = await asyncio.gather(
+                self._shared(("roic.ai", symbol), "roic.ai", self.client.fetch_metrics, symbol),
+                self._aget_statements(symbol),
+                return_exceptions=True
+            )
             
-            for endpoint in endpoints:
-                try:
-                    response = requests.get(
-                        f"{self.base_url}{endpoint}",
-                        headers=self.headers,
-                        timeout=10
-                    )
-                    if response.status_code == 200:
-                        data = response.json()
-                        # Map ROIC.ai data to result
-                        if "roic" in data:
-                            result["roic"] = data["roic"]
-                        if "quality_score" in data:
-                            result["quality_score"] = data["quality_score"]
-                        if "moat" in data:
-                            result["moat_rating"] = data["moat"]
-                        if "fair_value" in data:
-                            result["fair_value"] = data["fair_value"]
-                        break
-                except:
-                    continue
+            if isinstance(data, dict):
+                # Map ROIC.ai data to result
+                if "roic" in data:
+                    result["roic"] = data["roic"]
+                if "quality_score" in data:
+                    result["quality_score"] = data["quality_score"]
+                if "moat" in data:
+                    result["moat_rating"] = data["moat"]
+                if "fair_value" in data:
+                    result["fair_value"] = data["fair_value"]
+            
+            if isinstance(statements, BaseException):
+                statements = None
             
             # If API doesn't work, calculate ROIC manually
             if result["roic"] is None:
-                result["roic"] = self._calculate_roic_fallback(symbol)
+                result["roic"] = self._roic_from_statements(statements)
                 result["quality_score"] = self._calculate_quality_score(result["roic"])
                 result["moat_rating"] = self._assess_moat(result["roic"])
             
+            # Multi-year average and trend from the statement history
+            result["roic_5y_avg"], result["roic_trend"] = self._roic_history_stats(symbol, statements)
+            
         except Exception as e:
             print(f"ROIC Provider Error: {str(e)[:100]}")
         
         return result
     
-    def _calculate_roic_fallback(self, symbol: str) -> Optional[float]:
-        """Calculate ROIC using financial data"""
+    def get_metrics(self, symbol: str) -> ROICMetrics:
+        """
+        Get ROIC and quality metrics for a symbol
+        Returns data in OpenBB-compatible format
+        """
+        return run_sync(self.aget_metrics(symbol))
+    
+    def _roic_from_period(self, income: Any, balance: Any) -> Optional[float]:
+        """ROIC of one income/balance statement pair"""
         try:
-            from openbb import obb
-            
-            income = obb.equity.fundamental.income(symbol=symbol, provider='yfinance')
-            balance = obb.equity.fundamental.balance(symbol=symbol, provider='yfinance')
-            
-            if income and income.results and balance and balance.results:
-                latest_income = income.results[0]
-                latest_balance = balance.results[0]
+            if hasattr(income, 'operating_income') and hasattr(balance, 'total_assets'):
+                # NOPAT = Operating Income * (1 - Tax Rate)
+                # Estimate tax rate at 25%
+                nopat = income.operating_income * 0.75
                 
-                if hasattr(latest_income, 'operating_income') and hasattr(latest_balance, 'total_assets'):
-                    # NOPAT = Operating Income * (1 - Tax Rate)
-                    # Estimate tax rate at 25%
-                    nopat = latest_income.operating_income * 0.75
+                # Invested Capital = Total Assets - Current Liabilities
+                if hasattr(balance, 'current_liabilities'):
+                    invested_capital = balance.total_assets - balance.current_liabilities
                     
-                    # Invested Capital = Total Assets - Current Liabilities
-                    if hasattr(latest_balance, 'current_liabilities'):
-                        invested_capital = latest_balance.total_assets - latest_balance.current_liabilities
-                        
-                        if invested_capital > 0:
-                            return (nopat / invested_capital) * 100
+                    if invested_capital > 0:
+                        return (nopat / invested_capital) * 100
         except:
             pass
         return None
     
+    def _roic_from_statements(self, statements: Optional[Dict[str, Any]]) -> Optional[float]:
+        """Calculate ROIC from an income/balance snapshot"""
+        try:
+            if statements:
+                return self._roic_from_period(statements["income"][0], statements["balance"][0])
+        except:
+            pass
+        return None
+    
+    def _roic_history_stats(self, symbol: str, statements: Optional[Dict[str, Any]]) -> Tuple[Optional[float], Optional[str]]:
+        """
+        ROLLING_WINDOW-year average ROIC and its trend label from every
+        period of an income/balance snapshot (statements pair on period date)
+        """
+        if not statements:
+            return None, None
+        try:
+            balances = {getattr(b, 'period_ending', None): b for b in statements["balance"]}
+            by_year = {}
+            for income in statements["income"]:
+                period = getattr(income, 'period_ending', None)
+                roic = self._roic_from_period(income, balances.get(period)) if period in balances else None
+                if roic is None:
+                    continue
+                # The latest period ending in a fiscal year stands for it
+                ending = pd.Timestamp(period)
+                if ending.year not in by_year or ending > by_year[ending.year][0]:
+                    by_year[ending.year] = (ending, roic)
+            if not by_year:
+                return None, None
+            stats = quality_arrays(
+                [symbol] * len(by_year), list(by_year), [roic for _, roic in by_year.values()], ROLLING_WINDOW
+            )
+            return float(stats["roic_window_mean"][0]), stats["roic_trend"][0]
+        except Exception as e:
+            print(f"ROIC history error ({symbol}): {str(e)[:100]}")
+            return None, None
+    
+    def _calculate_roic_fallback(self, symbol: str) -> Optional[float]:
+        """Calculate ROIC using financial data"""
+        try:
+            return self._roic_from_statements(self._get_statements(symbol))
+        except:
+            return None
+    
     def _calculate_quality_score(self, roic: Optional[float]) -> Optional[int]:
         """Calculate quality score based on ROIC"""
-        if roic is None:
-            return None
-        elif roic > 30:
-            return 95  # Exceptional
-        elif roic > 20:
-            return 85  # Excellent
-        elif roic > 15:
-            return 75  # Very Good
-        elif roic > 10:
-            return 65  # Good
-        elif roic > 5:
-            return 50  # Fair
-        else:
-            return 30  # Poor
+        return quality_score(roic)
     
     def _assess_moat(self, roic: Optional[float]) -> str:
         """Assess competitive moat based on ROIC"""
-        if roic is None:
-            return "Unknown"
-        elif roic > 20:
-            return "Wide"
-        elif roic > 15:
-            return "Narrow"
-        else:
-            return "None"
+        return moat_rating(roic)
     
-    def get_forecast(self, symbol: str) -> Dict[str, Any]:
+    # ============= Forecast =============
+    
+    async def aget_forecast(self, symbol: str) -> ROICForecast:
         """
         Get quality-based forecast for a symbol
         """
-        metrics = self.get_metrics(symbol)
-        
-        # Get current price
-        from openbb import obb
-        quote = obb.equity.price.quote(symbol=symbol, provider='yfinance')
-        current_price = quote.results[0].last_price if quote and quote.results else None
+        return await self.singleflight.do(("forecast", symbol), self._fetch_forecast, symbol)
+    
+    async def _fetch_forecast(self, symbol: str) -> ROICForecast:
+        """
+        Uncoalesced forecast fetch
+        Metrics and the current quote are fetched concurrently
+        """
+        metrics, current_price = await asyncio.gather(
+            self.aget_metrics(symbol),
+            self._aget_quote_price(symbol)
+        )
         
-        result = {
-            "symbol": symbol,
-            "current_price": current_price,
-            "roic": metrics.get("roic"),
-            "quality_score": metrics.get("quality_score"),
-            "moat_rating": metrics.get("moat_rating")
-        }
+        result = ROICForecast(
+            symbol=symbol,
+            current_price=current_price,
+            roic=metrics.get("roic"),
+            quality_score=metrics.get("quality_score"),
+            moat_rating=metrics.get("moat_rating")
+        )
         
         # Calculate growth rate based on quality
         if metrics.get("roic"):
-            roic = metrics["roic"]
-            if roic > 30:
-                growth_rate = 18
-            elif roic > 20:
-                growth_rate = 15
-            elif roic > 15:
-                growth_rate = 12
-            elif roic > 10:
-                growth_rate = 10
-            else:
-                growth_rate = 7
-            
+            growth_rate = implied_growth(metrics["roic"])
             result["implied_growth_rate"] = growth_rate
             
             if current_price:
                 # 3-year projections
-                result["1_year_target"] = current_price * (1 + growth_rate/100)
-                result["2_year_target"] = current_price * (1 + growth_rate/100) ** 2
-                result["3_year_target"] = current_price * (1 + growth_rate/100) ** 3
+                for years in TARGET_YEARS:
+                    result[f"{years}_year_target"] = current_price * (1 + growth_rate/100) ** years
         
         return result
+    
+    def get_forecast(self, symbol: str) -> ROICForecast:
+        """
+        Get quality-based forecast for a symbol
+        """
+        return run_sync(self.aget_forecast(symbol))
+    
+    # ============= Batch =============
+    
+    @staticmethod
+    def normalize_symbols(symbols: Iterable[str]) -> List[str]:
+        """Strip, upper-case and de-duplicate symbols, keeping first-seen order"""
+        seen = {}
+        for symbol in symbols:
+            symbol = (symbol or "").strip().upper()
+            if symbol and symbol not in seen:
+                seen[symbol] = None
+        return list(seen)
+    
+    async def _amany(self, fetch, batch_type, symbols: Iterable[str], max_concurrency: int = None) -> Tuple[Any, Dict[str, str]]:
+        """
+        Run fetch(symbol) for many symbols under a concurrency limit
+        Upstream rate limits are enforced at each call site
+        Results are collected column-wise into a batch_type batch
+        """
+        symbols = self.normalize_symbols(symbols)
+        semaphore = asyncio.Semaphore(max_concurrency or self.batch_concurrency)
+        errors: Dict[str, str] = {}
+        
+        async def run(symbol):
+            async with semaphore:
+                try:
+                    data = await fetch(symbol)
+                except Exception as e:
+                    errors[symbol] = str(e)[:200]
+                    return None
+                if data.get("roic") is None:
+                    errors[symbol] = "No ROIC data available"
+                return data
+        
+        rows = await asyncio.gather(*[run(symbol) for symbol in symbols])
+        return to_batch(rows, batch_type), errors
+    
+    async def aget_metrics_batch(self, symbols: Iterable[str], max_concurrency: int = None) -> Tuple[MetricsBatch, Dict[str, str]]:
+        """
+        Get metrics for many symbols as a columnar batch
+        Returns (MetricsBatch with one row per symbol, {symbol: error})
+        """
+        return await self._amany(self.aget_metrics, MetricsBatch, symbols, max_concurrency)
+    
+    async def aget_forecast_batch(self, symbols: Iterable[str], max_concurrency: int = None) -> Tuple[ForecastBatch, Dict[str, str]]:
+        """
+        Get forecasts for many symbols as a columnar batch
+        Returns (ForecastBatch with one row per symbol, {symbol: error})
+        """
+        return await self._amany(self.aget_forecast, ForecastBatch, symbols, max_concurrency)
+    
+    async def aget_metrics_many(self, symbols: Iterable[str], max_concurrency: int = None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """
+        Get metrics for many symbols
+        Returns (DataFrame with one row per symbol, {symbol: error})
+        """
+        batch, errors = await self.aget_metrics_batch(symbols, max_concurrency)
+        return batch.to_pandas(), errors
+    
+    async def aget_forecast_many(self, symbols: Iterable[str], max_concurrency: int = None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """
+        Get forecasts for many symbols
+        Returns (DataFrame with one row per symbol, {symbol: error})
+        """
+        batch, errors = await self.aget_forecast_batch(symbols, max_concurrency)
+        return batch.to_pandas(), errors
+    
+    def get_metrics_batch(self, symbols: Iterable[str], max_concurrency: int = None) -> Tuple[MetricsBatch, Dict[str, str]]:
+        """Synchronous wrapper around aget_metrics_batch"""
+        return run_sync(self.aget_metrics_batch(symbols, max_concurrency))
+    
+    def get_forecast_batch(self, symbols: Iterable[str], max_concurrency: int = None) -> Tuple[ForecastBatch, Dict[str, str]]:
+        """Synchronous wrapper around aget_forecast_batch"""
+        return run_sync(self.aget_forecast_batch(symbols, max_concurrency))
+    
+    def get_metrics_many(self, symbols: Iterable[str], max_concurrency: int = None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """Synchronous wrapper around aget_metrics_many"""
+        return run_sync(self.aget_metrics_many(symbols, max_concurrency))
+    
+    def get_forecast_many(self, symbols: Iterable[str], max_concurrency: int = None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """Synchronous wrapper around aget_forecast_many"""
+        return run_sync(self.aget_forecast_many(symbols, max_concurrency))
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Snapshot cache hit/miss counters"""
+        return self.cache.stats()
+    
+    def api_stats(self) -> Dict[str, Any]:
+        """ROIC.ai client round-trip and negative cache counters"""
+        return self.client.stats()
+    
+    def singleflight_stats(self) -> Dict[str, Any]:
+        """How many concurrent lookups were coalesced into one fetch"""
+        return self.singleflight.stats()
+    
+    def collect_metrics(self):
+        """Scrape-time /metrics families for coalescing and ROIC.ai counters"""
+        singleflight = self.singleflight.stats()
+        api = self.client.stats()
+        yield ("roic_provider_fetches_in_flight", "gauge",
+               "Distinct upstream fetches currently queued or running", [({}, len(self._inflight))])
+        yield ("roic_singleflight_calls_total", "counter",
+               "Coalesced-call lookups", [({}, singleflight["calls"])])
+        yield ("roic_singleflight_coalesced_total", "counter",
+               "Lookups that joined an in-flight call", [({}, singleflight["coalesced"])])
+        yield ("roic_singleflight_in_flight", "gauge",
+               "Keys currently being computed", [({}, singleflight["in_flight"])])
+        yield ("roic_api_requests_total", "counter", "ROIC.ai requests sent or skipped (negative cache)", [
+            ({"result": "sent"}, api["requests_sent"]),
+            ({"result": "skipped"}, api["requests_skipped"])
+        ])
+    
+    def stats(self) -> Dict[str, Any]:
+        """All provider counters in one place"""
+        return {
+            "snapshot_cache": self.cache_stats(),
+            "roic_api": self.api_stats(),
+            "singleflight": self.singleflight_stats(),
+            "upstreams": upstream_stats()
+        }
 
 
 # Create global instance
 roic_provider = ROICProvider()
+register_cache("snapshots", roic_provider.cache.stats)
+add_collector(roic_provider.collect_metrics)
 
 
-def roic_metrics(symbol: str) -> Dict[str, Any]:
+def roic_metrics(symbol: str) -> ROICMetrics:
     """
     OpenBB-compatible function for ROIC metrics
     Can be called from CLI or Python
@@ -196,13 +467,27 @@ def roic_metrics(symbol: str) -> Dict[str, Any]:
     return roic_provider.get_metrics(symbol)
 
 
-def roic_forecast(symbol: str) -> Dict[str, Any]:
+def roic_forecast(symbol: str) -> ROICForecast:
     """
     OpenBB-compatible function for quality-based forecast
     """
     return roic_provider.get_forecast(symbol)
 
 
+async def aroic_metrics(symbol: str) -> ROICMetrics:
+    """
+    Async variant of roic_metrics for FastAPI/MCP handlers
+    """
+    return await roic_provider.aget_metrics(symbol)
+
+
+async def aroic_forecast(symbol: str) -> ROICForecast:
+    """
+    Async variant of roic_forecast for FastAPI/MCP handlers
+    """
+    return await roic_provider.aget_forecast(symbol)
+
+
 # Make it work with OpenBB's provider system
 def register_roic_provider():
     """
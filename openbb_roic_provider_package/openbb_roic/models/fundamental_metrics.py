@@ -90,6 +90,9 @@ class ROICMetricsFetcher(
                 "roic": metrics.get("roic"),
                 "quality_score": metrics.get("quality_score"),
                 "moat_rating": metrics.get("moat_rating"),
+                # Rolling average and OLS trend over the statement history
+                "roic_5y_avg": metrics.get("roic_5y_avg"),
+                "roic_trend": metrics.get("roic_trend"),
                 "period_ending": datetime.now(),
                 
                 # Add standard metrics that OpenBB expects
@@ -116,19 +119,6 @@ class ROICMetricsFetcher(
             if metrics.get("roic"):
                 roic_value = metrics["roic"]
                 
-                # Determine trend
-                if roic_value > 30:
-                    data["roic_trend"] = "Exceptional"
-                elif roic_value > 20:
-                    data["roic_trend"] = "Strong"
-                elif roic_value > 15:
-                    data["roic_trend"] = "Good"
-                else:
-                    data["roic_trend"] = "Moderate"
-                
-                # Set 5-year average (simplified)
-                data["roic_5y_avg"] = roic_value * 0.95  # Slight historical discount
-                
                 # Capital efficiency
                 data["capital_efficiency"] = roic_value / 20  # Normalized to benchmark
             
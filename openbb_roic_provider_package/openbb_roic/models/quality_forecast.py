@@ -81,6 +81,7 @@ class ROICForecastFetcher(
         
         try:
             from openbb_roic_provider import roic_provider
+            from roic_scoring import confidence
             
             # Get forecast for the symbol
             symbol = query.symbol
@@ -117,18 +118,7 @@ class ROICForecastFetcher(
             
             # Determine confidence level based on ROIC
             if data["roic"]:
-                if data["roic"] > 30:
-                    data["confidence_level"] = "High"
-                    data["rating_current"] = "Strong Buy"
-                elif data["roic"] > 20:
-                    data["confidence_level"] = "Medium-High"
-                    data["rating_current"] = "Buy"
-                elif data["roic"] > 15:
-                    data["confidence_level"] = "Medium"
-                    data["rating_current"] = "Hold"
-                else:
-                    data["confidence_level"] = "Low"
-                    data["rating_current"] = "Neutral"
+                data["confidence_level"], data["rating_current"] = confidence(data["roic"])
             
             return [data]
             
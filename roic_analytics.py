@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+ROIC Quality Analytics
+Rolling and whole-history ROIC statistics for every symbol of a
+(symbol, fiscal_year) panel
+
+All statistics are array operations over the whole panel at once:
+windowed sums of (1, x, y, x², xy, y²) per symbol, taken as differences
+of running sums, give the rolling mean, standard deviation and OLS slope
+of ROIC against fiscal year; a grouped cumulative max gives the drawdown
+from peak, and reduceat over each symbol's run the whole-history stats.
+Works on the panels built by roic_historical and on a single symbol's
+statements alike.
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# Fiscal years in the rolling window ("5-year average")
+ROLLING_WINDOW = 5
+
+# ROIC (%) a year must beat to count towards consistency
+CONSISTENCY_THRESHOLD = 20.0
+
+# OLS slope (ROIC percentage points per year) beyond which a trend is
+# Improving / Declining rather than Stable
+TREND_THRESHOLD = 1.0
+
+ROLLING_COLUMNS = ['roic', 'roic_rolling_mean', 'roic_rolling_std', 'roic_rolling_slope', 'roic_drawdown']
+
+SUMMARY_COLUMNS = [
+    'years', 'first_year', 'last_year', 'roic_latest', 'roic_mean', 'roic_volatility',
+    'roic_window_mean', 'roic_window_std', 'roic_slope', 'roic_trend',
+    'consistency', 'drawdown', 'max_drawdown'
+]
+
+
+def _roic_groups(symbols: np.ndarray, years: np.ndarray, roic: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Non-missing ROIC as flat arrays sorted by symbol then year, plus the
+    offset where each symbol's run starts
+    """
+    roic = np.asarray(roic, dtype='float64')
+    keep = ~np.isnan(roic)
+    codes, uniques = pd.factorize(np.asarray(symbols, dtype=object)[keep])
+    years = np.asarray(years)[keep].astype('int64')
+    order = np.lexsort((years, codes))
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype='int64')
+    return {
+        "symbols": np.asarray(uniques, dtype=object)[codes[starts]],
+        "years": years[order],
+        "roic": roic[keep][order],
+        "starts": starts,
+        "counts": np.diff(np.r_[starts, len(codes)]).astype('int64'),
+    }
+
+
+def _rolling(groups: Dict[str, np.ndarray], window: int) -> Dict[str, np.ndarray]:
+    """Rolling mean / std / OLS slope and drawdown arrays aligned with groups"""
+    years, y, counts = groups["years"], groups["roic"], groups["counts"]
+    # Count years from the first one so the sums of squares stay small
+    x = (years - years.min()).astype('float64') if len(years) else years.astype('float64')
+    rank = np.repeat(np.arange(len(counts)), counts)
+    group_start = np.repeat(groups["starts"], counts)
+
+    # Window sums as differences of running sums, clipped at the symbol's first year
+    position = np.arange(len(y))
+    low = np.maximum(position - window + 1, group_start)
+    def window_sum(values: np.ndarray) -> np.ndarray:
+        running = np.r_[0.0, np.cumsum(values)]
+        return running[position + 1] - running[low]
+    n = (position - low + 1).astype('float64')
+    sx, sy = window_sum(x), window_sum(y)
+    sxx, sxy, syy = window_sum(x * x), window_sum(x * y), window_sum(y * y)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = (syy - sy * sy / n) / (n - 1)
+        denominator = n * sxx - sx * sx
+        slope = (n * sxy - sx * sy) / denominator
+    # Running peak per symbol; one symbol (the per-request case) needs no grouping
+    peak = np.maximum.accumulate(y) if len(counts) == 1 else pd.Series(y).groupby(rank).cummax().to_numpy()
+    return {
+        "roic_rolling_mean": sy / n,
+        "roic_rolling_std": np.where(n > 1, np.sqrt(np.clip(variance, 0, None)), np.nan),
+        "roic_rolling_slope": np.where(denominator > 0, slope, np.nan),
+        "roic_drawdown": y - peak,
+    }
+
+
+def rolling_quality(panel: pd.DataFrame, window: int = ROLLING_WINDOW) -> pd.DataFrame:
+    """
+    Rolling ROIC statistics per (symbol, fiscal_year)
+
+    Each row covers the symbol's last `window` reported years up to and
+    including that year: roic_rolling_mean, roic_rolling_std (sample,
+    NaN below 2 years) and roic_rolling_slope (OLS, percentage points per
+    fiscal year, NaN below 2 years). roic_drawdown is ROIC minus the
+    highest ROIC reported so far (0 at a new peak). Years without ROIC
+    are skipped.
+    """
+    groups = _roic_groups(
+        panel.index.get_level_values('symbol').to_numpy(),
+        panel.index.get_level_values('fiscal_year').to_numpy(),
+        panel['roic'].to_numpy(dtype='float64', na_value=np.nan)
+    )
+    index = pd.MultiIndex.from_arrays(
+        [np.repeat(groups["symbols"], groups["counts"]), groups["years"]], names=['symbol', 'fiscal_year']
+    )
+    return pd.DataFrame(dict(roic=groups["roic"], **_rolling(groups, window)), index=index)[ROLLING_COLUMNS]
+
+
+def quality_arrays(symbols: np.ndarray, years: np.ndarray, roic: np.ndarray,
+                   window: int = ROLLING_WINDOW, threshold: float = CONSISTENCY_THRESHOLD) -> Dict[str, np.ndarray]:
+    """
+    quality_summary over parallel (symbol, fiscal_year, roic) arrays, as
+    one array per SUMMARY_COLUMNS entry plus 'symbol'; no DataFrame is
+    built, which keeps per-request use (one symbol's statements) cheap
+    """
+    groups = _roic_groups(symbols, years, roic)
+    rolling = _rolling(groups, window)
+    starts, counts, y = groups["starts"], groups["counts"], groups["roic"]
+    last = starts + counts - 1
+    if not len(starts):
+        return {"symbol": groups["symbols"], **{column: np.array([]) for column in SUMMARY_COLUMNS}}
+
+    total = np.add.reduceat(y, starts)
+    mean = total / counts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = (np.add.reduceat(y * y, starts) - total * mean) / (counts - 1)
+    slope = rolling["roic_rolling_slope"][last]
+
+    return {
+        'symbol': groups["symbols"],
+        'years': counts,
+        'first_year': groups["years"][starts],
+        'last_year': groups["years"][last],
+        'roic_latest': y[last],
+        'roic_mean': mean,
+        'roic_volatility': np.where(counts > 1, np.sqrt(np.clip(variance, 0, None)), np.nan),
+        'roic_window_mean': rolling["roic_rolling_mean"][last],
+        'roic_window_std': rolling["roic_rolling_std"][last],
+        'roic_slope': slope,
+        'roic_trend': np.select(
+            [slope > TREND_THRESHOLD, slope < -TREND_THRESHOLD, ~np.isnan(slope)],
+            ["Improving", "Declining", "Stable"], default=None
+        ),
+        'consistency': np.add.reduceat((y > threshold).astype('float64'), starts) / counts,
+        'drawdown': rolling["roic_drawdown"][last],
+        'max_drawdown': np.minimum.reduceat(rolling["roic_drawdown"], starts),
+    }
+
+
+def quality_summary(panel: pd.DataFrame, window: int = ROLLING_WINDOW,
+                    threshold: float = CONSISTENCY_THRESHOLD) -> pd.DataFrame:
+    """
+    One row of ROIC quality statistics per symbol
+
+        years / first_year / last_year  reported years with ROIC
+        roic_latest                     ROIC of the last reported year
+        roic_mean / roic_volatility     mean and sample std over all years
+        roic_window_mean / _std         the same over the last `window` years
+        roic_slope / roic_trend         OLS slope over the last `window` years
+                                        (pp per year) and its trend label
+        consistency                     share of years with ROIC > threshold
+        drawdown / max_drawdown         latest and worst ROIC below its running peak
+    """
+    columns = quality_arrays(
+        panel.index.get_level_values('symbol').to_numpy(),
+        panel.index.get_level_values('fiscal_year').to_numpy(),
+        panel['roic'].to_numpy(dtype='float64', na_value=np.nan),
+        window, threshold
+    )
+    index = pd.Index(columns.pop('symbol'), name='symbol')
+    return pd.DataFrame(columns, index=index, columns=SUMMARY_COLUMNS).sort_index()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+ROIC.ai API Client
+Pooled keep-alive session with endpoint discovery memoization and negative caching
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from roic_concurrency import throttle
+from roic_telemetry import record_upstream_error, upstream_call
+
+# Endpoint shapes tried in order until one answers
+ENDPOINT_TEMPLATES = (
+    "/companies/{symbol}/roic",
+    "/quality/{symbol}",
+    "/metrics/{symbol}",
+)
+
+
+class ROICClient:
+    """
+    HTTP client for the ROIC.ai API
+
+    - one pooled keep-alive session shared by every call
+    - remembers which endpoint shape last succeeded and tries it first
+    - negative-caches 404s per (endpoint, symbol), endpoints that never
+      answer, and API-wide failures (401/403, timeouts) with exponential
+      backoff so known-dead paths cost zero round-trips
+    """
+
+    def __init__(self, api_key: str, base_url: str = "https://api.roic.ai/v1",
+                 timeout: Tuple[float, float] = None, pool_size: int = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout or (
+            float(os.environ.get('ROIC_API_CONNECT_TIMEOUT', '3.05')),
+            float(os.environ.get('ROIC_API_READ_TIMEOUT', '5')),
+        )
+        pool_size = pool_size or int(os.environ.get('ROIC_API_POOL_SIZE', '32'))
+        # ROIC_API_ENABLED=0 skips the API entirely (offline/fixture runs)
+        self.enabled = os.environ.get('ROIC_API_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Backoff settings (seconds)
+        self.backoff_base = 30.0
+        self.backoff_max = 1800.0
+        self.not_found_ttl = 24 * 3600.0
+        # Consecutive 404s across symbols before an endpoint shape is parked
+        self.dead_endpoint_threshold = 3
+
+        self._lock = threading.Lock()
+        self._preferred: Optional[str] = None
+        self._api_down_until = 0.0
+        self._api_failures = 0
+        self._endpoint_misses: Dict[str, int] = {}
+        self._endpoint_down_until: Dict[str, float] = {}
+        self._not_found: Dict[Tuple[str, str], float] = {}
+
+        self.requests_sent = 0
+        self.requests_skipped = 0
+
+    def _backoff(self, failures: int) -> float:
+        return min(self.backoff_base * (2 ** max(failures - 1, 0)), self.backoff_max)
+
+    def _ordered_templates(self):
+        preferred = self._preferred
+        if preferred is None:
+            return ENDPOINT_TEMPLATES
+        return (preferred,) + tuple(t for t in ENDPOINT_TEMPLATES if t != preferred)
+
+    def _mark_api_failure(self):
+        with self._lock:
+            self._api_failures += 1
+            self._api_down_until = time.monotonic() + self._backoff(self._api_failures)
+
+    def _mark_not_found(self, template: str, symbol: str):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._not_found) > 10000:
+                self._not_found = {k: v for k, v in self._not_found.items() if v > now}
+            self._not_found[(template, symbol)] = now + self.not_found_ttl
+            misses = self._endpoint_misses.get(template, 0) + 1
+            self._endpoint_misses[template] = misses
+            if misses >= self.dead_endpoint_threshold:
+                parked = misses - self.dead_endpoint_threshold + 1
+                self._endpoint_down_until[template] = now + self._backoff(parked)
+
+    def _mark_success(self, template: str):
+        with self._lock:
+            self._preferred = template
+            self._api_failures = 0
+            self._api_down_until = 0.0
+            self._endpoint_misses[template] = 0
+            self._endpoint_down_until.pop(template, None)
+
+    def _skip(self, template: str, symbol: str, now: float) -> bool:
+        if self._endpoint_down_until.get(template, 0.0) > now:
+            return True
+        return self._not_found.get((template, symbol), 0.0) > now
+
+    def fetch_metrics(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the raw ROIC.ai payload for a symbol, or None if unavailable
+        """
+        now = time.monotonic()
+        if not self.enabled or self._api_down_until > now:
+            self.requests_skipped += 1
+            return None
+
+        for template in self._ordered_templates():
+            if self._skip(template, symbol, now):
+                self.requests_skipped += 1
+                continue
+
+            try:
+                throttle("roic.ai")
+                self.requests_sent += 1
+                with upstream_call("roic.ai", "metrics"):
+                    response = self.session.get(
+                        f"{self.base_url}{template.format(symbol=symbol)}",
+                        timeout=self.timeout
+                    )
+            except (requests.Timeout, requests.ConnectionError):
+                # Whole API unreachable - stop probing the other shapes too
+                self._mark_api_failure()
+                return None
+            except requests.RequestException:
+                continue
+
+            if response.status_code in (401, 403, 429) or response.status_code >= 500:
+                record_upstream_error("roic.ai", "metrics")
+
+            if response.status_code == 200:
+                try:
+                    data = response.json()
+                except ValueError:
+                    continue
+                self._mark_success(template)
+                return data
+
+            if response.status_code in (401, 403):
+                # Bad key or plan - every endpoint will fail the same way
+                self._mark_api_failure()
+                return None
+
+            if response.status_code == 404:
+                self._mark_not_found(template, symbol)
+            elif response.status_code == 429 or response.status_code >= 500:
+                self._mark_api_failure()
+                return None
+
+        return None
+
+    def reset(self):
+        """Forget memoized endpoints and negative cache entries"""
+        with self._lock:
+            self._preferred = None
+            self._api_down_until = 0.0
+            self._api_failures = 0
+            self._endpoint_misses.clear()
+            self._endpoint_down_until.clear()
+            self._not_found.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Round-trip counters and negative cache state"""
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "preferred_endpoint": self._preferred,
+            "api_down_for": max(self._api_down_until - now, 0.0),
+            "dead_endpoints": [t for t, until in self._endpoint_down_until.items() if until > now],
+            "not_found_entries": len(self._not_found),
+            "requests_sent": self.requests_sent,
+            "requests_skipped": self.requests_skipped
+        }
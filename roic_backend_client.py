@@ -6,12 +6,14 @@ Shows how to interact with the ROIC Backend API
 
 import requests
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich import box
 
+from roic_results import read_batch
+
 console = Console()
 
 class ROICBackendClient:
@@ -36,6 +38,19 @@ class ROICBackendClient:
         response = self.session.get(f"{self.base_url}/api/v1/roic/metrics/{symbol}")
         return response.json()
     
+    def get_metrics_batch(self, symbols: List[str], format: str = "arrow") -> Tuple[Any, Dict[str, str]]:
+        """
+        Get ROIC metrics for many symbols in one request
+        Returns (DataFrame with one row per symbol, {symbol: error}); "arrow"
+        and "parquet" need pyarrow, "json" is column-oriented JSON.
+        """
+        response = self.session.post(
+            f"{self.base_url}/api/v1/roic/metrics/batch",
+            json={"symbols": symbols, "format": format}
+        )
+        response.raise_for_status()
+        return read_batch(response.content, format)
+    
     def get_roic_forecast(self, symbol: str, years: int = 3) -> Dict[str, Any]:
         """Get quality-based forecast"""
         response = self.session.get(
@@ -57,6 +72,36 @@ class ROICBackendClient:
         )
         return response.json()
     
+    def compare_stocks_stream(self, symbols: List[str]):
+        """
+        Compare multiple stocks, yielding rows as the backend finishes them
+        The last item yielded has type "ranking" and holds the sorted comparison
+        """
+        response = self.session.post(
+            f"{self.base_url}/api/v1/analysis/compare",
+            json={"symbols": symbols, "stream": True},
+            stream=True
+        )
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+    
+    def stream_updates(self, symbols: List[str], widgets: List[str] = None):
+        """
+        Follow widget updates over server-sent events
+        Yields a "snapshot" event per widget/symbol, then "delta" events with
+        only the changed fields, until the connection is closed.
+        """
+        params = {"symbols": ",".join(symbols)}
+        if widgets:
+            params["widgets"] = ",".join(widgets)
+        response = self.session.get(f"{self.base_url}/api/v1/stream", params=params, stream=True)
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data:"):
+                yield json.loads(line[5:])
+    
     def display_analysis(self, symbol: str):
         """Display formatted analysis for a symbol"""
         analysis = self.get_complete_analysis(symbol)
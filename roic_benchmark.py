@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+ROIC Benchmark Suite
+Drives ROICProvider, both FastAPI backends, the MCP server and the CLI
+against generated fixtures with configurable upstream latency
+
+Every target runs for each symbol count, first with cold caches and then
+again warm, and reports p50/p95/p99 latency, throughput, upstream call
+counts and peak RSS; HTTP targets also report response bytes before and
+after content-encoding, and the serialization target times each JSON
+encoder on a compare-sized payload. Results are written as JSON so runs
+can be diffed between releases:
+
+    python roic_benchmark.py --output bench-new.json
+    python roic_benchmark.py --sizes 1,10 --latency-ms 50 --targets provider,backend
+    python roic_benchmark.py --compare bench-old.json bench-new.json
+    ROIC_JSON=orjson python roic_benchmark.py --targets backend,serialization
+
+No network access is needed: the ROIC.ai client is disabled and all
+market data comes from a FixtureDataSource (ROIC_DATA_SOURCE=fixture:).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_SIZES = (1, 10, 1000)
+TARGETS = ("provider", "provider_batch", "backend", "backend_official", "mcp", "cli", "serialization")
+
+# Annual statements generated per symbol
+FIXTURE_YEARS = 5
+
+
+# ============= Fixtures =============
+
+def benchmark_symbols(count: int) -> List[str]:
+    """Deterministic synthetic tickers"""
+    return [f"SYM{i:04d}" for i in range(count)]
+
+
+def generate_fixtures(root: str, symbols: List[str], years: int = FIXTURE_YEARS, seed: int = 42):
+    """
+    Write a FixtureDataSource tree for the given symbols
+    Values are seeded so every run benchmarks identical data; ROIC is
+    spread across all quality tiers.
+    """
+    rng = random.Random(seed)
+    for dataset in ("income", "balance", "quote", "metrics", "profile"):
+        os.makedirs(os.path.join(root, dataset), exist_ok=True)
+
+    last_year = date.today().year - 1
+    for symbol in symbols:
+        roic = rng.uniform(-5, 60)
+        total_assets = rng.uniform(1e9, 5e11)
+        current_liabilities = total_assets * rng.uniform(0.1, 0.4)
+        invested_capital = total_assets - current_liabilities
+        revenue = total_assets * rng.uniform(0.3, 1.5)
+        price = rng.uniform(5, 800)
+
+        income, balance = [], []
+        for offset in range(years):
+            scale = (1 - 0.05) ** offset
+            period = date(last_year - offset, 12, 31).isoformat()
+            operating_income = roic / 100 * invested_capital / 0.75 * scale
+            income.append({
+                "period_ending": period,
+                "total_revenue": revenue * scale,
+                "operating_income": operating_income,
+                "net_income": operating_income * 0.7,
+            })
+            balance.append({
+                "period_ending": period,
+                "total_assets": total_assets * scale,
+                "current_liabilities": current_liabilities * scale,
+            })
+
+        rows = {
+            "income": income,
+            "balance": balance,
+            "quote": [{"symbol": symbol, "last_price": price, "change_percent": rng.uniform(-3, 3)}],
+            "metrics": [{
+                "symbol": symbol,
+                "pe_ratio": rng.uniform(5, 60),
+                "market_cap": price * rng.uniform(1e8, 1e10),
+            }],
+            "profile": [{"symbol": symbol, "name": f"{symbol} Corp"}],
+        }
+        for dataset, data in rows.items():
+            with open(os.path.join(root, dataset, f"{symbol}.json"), 'w') as f:
+                json.dump(data, f)
+
+
+# ============= Measurement =============
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def peak_rss_mb() -> float:
+    """Process peak resident set size (high-water mark) in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def _timed(fn: Callable, *args) -> float:
+    started = time.perf_counter()
+    await fn(*args)
+    return time.perf_counter() - started
+
+
+async def run_many(fn: Callable, items: List[Any], concurrency: int):
+    """Run fn(item) for every item with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def one(item):
+        async with semaphore:
+            try:
+                latencies.append(await _timed(fn, item))
+            except Exception as e:
+                errors.append(f"{item}: {str(e)[:100]}")
+
+    await asyncio.gather(*[one(item) for item in items])
+    return latencies, errors
+
+
+class BenchmarkRunner:
+    """Owns the fixture source, provider and apps for one benchmark session"""
+
+    def __init__(self, fixtures: str, latency_ms: float = 20.0, jitter_ms: float = 0.0,
+                 concurrency: int = 32):
+        self.concurrency = concurrency
+
+        # Imported here so ROIC_* settings from setup_environment() apply
+        from roic_data_sources import CountingDataSource, FixtureDataSource, set_data_source
+
+        self.fixture_source = FixtureDataSource(
+            fixtures, latency=latency_ms / 1000, jitter=jitter_ms / 1000
+        )
+        self.source = CountingDataSource(self.fixture_source)
+        set_data_source(self.source)
+
+        from openbb_roic_provider import roic_provider
+        from roic_price_cache import get_price_cache
+        from roic_statement_store import get_statement_store
+
+        self.provider = roic_provider
+        self.store = get_statement_store()
+        self.price_cache = get_price_cache()
+
+    def reset(self):
+        """Drop every cache so the next pass starts cold"""
+        from roic_http_cache import invalidate_http_cache
+
+        self.provider.cache.invalidate()
+        self.provider.client.reset()
+        self.store.invalidate()
+        self.price_cache.invalidate()
+        # Response caches of the backend apps measured by the HTTP targets
+        invalidate_http_cache()
+        self.source.reset()
+
+    # ---- targets: each returns (latencies, errors, ops[, extra result fields]) ----
+
+    async def _provider(self, symbols):
+        latencies, errors = await run_many(self.provider.aget_forecast, symbols, self.concurrency)
+        return latencies, errors, len(symbols)
+
+    async def _provider_batch(self, symbols):
+        started = time.perf_counter()
+        batch, _ = await self.provider.aget_metrics_batch(symbols, self.concurrency)
+        # One call per batch; throughput is reported per symbol
+        return [time.perf_counter() - started], [], len(batch)
+
+    async def _http(self, app, request: Callable, symbols):
+        import httpx
+
+        transport = httpx.ASGITransport(app=app)
+        # httpx sends Accept-Encoding: gzip, deflate (plus br when brotli is installed)
+        payload = {"body_bytes": 0, "wire_bytes": 0}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def call(symbol):
+                response = await request(client, symbol)
+                response.raise_for_status()
+                payload["body_bytes"] += len(response.content)
+                payload["wire_bytes"] += response.num_bytes_downloaded
+
+            latencies, errors = await run_many(call, symbols, self.concurrency)
+        return latencies, errors, len(symbols), payload
+
+    async def _backend(self, symbols):
+        from openbb_roic_backend import app
+        return await self._http(
+            app, lambda client, symbol: client.get(f"/api/v1/analysis/complete/{symbol}"), symbols
+        )
+
+    async def _backend_official(self, symbols):
+        from openbb_roic_backend_official import app
+        return await self._http(
+            app, lambda client, symbol: client.get("/analysis/complete", params={"symbol": symbol}), symbols
+        )
+
+    async def _mcp(self, symbols):
+        from openbb_roic_mcp_server import app
+        return await self._http(
+            app,
+            lambda client, symbol: client.post("/mcp/tools/call", json={
+                "method": "tools/call",
+                "params": {"name": "roic_quality", "arguments": {"symbol": symbol}}
+            }),
+            symbols
+        )
+
+    async def _cli(self, symbols):
+        from roic_cli_extension import ROICExtension
+
+        cli = ROICExtension()
+        started = time.perf_counter()
+        # The CLI is a one-shot process; measure `roic compare` output included
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.get_running_loop().run_in_executor(None, cli.compare_quality, symbols)
+        return [time.perf_counter() - started], [], len(symbols)
+
+    async def _serialization(self, symbols):
+        """
+        Encode a compare-sized payload with every available JSON encoder
+        Latencies are those of the configured encoder (ROIC_JSON);
+        "fastapi" is the default jsonable_encoder + JSONResponse path.
+        """
+        from fastapi.encoders import jsonable_encoder
+        from fastapi.responses import JSONResponse
+        from roic_encoding import JSON_ENCODER, JSON_ENCODERS, CompressionMiddleware, brotli
+
+        batch, _ = await self.provider.aget_metrics_batch(symbols, self.concurrency)
+        payload = {"comparison": [dict(row) for row in batch], "count": len(batch)}
+        encoders = dict(JSON_ENCODERS, fastapi=lambda obj: JSONResponse(jsonable_encoder(obj)).body)
+        repeats = max(5, min(200, 20000 // len(symbols)))
+
+        encode_ms, latencies = {}, []
+        for name, encode in encoders.items():
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                encode(payload)
+                timings.append(time.perf_counter() - started)
+            encode_ms[name] = round(percentile(timings, 50) * 1000, 3)
+            if name == JSON_ENCODER:
+                latencies = timings
+
+        body = JSON_ENCODERS[JSON_ENCODER](payload)
+        compression = CompressionMiddleware(None)
+        sizes = {"identity": len(body), "gzip": len(compression.compress(body, "gzip"))}
+        if brotli is not None:
+            sizes["br"] = len(compression.compress(body, "br"))
+        return latencies, [], repeats, {"json_encoder": JSON_ENCODER, "encode_ms_p50": encode_ms,
+                                        "payload_bytes": sizes}
+
+    async def run_target(self, target: str, symbols: List[str], phase: str) -> Dict[str, Any]:
+        requests_before = self.provider.client.requests_sent
+        started = time.perf_counter()
+        latencies, errors, ops, *extra = await getattr(self, f"_{target}")(symbols)
+        wall = time.perf_counter() - started
+
+        upstream = self.source.snapshot()
+        upstream["roic.ai"] = self.provider.client.requests_sent - requests_before
+
+        result = {
+            "target": target,
+            "size": len(symbols),
+            "phase": phase,
+            "ops": ops,
+            "wall_s": round(wall, 4),
+            "throughput_ops_s": round(ops / wall, 2) if wall > 0 else None,
+            "latency_ms": {
+                name: round(value * 1000, 3) if value is not None else None
+                for name, value in (
+                    ("p50", percentile(latencies, 50)),
+                    ("p95", percentile(latencies, 95)),
+                    ("p99", percentile(latencies, 99)),
+                    ("max", max(latencies) if latencies else None),
+                )
+            },
+            "upstream_calls": upstream,
+            "errors": len(errors),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+        for fields in extra:
+            result.update(fields)
+        return result
+
+    async def run(self, targets: List[str], sizes: List[int], warm: bool = True) -> List[Dict[str, Any]]:
+        results = []
+        for size in sizes:
+            symbols = benchmark_symbols(size)
+            for target in targets:
+                phases = ("cold", "warm") if warm else ("cold",)
+                self.reset()
+                for phase in phases:
+                    self.source.reset()
+                    result = await self.run_target(target, symbols, phase)
+                    results.append(result)
+                    print_result(result)
+        return results
+
+
+# ============= Reporting =============
+
+def print_result(result: Dict[str, Any]):
+    latency = result["latency_ms"]
+    print(f"{result['target']:<17} {result['size']:>5} {result['phase']:<5} "
+          f"p50 {latency['p50'] or 0:>9.2f}ms  p95 {latency['p95'] or 0:>9.2f}ms  "
+          f"p99 {latency['p99'] or 0:>9.2f}ms  {result['throughput_ops_s'] or 0:>9.1f} ops/s  "
+          f"upstream {result['upstream_calls']['total']:>5}  errors {result['errors']:>3}  "
+          f"rss {result['peak_rss_mb']:.0f}MB")
+    if "wire_bytes" in result:
+        print(f"{'':<29}body {result['body_bytes'] / 1024:>9.1f}KB  wire {result['wire_bytes'] / 1024:>9.1f}KB")
+    if "encode_ms_p50" in result:
+        encoders = "  ".join(f"{name} {ms:.3f}ms" for name, ms in result["encode_ms_p50"].items())
+        sizes = "  ".join(f"{name} {size / 1024:.1f}KB" for name, size in result["payload_bytes"].items())
+        print(f"{'':<29}encode p50: {encoders}  |  {sizes}")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except:
+        return None
+
+
+def compare_results(old_file: str, new_file: str):
+    """Print p50/p95/throughput changes between two result files"""
+    with open(old_file, 'r') as f:
+        old = {(r["target"], r["size"], r["phase"]): r for r in json.load(f)["results"]}
+    with open(new_file, 'r') as f:
+        new = json.load(f)["results"]
+
+    def change(before, after):
+        if not before or after is None:
+            return "     n/a"
+        return f"{(after - before) / before * 100:+7.1f}%"
+
+    print(f"{'target':<17} {'size':>5} {'phase':<5}  {'p50':>8}  {'p95':>8}  {'ops/s':>8}  {'upstream':>8}  {'wire':>8}")
+    for result in new:
+        key = (result["target"], result["size"], result["phase"])
+        before = old.get(key)
+        if before is None:
+            continue
+        print(f"{key[0]:<17} {key[1]:>5} {key[2]:<5}  "
+              f"{change(before['latency_ms']['p50'], result['latency_ms']['p50'])}  "
+              f"{change(before['latency_ms']['p95'], result['latency_ms']['p95'])}  "
+              f"{change(before['throughput_ops_s'], result['throughput_ops_s'])}  "
+              f"{change(before['upstream_calls']['total'], result['upstream_calls']['total'])}  "
+              f"{change(before.get('wire_bytes'), result.get('wire_bytes'))}")
+
+
+def setup_environment(cache_dir: str, fixtures: str, latency_ms: float, jitter_ms: float):
+    """Point every ROIC module at offline fixtures and a scratch cache"""
+    os.environ["ROIC_DATA_SOURCE"] = f"fixture:{fixtures}"
+    os.environ["ROIC_FIXTURE_LATENCY_MS"] = str(latency_ms)
+    os.environ["ROIC_FIXTURE_JITTER_MS"] = str(jitter_ms)
+    os.environ["ROIC_CACHE_DIR"] = cache_dir
+    os.environ["ROIC_API_ENABLED"] = "0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ROIC performance benchmark")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated symbol counts")
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help=f"Comma-separated subset of {', '.join(TARGETS)}")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Injected upstream latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency per call")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight per target")
+    parser.add_argument("--fixtures", help="Existing fixture directory (generated when omitted)")
+    parser.add_argument("--no-warm", action="store_true", help="Skip the warm-cache pass")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Diff two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"Unknown targets: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="roic-bench-") as scratch:
+        fixtures = args.fixtures or os.path.join(scratch, "fixtures")
+        if not args.fixtures:
+            generate_fixtures(fixtures, benchmark_symbols(max(sizes)))
+        setup_environment(os.path.join(scratch, "cache"), fixtures, args.latency_ms, args.jitter_ms)
+
+        runner = BenchmarkRunner(fixtures, args.latency_ms, args.jitter_ms, args.concurrency)
+        results = asyncio.run(runner.run(targets, sizes, warm=not args.no_warm))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "concurrency": args.concurrency,
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+ROIC Snapshot Cache
+In-process TTL + LRU cache for per-symbol fundamentals snapshots
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class SnapshotCache:
+    """
+    Thread-safe TTL cache with LRU eviction
+
+    Keys are (symbol, provider, period) tuples so every ROICProvider code path
+    that needs the same statements shares one fetch.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        self.max_entries = max_entries or int(os.environ.get('ROIC_CACHE_MAX_ENTRIES', '1024'))
+        self.ttl = ttl if ttl is not None else float(os.environ.get('ROIC_CACHE_TTL', '900'))
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(symbol: str, provider: str = 'yfinance', period: str = 'annual') -> Tuple[str, str, str]:
+        """Normalise a (symbol, provider, period) cache key"""
+        return (symbol.strip().upper(), provider, period)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value or None if missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        """Store a value, evicting the least recently used entries if full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any], ttl: float = None) -> Any:
+        """Return the cached value, calling fetch() and caching it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key: Hashable = None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def keys(self) -> List[Hashable]:
+        """Snapshot of the cached keys (expired entries included until touched)"""
+        with self._lock:
+            return list(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for verifying request dedup"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / total) if total else 0.0
+            }
+
+    def reset_stats(self):
+        """Zero the hit/miss/eviction counters"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
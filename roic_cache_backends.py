@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+ROIC Shared Cache Backends
+Cross-process cache and rate limiter backends, so several backend workers
+share one warm cache and one set of upstream rate limits
+
+Select the backend with ROIC_CACHE_BACKEND:
+    memory                      per-process SnapshotCache (default)
+    sqlite[:/path/to/file.db]   shared file in WAL mode (one host)
+    redis://[:password@]host:port/db
+                                any server speaking the Redis protocol
+ROIC_RATE_LIMIT_BACKEND overrides the choice for the rate limiters only.
+
+Shared entries are stored as JSON (never pickle), so whoever can write to
+the database file or the server can at worst poison cached data, not run
+code in the workers reading it.
+"""
+
+import asyncio
+import base64
+import datetime
+import json
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from urllib.parse import unquote, urlparse
+
+from roic_cache import SnapshotCache
+from roic_concurrency import RateLimiter
+from roic_data_sources import Record, to_dict
+from roic_encoding import dumps
+from roic_statement_store import DEFAULT_CACHE_DIR
+
+DEFAULT_SHARED_CACHE_FILE = os.path.join(DEFAULT_CACHE_DIR, "shared_cache.db")
+
+# Expired rows are swept and the size cap enforced once per this many writes
+SQLITE_PRUNE_EVERY = 256
+
+
+def _encode_key(key: Hashable) -> str:
+    return json.dumps(list(key) if isinstance(key, tuple) else key)
+
+
+def _decode_key(text: str) -> Hashable:
+    key = json.loads(text)
+    return tuple(key) if isinstance(key, list) else key
+
+
+# ============= Value encoding =============
+
+# Marks an encoded non-JSON value: {"__roic__": kind, "value": ...}
+TAG = "__roic__"
+
+# Classes stored by name; each provides to_cache() -> dict and from_cache(dict)
+CACHE_TYPES: Dict[str, type] = {}
+
+
+def register_cache_type(cls: type) -> type:
+    """Class decorator letting instances be stored in the shared caches"""
+    CACHE_TYPES[cls.__name__] = cls
+    return cls
+
+
+def _tagged(kind: str, value: Any) -> Dict[str, Any]:
+    return {TAG: kind, "value": value}
+
+
+def _tag(value: Any) -> Any:
+    """Rewrite value into plain JSON types, tagging whatever JSON cannot hold"""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else _tagged("float", repr(value))
+    if isinstance(value, dict):
+        if TAG in value:
+            # Would read back as a tag: store as key/value pairs instead
+            return _tagged("dict", [[str(k), _tag(v)] for k, v in value.items()])
+        return {str(k): _tag(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_tag(item) for item in value]
+    if isinstance(value, tuple):
+        return _tagged("tuple", [_tag(item) for item in value])
+    if isinstance(value, (bytes, bytearray)):
+        return _tagged("bytes", base64.b64encode(value).decode("ascii"))
+    if isinstance(value, datetime.datetime):
+        return _tagged("datetime", value.isoformat())
+    if isinstance(value, datetime.date):
+        return _tagged("date", value.isoformat())
+    if type(value).__name__ in CACHE_TYPES:
+        return _tagged(type(value).__name__, _tag(value.to_cache()))
+    if hasattr(value, "item") and hasattr(value, "dtype"):
+        # NumPy scalar
+        return _tag(value.item())
+    if isinstance(value, Record) or hasattr(value, "model_dump") or hasattr(value, "__dict__"):
+        # Result rows (Records, OpenBB objects) come back as Records
+        return _tagged("record", _tag(to_dict(value)))
+    return value
+
+
+_UNTAG: Dict[str, Callable[[Any], Any]] = {
+    "float": float,
+    "dict": dict,
+    "tuple": tuple,
+    "bytes": base64.b64decode,
+    "datetime": datetime.datetime.fromisoformat,
+    "date": datetime.date.fromisoformat,
+    "record": lambda fields: Record(**fields),
+}
+
+
+def _untag(obj: Dict[str, Any]) -> Any:
+    kind = obj.get(TAG)
+    if kind is None or len(obj) != 2:
+        return obj
+    if kind in _UNTAG:
+        return _UNTAG[kind](obj["value"])
+    if kind in CACHE_TYPES:
+        return CACHE_TYPES[kind].from_cache(obj["value"])
+    raise ValueError(f"Unknown cached type '{kind}'")
+
+
+def encode_value(value: Any) -> bytes:
+    """JSON bytes for a cache entry (dicts, lists, Records, dates, bytes, registered types)"""
+    return dumps(_tag(value))
+
+
+def decode_value(data: bytes) -> Any:
+    """Inverse of encode_value"""
+    # Tuples arrive as {"__roic__": "tuple"} objects, so lists stay lists
+    return json.loads(data, object_hook=_untag)
+
+
+def cache_backend() -> str:
+    return os.environ.get('ROIC_CACHE_BACKEND', 'memory').strip() or 'memory'
+
+
+def _is_redis(backend: str) -> bool:
+    return backend.startswith(("redis://", "rediss://"))
+
+
+def _sqlite_path(backend: str) -> str:
+    path = backend[len("sqlite:"):] if backend.startswith("sqlite:") else ""
+    return os.path.expanduser(path) if path else DEFAULT_SHARED_CACHE_FILE
+
+
+# ============= SQLite (WAL) =============
+
+class _SQLiteFile:
+    """Per-thread WAL connections to one database file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; multi-statement updates use explicit BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class SQLiteCache(SnapshotCache):
+    """
+    SnapshotCache stored in a shared SQLite file
+
+    Every process opening the same file sees the same entries. Expiry uses
+    wall-clock time; eviction drops the entries closest to expiry.
+    """
+
+    def __init__(self, path: str = None, namespace: str = "default",
+                 max_entries: int = None, ttl: float = None):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.namespace = namespace
+        self.db = _SQLiteFile(path or DEFAULT_SHARED_CACHE_FILE)
+        self._writes = 0
+        self.db.connect().execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        """)
+
+    def _decode(self, data: bytes) -> Optional[Any]:
+        try:
+            return decode_value(data)
+        except (ValueError, TypeError) as e:
+            # Foreign or pre-JSON entry: treat as a miss, the next set overwrites it
+            print(f"SQLite cache entry skipped ({self.namespace}): {str(e)[:100]}")
+            return None
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        row = self.db.connect().execute(
+            "SELECT value FROM cache_entries WHERE namespace=? AND key=? AND expires_at>=?",
+            (self.namespace, _encode_key(key), time.time())
+        ).fetchone()
+        value = None if row is None else self._decode(row[0])
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        conn = self.db.connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, _encode_key(key), encode_value(value), expires_at)
+        )
+        self._writes += 1
+        if self._writes % SQLITE_PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries, then the soonest-expiring ones above max_entries"""
+        conn = self.db.connect()
+        conn.execute("DELETE FROM cache_entries WHERE namespace=? AND expires_at<?",
+                     (self.namespace, time.time()))
+        overflow = self._count() - self.max_entries
+        if overflow > 0:
+            conn.execute("""
+                DELETE FROM cache_entries WHERE namespace=? AND key IN (
+                    SELECT key FROM cache_entries WHERE namespace=? ORDER BY expires_at LIMIT ?
+                )
+            """, (self.namespace, self.namespace, overflow))
+            self.evictions += overflow
+
+    def _count(self) -> int:
+        return self.db.connect().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace=?", (self.namespace,)
+        ).fetchone()[0]
+
+    def invalidate(self, key: Hashable = None):
+        if key is None:
+            self.db.connect().execute("DELETE FROM cache_entries WHERE namespace=?", (self.namespace,))
+        else:
+            self.db.connect().execute("DELETE FROM cache_entries WHERE namespace=? AND key=?",
+                                      (self.namespace, _encode_key(key)))
+
+    def keys(self) -> List[Hashable]:
+        rows = self.db.connect().execute(
+            "SELECT key FROM cache_entries WHERE namespace=?", (self.namespace,)
+        ).fetchall()
+        return [_decode_key(row[0]) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": "sqlite",
+            "path": self.db.path,
+            "entries": self._count(),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / total) if total else 0.0
+        }
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """Token bucket whose state lives in a shared SQLite file"""
+
+    def __init__(self, name: str, rate: float, burst: float = None, path: str = None):
+        super().__init__(rate, burst)
+        self.name = name
+        self.db = _SQLiteFile(path or DEFAULT_SHARED_CACHE_FILE)
+        self.db.connect().execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+
+    def _reserve(self) -> float:
+        conn = self.db.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM rate_limits WHERE name=?", (self.name,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + max(now - row[1], 0) * self.rate)
+            tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO rate_limits (name, tokens, updated) VALUES (?, ?, ?)",
+                         (self.name, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+
+# ============= Redis protocol =============
+
+class RedisError(Exception):
+    """Error reply from the server"""
+
+
+class RespClient:
+    """
+    Minimal Redis protocol (RESP2) client, one socket per thread
+    Only plain commands are used (GET/SET/DEL/SCAN/INCR/PEXPIRE), so any
+    Redis-compatible server or local stand-in will do.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.url = url
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.use_ssl = parsed.scheme == "rediss"
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        if self.use_ssl:
+            import ssl
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+        if self.password:
+            self._command("AUTH", self.password)
+        if self.db:
+            self._command("SELECT", self.db)
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _command(self, *args) -> Any:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._local.sock.sendall(b"".join(parts))
+        return self._read()
+
+    def _read(self) -> Any:
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line[:50]!r}")
+
+    def execute(self, *args) -> Any:
+        """Send one command, reconnecting once if the socket went away"""
+        for attempt in range(2):
+            try:
+                if getattr(self._local, 'sock', None) is None:
+                    self._connect()
+                return self._command(*args)
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+
+    def scan(self, pattern: str) -> List[bytes]:
+        keys, cursor = [], b"0"
+        while True:
+            cursor, batch = self.execute("SCAN", cursor, "MATCH", pattern, "COUNT", 1000)
+            keys.extend(batch)
+            if cursor in (b"0", 0, "0"):
+                return keys
+
+
+class RedisCache(SnapshotCache):
+    """
+    SnapshotCache stored on a Redis-protocol server
+
+    Entries expire server-side (SET ... PX); size is bounded by the
+    server's own eviction policy. If the server is unreachable lookups
+    degrade to misses instead of failing requests.
+    """
+
+    def __init__(self, url: str, namespace: str = "default", max_entries: int = None, ttl: float = None):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.client = RespClient(url)
+        self.namespace = namespace
+        self.prefix = f"roic:{namespace}:"
+        self.errors = 0
+
+    def _error(self, action: str, e: Exception):
+        self.errors += 1
+        if self.errors == 1 or self.errors % 1000 == 0:
+            print(f"Redis cache {action} error ({self.client.host}:{self.client.port}): {str(e)[:100]}")
+
+    def _decode(self, data: bytes) -> Optional[Any]:
+        try:
+            return decode_value(data)
+        except (ValueError, TypeError) as e:
+            self._error("decode", e)
+            return None
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        try:
+            data = self.client.execute("GET", self.prefix + _encode_key(key))
+        except Exception as e:
+            self._error("get", e)
+            data = None
+        value = None if data is None else self._decode(data)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        ttl_ms = max(int((self.ttl if ttl is None else ttl) * 1000), 1)
+        try:
+            self.client.execute("SET", self.prefix + _encode_key(key), encode_value(value), "PX", ttl_ms)
+        except Exception as e:
+            self._error("set", e)
+
+    def invalidate(self, key: Hashable = None):
+        try:
+            names = self.client.scan(self.prefix + "*") if key is None else [self.prefix + _encode_key(key)]
+            if names:
+                self.client.execute("DEL", *names)
+        except Exception as e:
+            self._error("invalidate", e)
+
+    def keys(self) -> List[Hashable]:
+        try:
+            names = self.client.scan(self.prefix + "*")
+        except Exception as e:
+            self._error("scan", e)
+            return []
+        return [_decode_key(name.decode()[len(self.prefix):]) for name in names]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "server": f"{self.client.host}:{self.client.port}/{self.client.db}",
+            # No "entries": counting them would SCAN the keyspace on every scrape
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": (self.hits / total) if total else 0.0
+        }
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Fixed-window limiter shared through INCR counters
+
+    Each window (1s, or 1/rate for rates below one per second) admits
+    rate x window requests across all processes; callers over the limit
+    retry in the next window. Falls back to the local token bucket if the
+    server is unreachable.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float = None, url: str = None):
+        super().__init__(rate, burst)
+        self.client = RespClient(url)
+        self.key = f"roic:ratelimit:{name}"
+        self.window = max(1.0, 1.0 / rate) if rate else 1.0
+        self.limit = max(1, int(rate * self.window))
+
+    def _try(self) -> float:
+        """0 when admitted, otherwise seconds until the next window"""
+        now = time.time()
+        slot = int(now // self.window)
+        try:
+            count = self.client.execute("INCR", f"{self.key}:{slot}")
+            if count == 1:
+                self.client.execute("PEXPIRE", f"{self.key}:{slot}", int(self.window * 2000))
+        except Exception as e:
+            print(f"Redis rate limiter error ({self.key}): {str(e)[:100]}")
+            return self._reserve()
+        if count <= self.limit:
+            return 0.0
+        return (slot + 1) * self.window - now
+
+    def acquire(self):
+        if not self.rate:
+            return
+        delay = self._try()
+        while delay > 0:
+            self.waits += 1
+            self.waited_seconds += delay
+            time.sleep(delay)
+            delay = self._try()
+
+    async def acquire_async(self):
+        if not self.rate:
+            return
+        delay = self._try()
+        while delay > 0:
+            self.waits += 1
+            self.waited_seconds += delay
+            await asyncio.sleep(delay)
+            delay = self._try()
+
+
+# ============= Factories =============
+
+def make_cache(namespace: str, max_entries: int = None, ttl: float = None) -> SnapshotCache:
+    """Cache for one namespace on the configured backend"""
+    backend = cache_backend()
+    if _is_redis(backend):
+        return RedisCache(backend, namespace, max_entries=max_entries, ttl=ttl)
+    if backend == "sqlite" or backend.startswith("sqlite:"):
+        return SQLiteCache(_sqlite_path(backend), namespace, max_entries=max_entries, ttl=ttl)
+    if backend != "memory":
+        print(f"Unknown ROIC_CACHE_BACKEND '{backend}', using memory")
+    return SnapshotCache(max_entries=max_entries, ttl=ttl)
+
+
+def make_rate_limiter(name: str, rate: float, burst: float = None) -> RateLimiter:
+    """Rate limiter on the configured backend (shared unless memory)"""
+    backend = os.environ.get('ROIC_RATE_LIMIT_BACKEND', '').strip() or cache_backend()
+    if rate and _is_redis(backend):
+        return RedisRateLimiter(name, rate, burst, url=backend)
+    if rate and (backend == "sqlite" or backend.startswith("sqlite:")):
+        return SQLiteRateLimiter(name, rate, burst, path=_sqlite_path(backend))
+    return RateLimiter(rate, burst)
@@ -14,6 +14,8 @@ from datetime import datetime
 # Add ROIC provider to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from openbb_roic_provider import roic_provider, roic_metrics, roic_forecast
+from roic_results import ForecastBatch, MetricsBatch
+from roic_scoring import investment_grade, quality_label
 
 class ROICExtension:
     """
@@ -30,7 +32,7 @@ class ROICExtension:
         Mimics: /equity/fundamental/metrics --symbol AAPL --provider roic
         """
         data = roic_metrics(symbol)
-        df = pd.DataFrame([data])
+        df = MetricsBatch.from_records([data]).to_pandas()
         
         # Display in CLI-friendly format
         print(f"\n{'='*60}")
@@ -39,12 +41,12 @@ class ROICExtension:
         
         for col in df.columns:
             value = df[col].iloc[0]
-            if value is not None:
+            if pd.notna(value):
                 if col == 'roic':
                     print(f"Return on Invested Capital: {value:.2f}%")
                     self._print_quality_assessment(value)
                 elif col == 'quality_score':
-                    print(f"Quality Score: {value}/100")
+                    print(f"Quality Score: {value:.0f}/100")
                 elif col == 'moat_rating':
                     print(f"Competitive Moat: {value}")
                 elif col == 'fair_value' and isinstance(value, (int, float)):
@@ -60,24 +62,8 @@ class ROICExtension:
     
     def _print_quality_assessment(self, roic: float):
         """Print quality assessment based on ROIC"""
-        if roic > 30:
-            print(f"Quality Rating: ⭐⭐⭐⭐⭐ Exceptional")
-            print("Investment Grade: A+ (Premium business)")
-        elif roic > 20:
-            print(f"Quality Rating: ⭐⭐⭐⭐⭐ Excellent")
-            print("Investment Grade: A (High quality)")
-        elif roic > 15:
-            print(f"Quality Rating: ⭐⭐⭐⭐ Very Good")
-            print("Investment Grade: B+ (Good quality)")
-        elif roic > 10:
-            print(f"Quality Rating: ⭐⭐⭐ Good")
-            print("Investment Grade: B (Average quality)")
-        elif roic > 5:
-            print(f"Quality Rating: ⭐⭐ Fair")
-            print("Investment Grade: C (Below average)")
-        else:
-            print(f"Quality Rating: ⭐ Poor")
-            print("Investment Grade: D (Low quality)")
+        print(f"Quality Rating: {quality_label(roic)}")
+        print(f"Investment Grade: {investment_grade(roic)}")
     
     def quality_forecast(self, symbol: str, export: Optional[str] = None) -> pd.DataFrame:
         """
@@ -114,7 +100,7 @@ class ROICExtension:
         if data.get('3_year_target'):
             print(f"  3 Years: ${data['3_year_target']:.2f}")
         
-        df = pd.DataFrame([data])
+        df = ForecastBatch.from_records([data]).to_pandas()
         
         if export:
             self._export_data(df, symbol, "quality_forecast", export)
@@ -126,40 +112,30 @@ class ROICExtension:
         Compare quality metrics across multiple symbols
         Usage: compare_quality(["AAPL", "MSFT", "GOOGL"])
         """
-        results = []
-        
         print(f"\n{'='*70}")
         print(f"  ROIC.AI QUALITY COMPARISON")
         print('='*70)
         
-        for symbol in symbols:
-            print(f"\nAnalyzing {symbol}...")
-            data = roic_metrics(symbol)
-            data['symbol'] = symbol
-            results.append(data)
-        
-        df = pd.DataFrame(results)
+        print(f"\nAnalyzing {len(symbols)} symbols...")
+        batch, errors = self.provider.get_metrics_batch(symbols)
+        for symbol, error in errors.items():
+            print(f"  ⚠️  {symbol}: {error}")
         
         # Sort by ROIC
-        if 'roic' in df.columns:
-            df = df.sort_values('roic', ascending=False)
+        batch = batch.sort_by('roic')
         
         # Display comparison table
         print("\n" + "="*70)
         print("QUALITY RANKINGS")
         print("="*70)
         
-        for idx, row in df.iterrows():
-            symbol = row['symbol']
-            roic = row.get('roic', 0)
-            quality = row.get('quality_score', 0)
-            moat = row.get('moat_rating', 'Unknown')
-            
-            if roic:
-                print(f"\n{symbol}:")
-                print(f"  ROIC: {roic:.2f}%")
-                print(f"  Quality Score: {quality}/100")
-                print(f"  Moat: {moat}")
+        for row in batch.valid():
+            print(f"\n{row.symbol}:")
+            print(f"  ROIC: {row.roic:.2f}%")
+            print(f"  Quality Score: {row.quality_score or 0:.0f}/100")
+            print(f"  Moat: {row.moat_rating}")
+        
+        df = batch.to_pandas()
         
         if export:
             self._export_data(df, "comparison", "quality_comparison", export)
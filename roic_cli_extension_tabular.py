@@ -16,6 +16,8 @@ import json
 
 # Import the original ROIC provider
 from openbb_roic_provider import roic_provider, roic_metrics, roic_forecast
+from roic_results import MetricsBatch
+from roic_scoring import quality_label, score_grade
 
 console = Console()
 
@@ -66,7 +68,7 @@ class ROICTabularExtension:
         console.print(table)
         
         # Also create DataFrame for export
-        df = pd.DataFrame([data])
+        df = MetricsBatch.from_records([data]).to_pandas()
         
         # Display as OpenBB-style DataFrame
         if not df.empty:
@@ -81,33 +83,11 @@ class ROICTabularExtension:
     
     def _get_quality_assessment(self, roic: float) -> str:
         """Get quality assessment with stars"""
-        if roic > 30:
-            return "⭐⭐⭐⭐⭐ Exceptional"
-        elif roic > 20:
-            return "⭐⭐⭐⭐⭐ Excellent"
-        elif roic > 15:
-            return "⭐⭐⭐⭐ Very Good"
-        elif roic > 10:
-            return "⭐⭐⭐ Good"
-        elif roic > 5:
-            return "⭐⭐ Fair"
-        else:
-            return "⭐ Poor"
+        return quality_label(roic)
     
     def _get_score_rating(self, score: int) -> str:
         """Get rating based on quality score"""
-        if score >= 90:
-            return "A+"
-        elif score >= 80:
-            return "A"
-        elif score >= 70:
-            return "B+"
-        elif score >= 60:
-            return "B"
-        elif score >= 50:
-            return "C"
-        else:
-            return "D"
+        return score_grade(score)
     
     def forecast_table(self, symbol: str, export: Optional[str] = None) -> pd.DataFrame:
         """
@@ -180,14 +160,15 @@ class ROICTabularExtension:
         """
         Compare stocks in OpenBB-style table
         """
-        results = []
+        df, errors = self.provider.get_metrics_many(symbols)
+        for symbol, error in errors.items():
+            console.print(f"[yellow]⚠️  {symbol}: {error}[/yellow]")
         
-        for symbol in symbols:
-            data = roic_metrics(symbol)
-            data['Symbol'] = symbol
-            results.append(data)
+        if df.empty:
+            console.print("[red]No data available for comparison[/red]")
+            return df
         
-        df = pd.DataFrame(results)
+        df['Symbol'] = df['symbol']
         
         # Reorder columns
         col_order = ['Symbol', 'roic', 'quality_score', 'moat_rating']
@@ -214,8 +195,8 @@ class ROICTabularExtension:
         
         for _, row in df.iterrows():
             symbol = row.get('Symbol', '')
-            roic = row.get('roic', 0)
-            quality = row.get('quality_score', 0)
+            roic = row.get('roic') if pd.notna(row.get('roic')) else None
+            quality = row.get('quality_score') if pd.notna(row.get('quality_score')) else None
             moat = row.get('moat_rating', 'Unknown')
             
             grade = self._get_score_rating(quality) if quality else "N/A"
@@ -223,7 +204,7 @@ class ROICTabularExtension:
             table.add_row(
                 symbol,
                 f"{roic:.2f}" if roic else "N/A",
-                f"{quality}/100" if quality else "N/A",
+                f"{quality:.0f}/100" if quality else "N/A",
                 moat,
                 grade
             )
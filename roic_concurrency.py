@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+ROIC Concurrency Helpers
+Per-upstream rate limiting, worker pools and request coalescing shared by
+every code path in the process
+"""
+
+import asyncio
+import concurrent.futures
+import copy
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from roic_telemetry import add_collector
+
+# Default requests/second per upstream (0 disables limiting)
+DEFAULT_RATE_LIMITS = {
+    "roic.ai": 10.0,
+    "yfinance": 8.0,
+    "polygon": 5.0,
+    "finviz": 2.0,
+    "fred": 5.0,
+}
+
+# Worker threads per upstream; this also caps concurrent in-flight requests
+# to that upstream so one slow provider can't starve the others
+DEFAULT_UPSTREAM_WORKERS = {
+    "roic.ai": 16,
+    "yfinance": 16,
+    "polygon": 8,
+    "finviz": 4,
+    "fred": 4,
+}
+
+
+def _env_name(prefix: str, upstream: str) -> str:
+    return prefix + upstream.upper().replace(".", "_").replace("-", "_")
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket
+
+    acquire() blocks the calling (worker) thread until a token is available,
+    so it is safe to use from executor threads serving any event loop.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    def _reserve(self) -> float:
+        """Take one token, returning how long the caller must wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """Block until the next request to this upstream may go out"""
+        if not self.rate:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            self.waits += 1
+            self.waited_seconds += delay
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """Like acquire(), but waits without blocking the event loop"""
+        if not self.rate:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            self.waits += 1
+            self.waited_seconds += delay
+            await asyncio.sleep(delay)
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(upstream: str) -> RateLimiter:
+    """
+    Process-wide limiter for an upstream
+
+    Override the default with ROIC_RATE_LIMIT_<UPSTREAM>, e.g.
+    ROIC_RATE_LIMIT_YFINANCE=4 or ROIC_RATE_LIMIT_ROIC_AI=0 (unlimited).
+    With a shared ROIC_CACHE_BACKEND the budget is shared by every process
+    using that backend (see roic_cache_backends).
+    """
+    limiter = _rate_limiters.get(upstream)
+    if limiter is None:
+        with _rate_limiters_lock:
+            limiter = _rate_limiters.get(upstream)
+            if limiter is None:
+                env_name = _env_name("ROIC_RATE_LIMIT_", upstream)
+                rate = float(os.environ.get(env_name, DEFAULT_RATE_LIMITS.get(upstream, 0.0)))
+                # Imported here: roic_cache_backends builds on RateLimiter
+                from roic_cache_backends import make_rate_limiter
+                limiter = make_rate_limiter(upstream, rate)
+                _rate_limiters[upstream] = limiter
+    return limiter
+
+
+def throttle(upstream: Optional[str]):
+    """Wait for a request slot on an upstream (no-op for None)"""
+    if upstream:
+        get_rate_limiter(upstream).acquire()
+
+
+class UpstreamPool:
+    """
+    Dedicated worker pool for blocking calls to one upstream
+
+    Blocking SDK/HTTP calls run here instead of on the event loop, and the
+    pool size is the upstream's concurrency cap: extra calls queue up
+    without holding threads that other upstreams need.
+    """
+
+    def __init__(self, upstream: str, workers: int):
+        self.upstream = upstream
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix=f"roic-{upstream}"
+        )
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.running = 0
+        self.peak_running = 0
+
+    def _run(self, fn: Callable, args: tuple, kwargs: dict):
+        with self._lock:
+            self.running += 1
+            self.peak_running = max(self.peak_running, self.running)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """Queue fn(*args, **kwargs) on this upstream's workers"""
+        with self._lock:
+            self.submitted += 1
+        return self._executor.submit(self._run, fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self.running,
+                "queued": self.submitted - self.completed - self.running,
+                "peak_running": self.peak_running,
+                "completed": self.completed
+            }
+
+
+_upstream_pools: Dict[str, UpstreamPool] = {}
+_upstream_pools_lock = threading.Lock()
+
+
+def get_upstream_pool(upstream: str) -> UpstreamPool:
+    """
+    Process-wide worker pool for an upstream
+
+    Size it with ROIC_UPSTREAM_WORKERS_<UPSTREAM>, e.g.
+    ROIC_UPSTREAM_WORKERS_YFINANCE=8; upstreams without a default use
+    ROIC_UPSTREAM_WORKERS (8).
+    """
+    pool = _upstream_pools.get(upstream)
+    if pool is None:
+        with _upstream_pools_lock:
+            pool = _upstream_pools.get(upstream)
+            if pool is None:
+                default = DEFAULT_UPSTREAM_WORKERS.get(
+                    upstream, int(os.environ.get('ROIC_UPSTREAM_WORKERS', '8'))
+                )
+                workers = int(os.environ.get(_env_name("ROIC_UPSTREAM_WORKERS_", upstream), default))
+                pool = UpstreamPool(upstream, max(workers, 1))
+                _upstream_pools[upstream] = pool
+    return pool
+
+
+async def run_upstream(upstream: str, fn: Callable, *args, **kwargs) -> Any:
+    """Await a blocking upstream call without blocking the event loop"""
+    return await asyncio.wrap_future(get_upstream_pool(upstream).submit(fn, *args, **kwargs))
+
+
+_sync_executor: Optional[ThreadPoolExecutor] = None
+_sync_executor_lock = threading.Lock()
+
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """
+    Run a coroutine to completion from synchronous code
+
+    Without an event loop in this thread it simply gets asyncio.run. From
+    inside a running loop (a sync wrapper called by async code) it runs
+    on a shared helper thread while this thread waits, which stalls the
+    caller's loop for the duration: async code should await the
+    coroutine instead.
+    """
+    global _sync_executor
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    if _sync_executor is None:
+        with _sync_executor_lock:
+            if _sync_executor is None:
+                _sync_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="roic-sync")
+    return _sync_executor.submit(asyncio.run, coro).result()
+
+
+def upstream_stats() -> Dict[str, Dict[str, Any]]:
+    """Worker pool usage per upstream"""
+    return {name: pool.stats() for name, pool in list(_upstream_pools.items())}
+
+
+def _collect_metrics():
+    """Scrape-time /metrics families for worker pools and rate limiters"""
+    pools = upstream_stats()
+    for name, kind, help_text, field in (
+        ("roic_upstream_pool_workers", "gauge", "Worker threads per upstream", "workers"),
+        ("roic_upstream_pool_running", "gauge", "Upstream calls running on a worker", "running"),
+        ("roic_upstream_pool_queued", "gauge", "Upstream calls waiting for a worker (queue depth)", "queued"),
+        ("roic_upstream_pool_completed_total", "counter", "Upstream calls finished", "completed"),
+    ):
+        yield name, kind, help_text, [({"upstream": upstream}, stats[field]) for upstream, stats in pools.items()]
+
+    limiters = list(_rate_limiters.items())
+    yield ("roic_rate_limit_waits_total", "counter", "Requests delayed by an upstream rate limit",
+           [({"upstream": upstream}, limiter.waits) for upstream, limiter in limiters])
+    yield ("roic_rate_limit_wait_seconds_total", "counter", "Time spent waiting on upstream rate limits",
+           [({"upstream": upstream}, limiter.waited_seconds) for upstream, limiter in limiters])
+
+
+add_collector(_collect_metrics)
+
+
+async def bounded_as_completed(fn: Callable[[Any], Awaitable[Any]], items, limit: int):
+    """
+    Yield (item, result) pairs as each fn(item) finishes
+    At most `limit` calls are in flight; an exception is yielded as the
+    result instead of being raised. Unfinished calls are cancelled if the
+    consumer stops early (e.g. a streaming client disconnects).
+    """
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def run(item):
+        async with semaphore:
+            try:
+                return item, await fn(item)
+            except Exception as e:
+                return item, e
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class _Abandoned(Exception):
+    """The shared run was cancelled before producing a result"""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one in-flight execution
+
+    The first caller for a key (the leader) starts the coroutine as its own
+    task; callers that arrive while it is running await that task's result
+    instead of starting their own fetch. Results are shared through a
+    concurrent.futures.Future so followers may live on any thread or event
+    loop. Every caller waits through asyncio.shield, so a cancelled caller
+    (e.g. a client dropping a stream) never cancels the run others share;
+    if the run itself is cancelled (its loop shutting down), waiting
+    callers start a new one instead of failing.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Run fn(*args) once per key at a time, sharing the result"""
+        with self._lock:
+            self.calls += 1
+
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = concurrent.futures.Future()
+                    self._calls[key] = future
+                    self.leaders += 1
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                task = asyncio.ensure_future(fn(*args))
+                task.add_done_callback(lambda task, future=future: self._settle(key, future, task))
+                return await asyncio.shield(task)
+
+            try:
+                # Shallow copy so one caller mutating the result can't affect another
+                return copy.copy(await asyncio.shield(asyncio.wrap_future(future)))
+            except _Abandoned:
+                # The leader's run was cancelled; the next attempt leads or joins a new one
+                continue
+
+    def _settle(self, key: Hashable, future: concurrent.futures.Future, task: asyncio.Future):
+        """Publish a finished run to the callers waiting on it"""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if task.cancelled():
+            future.set_exception(_Abandoned())
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def in_flight(self) -> int:
+        """Number of keys currently being fetched"""
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        """Call/leader/coalesced counters"""
+        return {
+            "calls": self.calls,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight(),
+            "coalesced_ratio": (self.coalesced / self.calls) if self.calls else 0.0
+        }
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+ROIC Market Data Sources
+Small protocol for the upstream data the ROIC tools depend on, with an
+OpenBB-backed implementation and an offline fixture-backed implementation
+
+Select the process-wide source with ROIC_DATA_SOURCE:
+    openbb                  live OpenBB Platform providers (default)
+    fixture:/path/to/dir    recorded JSON/Parquet fixtures
+ROIC_FIXTURE_LATENCY_MS / ROIC_FIXTURE_JITTER_MS inject per-call latency
+into the fixture source so the stack can be load-tested offline.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Protocol
+
+from roic_concurrency import throttle
+from roic_telemetry import upstream_call
+
+# Fields restored to date objects when records are rebuilt from JSON
+DATE_FIELDS = ("period_ending", "date", "filing_date", "accepted_date", "published_date")
+
+# Credentials applied to obb.user.credentials from the environment
+OPENBB_CREDENTIALS = {
+    "finviz_api_key": "FINVIZ_API_KEY",
+    "polygon_api_key": "POLYGON_API_KEY",
+    "fred_api_key": "FRED_API_KEY",
+}
+
+
+class Record(SimpleNamespace):
+    """Attribute-access data row, compatible with OpenBB result objects"""
+
+    def model_dump(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def to_dict(record: Any) -> Dict[str, Any]:
+    """Convert an OpenBB result object (or dict/Record) to a plain dict"""
+    if isinstance(record, dict):
+        return dict(record)
+    if hasattr(record, 'model_dump'):
+        return record.model_dump()
+    return dict(vars(record))
+
+
+def to_date(value: Any) -> Optional[date]:
+    """Parse ISO strings/datetimes to a date"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def to_record(data: Dict[str, Any]) -> Record:
+    """Build a Record with its date fields restored"""
+    data = dict(data)
+    for field in DATE_FIELDS:
+        if field in data and data[field] is not None:
+            data[field] = to_date(data[field])
+    return Record(**data)
+
+
+class MarketDataSource(Protocol):
+    """
+    Upstream data used by ROICProvider, roic_historical, master_forecast
+    and the backends. Every method returns a list of result rows with
+    attribute access (OpenBB result objects or Records).
+    """
+
+    name: str
+
+    def income(self, symbol: str, provider: str = 'yfinance', period: str = 'annual',
+               limit: int = None) -> List[Any]: ...
+
+    def balance(self, symbol: str, provider: str = 'yfinance', period: str = 'annual',
+                limit: int = None) -> List[Any]: ...
+
+    def quote(self, symbol: str, provider: str = 'yfinance') -> List[Any]: ...
+
+    def key_metrics(self, symbol: str, provider: str = 'yfinance') -> List[Any]: ...
+
+    def profile(self, symbol: str, provider: str = 'yfinance') -> List[Any]: ...
+
+    def price_history(self, symbol: str, start_date: str = None, end_date: str = None,
+                      interval: str = '1d', provider: str = 'yfinance') -> List[Any]: ...
+
+    def fred_series(self, series_id: str, provider: str = 'fred') -> List[Any]: ...
+
+    def price_target(self, symbol: str, provider: str = 'finviz') -> List[Any]: ...
+
+
+class OpenBBDataSource:
+    """
+    Live data through the OpenBB Platform
+    obb is imported lazily on first use since the import is slow
+    """
+
+    name = "openbb"
+
+    def __init__(self):
+        self._obb = None
+        self._lock = threading.Lock()
+
+    @property
+    def obb(self):
+        if self._obb is None:
+            with self._lock:
+                if self._obb is None:
+                    from openbb import obb
+
+                    for credential, env_name in OPENBB_CREDENTIALS.items():
+                        if os.environ.get(env_name):
+                            setattr(obb.user.credentials, credential, os.environ[env_name])
+                    self._obb = obb
+        return self._obb
+
+    @staticmethod
+    def _results(response) -> List[Any]:
+        return list(response.results) if response and response.results else []
+
+    def _call(self, provider: str, operation: str, endpoint: Callable[[], Any]) -> List[Any]:
+        """Throttle, then time one obb call for /metrics"""
+        throttle(provider)
+        with upstream_call(provider, operation):
+            return self._results(endpoint())
+
+    def income(self, symbol, provider='yfinance', period='annual', limit=None):
+        kwargs = {"symbol": symbol, "provider": provider, "period": period}
+        if limit:
+            kwargs["limit"] = limit
+        return self._call(provider, "income", lambda: self.obb.equity.fundamental.income(**kwargs))
+
+    def balance(self, symbol, provider='yfinance', period='annual', limit=None):
+        kwargs = {"symbol": symbol, "provider": provider, "period": period}
+        if limit:
+            kwargs["limit"] = limit
+        return self._call(provider, "balance", lambda: self.obb.equity.fundamental.balance(**kwargs))
+
+    def quote(self, symbol, provider='yfinance'):
+        return self._call(provider, "quote", lambda: self.obb.equity.price.quote(symbol=symbol, provider=provider))
+
+    def key_metrics(self, symbol, provider='yfinance'):
+        return self._call(provider, "key_metrics",
+                          lambda: self.obb.equity.fundamental.metrics(symbol=symbol, provider=provider))
+
+    def profile(self, symbol, provider='yfinance'):
+        return self._call(provider, "profile", lambda: self.obb.equity.profile(symbol=symbol, provider=provider))
+
+    def price_history(self, symbol, start_date=None, end_date=None, interval='1d', provider='yfinance'):
+        kwargs = {"symbol": symbol, "interval": interval, "provider": provider}
+        if start_date:
+            kwargs["start_date"] = start_date
+        if end_date:
+            kwargs["end_date"] = end_date
+        return self._call(provider, "price_history", lambda: self.obb.equity.price.historical(**kwargs))
+
+    def fred_series(self, series_id, provider='fred'):
+        return self._call(provider, "fred_series",
+                          lambda: self.obb.economy.fred_series(symbol=series_id, provider=provider))
+
+    def price_target(self, symbol, provider='finviz'):
+        return self._call(provider, "price_target",
+                          lambda: self.obb.equity.estimates.price_target(symbol=symbol, provider=provider))
+
+
+class FixtureDataSource:
+    """
+    Offline data from recorded fixtures
+
+    Layout: <root>/<dataset>/<SYMBOL>.json (a list of records) or
+    <SYMBOL>.parquet, where dataset is one of income, balance, quote,
+    metrics, profile, price_history, price_target or fred. Missing
+    fixtures return an empty list, like an upstream with no data.
+    """
+
+    name = "fixture"
+
+    def __init__(self, root: str, latency: float = 0.0, jitter: float = 0.0):
+        self.root = os.path.expanduser(root)
+        # Seconds added to every call to mimic upstream round-trips
+        self.latency = latency
+        self.jitter = jitter
+        self._cache: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _sleep(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _read(self, dataset: str, key: str) -> List[Dict[str, Any]]:
+        path = os.path.join(self.root, dataset, key)
+        cache_key = f"{dataset}/{key}"
+        rows = self._cache.get(cache_key)
+        if rows is None:
+            if os.path.exists(path + ".json"):
+                with open(path + ".json", 'r') as f:
+                    rows = json.load(f)
+            elif os.path.exists(path + ".parquet"):
+                import pandas as pd
+                rows = pd.read_parquet(path + ".parquet").to_dict(orient="records")
+            else:
+                rows = []
+            with self._lock:
+                self._cache[cache_key] = rows
+        return rows
+
+    def _load(self, dataset: str, key: str) -> List[Any]:
+        self._sleep()
+        return [to_record(row) for row in self._read(dataset, key.upper())]
+
+    def income(self, symbol, provider='yfinance', period='annual', limit=None):
+        rows = self._load("income", symbol)
+        return rows[:limit] if limit else rows
+
+    def balance(self, symbol, provider='yfinance', period='annual', limit=None):
+        rows = self._load("balance", symbol)
+        return rows[:limit] if limit else rows
+
+    def quote(self, symbol, provider='yfinance'):
+        return self._load("quote", symbol)
+
+    def key_metrics(self, symbol, provider='yfinance'):
+        return self._load("metrics", symbol)
+
+    def profile(self, symbol, provider='yfinance'):
+        return self._load("profile", symbol)
+
+    def price_history(self, symbol, start_date=None, end_date=None, interval='1d', provider='yfinance'):
+        rows = self._load("price_history", symbol)
+        start = to_date(start_date)
+        end = to_date(end_date)
+        return [
+            row for row in rows
+            if (start is None or row.date >= start) and (end is None or row.date <= end)
+        ]
+
+    def fred_series(self, series_id, provider='fred'):
+        return self._load("fred", series_id)
+
+    def price_target(self, symbol, provider='finviz'):
+        return self._load("price_target", symbol)
+
+
+class RecordingDataSource:
+    """
+    Pass-through source that saves every response as a JSON fixture
+    Run the tools once against live data to build a FixtureDataSource tree
+    """
+
+    DATASETS = {
+        "income": "income",
+        "balance": "balance",
+        "quote": "quote",
+        "key_metrics": "metrics",
+        "profile": "profile",
+        "price_history": "price_history",
+        "fred_series": "fred",
+        "price_target": "price_target",
+    }
+
+    name = "recording"
+
+    def __init__(self, inner: MarketDataSource, root: str):
+        self.inner = inner
+        self.root = os.path.expanduser(root)
+
+    def __getattr__(self, method: str):
+        dataset = self.DATASETS.get(method)
+        if dataset is None:
+            raise AttributeError(method)
+        fetch = getattr(self.inner, method)
+
+        def record(key, *args, **kwargs):
+            rows = fetch(key, *args, **kwargs)
+            directory = os.path.join(self.root, dataset)
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"{key.upper()}.json"), 'w') as f:
+                json.dump([to_dict(row) for row in rows], f, default=str)
+            return rows
+
+        return record
+
+
+class CountingDataSource:
+    """
+    Pass-through source that counts upstream calls per method
+    Used by the benchmark suite to report upstream fan-out
+    """
+
+    name = "counting"
+
+    def __init__(self, inner: MarketDataSource):
+        self.inner = inner
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, method: str):
+        if method not in RecordingDataSource.DATASETS:
+            raise AttributeError(method)
+        fetch = getattr(self.inner, method)
+
+        def count(*args, **kwargs):
+            with self._lock:
+                self.calls[method] = self.calls.get(method, 0) + 1
+            return fetch(*args, **kwargs)
+
+        return count
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            calls = dict(self.calls)
+        calls["total"] = sum(calls.values())
+        return calls
+
+
+_data_source: Optional[MarketDataSource] = None
+_data_source_lock = threading.Lock()
+
+
+def data_source_from_env() -> MarketDataSource:
+    """Build the data source named by ROIC_DATA_SOURCE"""
+    spec = os.environ.get('ROIC_DATA_SOURCE', 'openbb')
+    if spec.startswith('fixture:'):
+        return FixtureDataSource(
+            spec[len('fixture:'):],
+            latency=float(os.environ.get('ROIC_FIXTURE_LATENCY_MS', '0')) / 1000,
+            jitter=float(os.environ.get('ROIC_FIXTURE_JITTER_MS', '0')) / 1000
+        )
+    return OpenBBDataSource()
+
+
+def get_data_source() -> MarketDataSource:
+    """Process-wide data source"""
+    global _data_source
+    if _data_source is None:
+        with _data_source_lock:
+            if _data_source is None:
+                _data_source = data_source_from_env()
+    return _data_source
+
+
+def set_data_source(source: MarketDataSource):
+    """Swap the process-wide data source (benchmarks, offline runs)"""
+    global _data_source
+    with _data_source_lock:
+        _data_source = source
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+ROIC Response Encoding
+Fast JSON serialization and gzip/brotli content-encoding for backend
+responses
+
+FastJSONResponse renders with the encoder picked by ROIC_JSON:
+    json     standard library (default, same output as JSONResponse)
+    orjson   orjson, if installed
+    msgspec  msgspec, if installed
+    auto     the first of orjson, msgspec, json that is installed
+Routes on hot paths return FastJSONResponse directly, which also skips
+FastAPI's jsonable_encoder pass over already-plain data.
+
+CompressionMiddleware compresses complete responses above
+ROIC_COMPRESS_MIN_BYTES with brotli (when installed) or gzip, whichever
+the client accepts. Streaming responses (SSE, NDJSON) pass through
+untouched so rows still arrive as they are produced.
+"""
+
+import datetime
+import gzip
+import json
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from roic_telemetry import Counter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+
+# ============= JSON =============
+
+def _default(obj: Any) -> Any:
+    """Fallback for values the encoders do not know natively"""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "item") and hasattr(obj, "dtype"):
+        # NumPy scalar
+        return obj.item()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return str(obj)
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    # Same settings as Starlette's JSONResponse
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_default).encode("utf-8")
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default,
+                        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+_msgspec_encoder = msgspec.json.Encoder(enc_hook=_default) if msgspec is not None else None
+
+
+def _msgspec_dumps(obj: Any) -> bytes:
+    return _msgspec_encoder.encode(obj)
+
+
+JSON_ENCODERS: Dict[str, Callable[[Any], bytes]] = {"json": _stdlib_dumps}
+if orjson is not None:
+    JSON_ENCODERS["orjson"] = _orjson_dumps
+if msgspec is not None:
+    JSON_ENCODERS["msgspec"] = _msgspec_dumps
+
+
+def resolve_json_encoder(name: str = None) -> str:
+    """Encoder name for ROIC_JSON, falling back to json if it is not installed"""
+    name = (name if name is not None else os.environ.get('ROIC_JSON', 'json')).strip().lower()
+    if name == "auto":
+        return next(candidate for candidate in ("orjson", "msgspec", "json") if candidate in JSON_ENCODERS)
+    if name not in JSON_ENCODERS:
+        print(f"JSON encoder '{name}' is not available, using json")
+        return "json"
+    return name
+
+
+JSON_ENCODER = resolve_json_encoder()
+dumps: Callable[[Any], bytes] = JSON_ENCODERS[JSON_ENCODER]
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the ROIC_JSON encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# ============= Compression =============
+
+# Bytes before and after content-encoding, by encoding
+COMPRESSION_BYTES = Counter(
+    "roic_http_compression_bytes_total",
+    "Response body bytes before (raw) and after (encoded) compression",
+    ("encoding", "stage")
+)
+
+# Media types that are already compressed or must not be buffered
+SKIP_MEDIA_TYPES = ("text/event-stream", "application/vnd.apache.parquet", "application/gzip",
+                    "application/zip", "image/", "audio/", "video/")
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Preferred content-coding from an Accept-Encoding header: br, gzip or None"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+    ranked = [
+        (weights.get(coding, weights.get("*", 0.0)), -index, coding)
+        for index, coding in enumerate(supported)
+    ]
+    weight, _, coding = max(ranked)
+    return coding if weight > 0 else None
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing complete responses above a size threshold
+
+    Tunables (env):
+        ROIC_COMPRESS            0 disables compression (default 1)
+        ROIC_COMPRESS_MIN_BYTES  smallest body worth compressing (default 1024)
+        ROIC_GZIP_LEVEL          gzip level (default 5)
+        ROIC_BROTLI_QUALITY      brotli quality (default 4)
+
+    Compressed responses get a weak ETag (the bytes differ from the
+    identity representation) and Vary: Accept-Encoding. Encoded bodies of
+    responses with an ETag are memoized, so response cache hits are not
+    recompressed.
+    """
+
+    def __init__(self, app, minimum_size: int = None, gzip_level: int = None,
+                 brotli_quality: int = None, memo_entries: int = 256):
+        self.app = app
+        self.enabled = os.environ.get('ROIC_COMPRESS', '1').lower() not in ('0', 'false', 'no')
+        self.minimum_size = minimum_size if minimum_size is not None else \
+            int(os.environ.get('ROIC_COMPRESS_MIN_BYTES', '1024'))
+        self.gzip_level = gzip_level or int(os.environ.get('ROIC_GZIP_LEVEL', '5'))
+        self.brotli_quality = brotli_quality or int(os.environ.get('ROIC_BROTLI_QUALITY', '4'))
+        self.memo_entries = memo_entries
+        self._memo: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+
+    def compress(self, body: bytes, coding: str) -> bytes:
+        if coding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # mtime=0 keeps the output deterministic for a given body
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def _encoded(self, body: bytes, coding: str, etag: Optional[bytes]) -> bytes:
+        if etag is None:
+            return self.compress(body, coding)
+        key = (etag, coding)
+        encoded = self._memo.get(key)
+        if encoded is None:
+            encoded = self._memo[key] = self.compress(body, coding)
+            if len(self._memo) > self.memo_entries:
+                self._memo.popitem(last=False)
+        else:
+            self._memo.move_to_end(key)
+        return encoded
+
+    @staticmethod
+    def _eligible(headers: List[Tuple[bytes, bytes]]) -> bool:
+        content_type = b""
+        for name, value in headers:
+            name = name.lower()
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+        return not any(content_type.startswith(skip.encode()) for skip in SKIP_MEDIA_TYPES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            return await self.app(scope, receive, send)
+
+        coding = None
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                coding = negotiate_encoding(value.decode("latin-1"))
+                break
+        if coding is None or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+
+        state: Dict[str, Any] = {"start": None}
+
+        async def send_wrapper(message):
+            start = state["start"]
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether it is complete
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            state["start"] = None
+            body = message.get("body", b"")
+            headers = list(start.get("headers", []))
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or start["status"] in (204, 304)
+                    or not self._eligible(headers)):
+                await send(start)
+                await send(message)
+                return
+
+            etag = next((value for name, value in headers if name.lower() == b"etag"), None)
+            encoded = self._encoded(body, coding, etag)
+            COMPRESSION_BYTES.inc(len(body), encoding=coding, stage="raw")
+            COMPRESSION_BYTES.inc(len(encoded), encoding=coding, stage="encoded")
+
+            vary = [value for name, value in headers if name.lower() == b"vary"]
+            headers = [
+                (name, value) for name, value in headers
+                if name.lower() not in (b"content-length", b"etag", b"vary")
+            ]
+            if etag is not None:
+                headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            headers += [
+                (b"content-encoding", coding.encode()),
+                (b"content-length", str(len(encoded)).encode()),
+                (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+            ]
+            await send(dict(start, headers=headers))
+            await send({"type": "http.response.body", "body": encoded})
+
+        await self.app(scope, receive, send_wrapper)
@@ -4,8 +4,10 @@ ROIC Historical Analysis - 10-year quality metrics
 Supports international stocks including Chinese (SSE/SZSE)
 """
 
+import asyncio
 import os
 import sys
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
@@ -13,195 +15,346 @@ from typing import List, Dict, Any, Optional
 # Add virtual environment packages
 sys.path.insert(0, '/Users/sdg223157/OPBB')
 
-def calculate_historical_roic(symbol: str, years: int = 10) -> pd.DataFrame:
+from roic_analytics import CONSISTENCY_THRESHOLD, ROLLING_WINDOW, quality_summary
+from roic_concurrency import bounded_as_completed, run_sync, run_upstream
+from roic_data_sources import get_data_source
+from roic_history_store import HistoryStore, get_history_store
+from roic_price_cache import get_price_cache
+from roic_scoring import quality_label
+from roic_statement_store import fetch_statement
+
+# Columns of a ROIC panel, after the (symbol, fiscal_year) index
+PANEL_COLUMNS = [
+    'revenue', 'operating_income', 'net_income', 'total_assets', 'current_liabilities',
+    'roic', 'profit_margin', 'asset_turnover', 'return_on_equity', 'stock_price',
+    'calendar_year_end_price', 'diluted_eps', 'pe_ratio'
+]
+
+# Symbols fetched at once by build_roic_panel; the upstream worker pools
+# and rate limits still cap the calls actually in flight
+PANEL_CONCURRENCY = int(os.environ.get('ROIC_PANEL_CONCURRENCY', '32'))
+
+# Statement fields used by the panel
+INCOME_FIELDS = ('total_revenue', 'operating_income', 'net_income', 'diluted_earnings_per_share')
+BALANCE_FIELDS = ('total_assets', 'current_liabilities')
+
+# Flat tax rate for NOPAT; 25% is the mainland China statutory rate
+TAX_RATE = 0.25
+
+# Oldest price bar accepted as "the close at" a year end; monthly bars
+# are dated at the start of their month
+PRICE_TOLERANCE = pd.Timedelta(days=45)
+
+# ============= Computation =============
+
+def statement_frame(statements: Dict[str, List[Any]], fields: tuple) -> pd.DataFrame:
     """
-    Calculate historical ROIC for the past N years
+    One row per (symbol, period_ending) from statement records of many symbols
+    Records without a period date are dropped; missing fields become NaN.
+    When a period appears more than once (a restated filing), the record
+    with the latest filing_date / accepted_date wins, or the later record
+    if they carry no filing date.
     """
-    from openbb import obb
+    pairs = [(symbol, record) for symbol, records in statements.items() for record in records or []]
+    records = [record for _, record in pairs]
+    columns = {
+        'symbol': [symbol for symbol, _ in pairs],
+        'period_ending': pd.to_datetime(
+            [getattr(r, 'period_ending', None) or getattr(r, 'date', None) for r in records]
+        ),
+    }
+    for field in fields:
+        columns[field] = pd.to_numeric(pd.Series([getattr(r, field, None) for r in records], dtype=object),
+                                       errors='coerce')
+    df = pd.DataFrame(columns).dropna(subset=['period_ending'])
+    key = ['symbol', 'period_ending']
+    if df.duplicated(key).any():
+        filed = pd.to_datetime(
+            pd.Series([getattr(r, 'filing_date', None) or getattr(r, 'accepted_date', None) for r in records]),
+            errors='coerce'
+        )
+        # Stable sort: undated records keep their order and rank below dated ones
+        order = filed[df.index].sort_values(na_position='first', kind='stable').index
+        df = df.loc[order].drop_duplicates(key, keep='last').sort_index()
+    return df
+
+def compute_roic(income: pd.DataFrame, balance: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join income and balance statements on (symbol, period_ending) and
+    derive ROIC, profit margin and asset turnover as column operations
     
-    print(f"\n{'='*80}")
-    print(f"  📊 HISTORICAL ROIC ANALYSIS: {symbol}")
-    if symbol == "600519.SS":
-        print(f"  贵州茅台 (Kweichow Moutai)")
-    print(f"  Period: {years} Years")
-    print('='*80)
+    Periods present in only one statement are kept with the ratios that
+    need the other statement left as NaN.
+    """
+    df = income.merge(balance, on=['symbol', 'period_ending'], how='outer')
+    df = df.rename(columns={'total_revenue': 'revenue', 'diluted_earnings_per_share': 'diluted_eps'})
+    df['fiscal_year'] = df['period_ending'].dt.year
     
-    results = []
-    current_year = datetime.now().year
+    revenue, operating_income, net_income = df['revenue'], df['operating_income'], df['net_income']
+    total_assets, current_liabilities = df['total_assets'], df['current_liabilities']
     
-    # Get historical financial statements
-    try:
-        print(f"\n⏳ Fetching {years} years of financial data...")
-        
-        # Get income statements (Yahoo limits to 5 years)
-        max_limit = min(years, 5)
-        income = obb.equity.fundamental.income(
-            symbol=symbol, 
-            provider='yfinance',
-            period='annual',
-            limit=max_limit
-        )
-        
-        # Get balance sheets (Yahoo limits to 5 years)
-        balance = obb.equity.fundamental.balance(
-            symbol=symbol,
-            provider='yfinance', 
-            period='annual',
-            limit=max_limit
+    # NOPAT = Operating Income * (1 - Tax Rate)
+    # Invested Capital = Total Assets - Current Liabilities
+    nopat = operating_income * (1 - TAX_RATE)
+    invested_capital = total_assets - current_liabilities
+    # Zero inputs mean "not reported" rather than a real zero
+    reported = operating_income.ne(0) & total_assets.ne(0) & current_liabilities.ne(0)
+    df['roic'] = (nopat / invested_capital * 100).where(reported & (invested_capital > 0))
+    df['profit_margin'] = (net_income / revenue * 100).where(net_income.ne(0) & revenue.ne(0))
+    df['asset_turnover'] = (revenue / total_assets).where(revenue.ne(0) & total_assets.ne(0))
+    
+    # One row per fiscal year: the latest period ending in it
+    return df.sort_values('period_ending').drop_duplicates(['symbol', 'fiscal_year'], keep='last')
+
+def price_frame(history: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Closes of many symbols as one (symbol, date, close) frame sorted by date"""
+    history = {symbol: bars for symbol, bars in history.items() if bars is not None and len(bars)}
+    df = pd.DataFrame({
+        'symbol': pd.Series(np.repeat(list(history), [len(bars) for bars in history.values()]), dtype=str),
+        'date': np.concatenate([bars.index.to_numpy('datetime64[ns]') for bars in history.values()])
+                if history else np.array([], dtype='datetime64[ns]'),
+        'close': np.concatenate([bars['close'].to_numpy('float64') for bars in history.values()])
+                 if history else np.array([], dtype='float64'),
+    })
+    return df.dropna(subset=['close']).sort_values('date', kind='stable')
+
+def align_prices(df: pd.DataFrame, prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Attach the close at each fiscal year end (stock_price) and calendar
+    year end (calendar_year_end_price), and derive P/E from them
+
+    Both are backward as-of joins - a per-symbol binary search for the
+    last bar on or before the date - so the whole panel is aligned in one
+    vectorized pass. Year ends with no bar within PRICE_TOLERANCE stay NaN.
+    """
+    df = df.copy()
+    df['calendar_year_end'] = pd.to_datetime(df['fiscal_year'].astype('int64').astype(str) + '-12-31')
+    # Fiscal years without a period date (estimates) fall back to Dec 31
+    df['fiscal_year_end'] = df['period_ending'].fillna(df['calendar_year_end']) \
+        if 'period_ending' in df else df['calendar_year_end']
+    df['_row'] = range(len(df))
+    
+    for on, column in (('fiscal_year_end', 'stock_price'), ('calendar_year_end', 'calendar_year_end_price')):
+        left = df[['_row', 'symbol', on]].astype({'symbol': str, on: 'datetime64[ns]'}).sort_values(on, kind='stable')
+        aligned = pd.merge_asof(
+            left, prices.rename(columns={'date': on, 'close': column}),
+            on=on, by='symbol', direction='backward', tolerance=PRICE_TOLERANCE
         )
-        
-        if income and income.results and balance and balance.results:
-            print(f"✅ Retrieved {len(income.results)} years of income statements")
-            print(f"✅ Retrieved {len(balance.results)} years of balance sheets")
-            
-            # Match income and balance sheet data by year
-            for i in range(min(len(income.results), len(balance.results))):
-                income_stmt = income.results[i]
-                balance_stmt = balance.results[i]
-                
-                year_data = {
-                    'year': None,
-                    'revenue': None,
-                    'operating_income': None,
-                    'net_income': None,
-                    'total_assets': None,
-                    'current_liabilities': None,
-                    'roic': None,
-                    'profit_margin': None,
-                    'asset_turnover': None
-                }
-                
-                # Get year
-                if hasattr(income_stmt, 'period_ending'):
-                    year_data['year'] = income_stmt.period_ending.year
-                elif hasattr(income_stmt, 'date'):
-                    year_data['year'] = income_stmt.date.year
-                else:
-                    year_data['year'] = current_year - i
-                
-                # Get financial metrics
-                if hasattr(income_stmt, 'total_revenue'):
-                    year_data['revenue'] = income_stmt.total_revenue
-                
-                if hasattr(income_stmt, 'operating_income'):
-                    year_data['operating_income'] = income_stmt.operating_income
-                
-                if hasattr(income_stmt, 'net_income'):
-                    year_data['net_income'] = income_stmt.net_income
-                
-                if hasattr(balance_stmt, 'total_assets'):
-                    year_data['total_assets'] = balance_stmt.total_assets
-                
-                if hasattr(balance_stmt, 'current_liabilities'):
-                    year_data['current_liabilities'] = balance_stmt.current_liabilities
-                
-                # Calculate ROIC
-                if year_data['operating_income'] and year_data['total_assets'] and year_data['current_liabilities']:
-                    # NOPAT = Operating Income * (1 - Tax Rate)
-                    # Estimate tax rate at 25% for Chinese companies
-                    nopat = year_data['operating_income'] * 0.75
-                    
-                    # Invested Capital = Total Assets - Current Liabilities
-                    invested_capital = year_data['total_assets'] - year_data['current_liabilities']
-                    
-                    if invested_capital > 0:
-                        year_data['roic'] = (nopat / invested_capital) * 100
-                
-                # Calculate profit margin
-                if year_data['net_income'] and year_data['revenue']:
-                    year_data['profit_margin'] = (year_data['net_income'] / year_data['revenue']) * 100
-                
-                # Calculate asset turnover
-                if year_data['revenue'] and year_data['total_assets']:
-                    year_data['asset_turnover'] = year_data['revenue'] / year_data['total_assets']
-                
-                results.append(year_data)
-        
-        # Also get historical price data for context
-        if len(results) > 0 and years > 5:
-            print(f"\n📊 Note: Fundamental data limited to {len(results)} years")
-            print("Fetching price history for context...")
-            
-            try:
-                start_date = datetime.now() - timedelta(days=365 * years)
-                hist = obb.equity.price.historical(
-                    symbol=symbol,
-                    start_date=start_date.strftime('%Y-%m-%d'),
-                    interval='1mo',
-                    provider='yfinance'
-                )
-                
-                if hist and hist.results:
-                    # Get yearly price points
-                    yearly_prices = {}
-                    for price_data in hist.results:
-                        year = price_data.date.year
-                        if year not in yearly_prices:
-                            yearly_prices[year] = {
-                                'high': price_data.high,
-                                'low': price_data.low,
-                                'close': price_data.close
-                            }
-                    
-                    print(f"✅ Retrieved {len(yearly_prices)} years of price data")
-                    
-                    # Add price data to results
-                    for result in results:
-                        year = result.get('year')
-                        if year in yearly_prices:
-                            result['stock_price'] = yearly_prices[year]['close']
-            except:
-                pass
-                
-    except Exception as e:
-        print(f"Error fetching financial data: {str(e)[:200]}")
-        
-        # Try alternative calculation method
-        print("\n📈 Attempting simplified calculation...")
-        try:
-            # Get key statistics
-            stats = obb.equity.fundamental.metrics(symbol=symbol, provider='yfinance')
-            if stats and stats.results:
-                current_data = stats.results[0]
-                
-                # Add current year data
-                year_data = {
-                    'year': current_year,
-                    'roic': None,
-                    'profit_margin': None,
-                    'return_on_equity': None
-                }
-                
-                if hasattr(current_data, 'return_on_equity'):
-                    year_data['return_on_equity'] = current_data.return_on_equity * 100
-                
-                if hasattr(current_data, 'profit_margin'):
-                    year_data['profit_margin'] = current_data.profit_margin * 100
-                
-                # Estimate ROIC from ROE
-                if year_data['return_on_equity']:
-                    year_data['roic'] = year_data['return_on_equity'] * 0.8  # Conservative estimate
-                
-                results.append(year_data)
-                
-        except Exception as e2:
-            print(f"Alternative method also failed: {str(e2)[:100]}")
-    
-    # Create DataFrame
-    df = pd.DataFrame(results)
-    
-    # Sort by year
-    if not df.empty and 'year' in df.columns:
-        df = df.sort_values('year')
+        df[column] = aligned.set_index('_row')[column].reindex(df['_row']).to_numpy()
+    
+    if 'diluted_eps' in df:
+        df['pe_ratio'] = (df['stock_price'] / df['diluted_eps']).where(df['diluted_eps'] > 0)
+    return df.drop(columns=['_row', 'calendar_year_end', 'fiscal_year_end'])
+
+def estimated_rows(stats: List[Any], current_year: int = None) -> List[Dict[str, Any]]:
+    """Current-year ROIC estimated from ROE when statements are unavailable"""
+    if not stats:
+        return []
+    current_data = stats[0]
+    
+    year_data = {
+        'year': current_year or datetime.now().year,
+        'roic': None,
+        'profit_margin': None,
+        'return_on_equity': None
+    }
+    
+    if getattr(current_data, 'return_on_equity', None) is not None:
+        year_data['return_on_equity'] = current_data.return_on_equity * 100
+    
+    if getattr(current_data, 'profit_margin', None) is not None:
+        year_data['profit_margin'] = current_data.profit_margin * 100
+    
+    # Estimate ROIC from ROE
+    if year_data['return_on_equity']:
+        year_data['roic'] = year_data['return_on_equity'] * 0.8  # Conservative estimate
+    
+    return [year_data]
+
+def _panel_frame(income: Dict[str, List[Any]], balance: Dict[str, List[Any]],
+                 prices: Dict[str, pd.DataFrame], estimated: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Assemble the (symbol, fiscal_year) panel from the raw data of all symbols"""
+    df = compute_roic(statement_frame(income, INCOME_FIELDS), statement_frame(balance, BALANCE_FIELDS))
+    if estimated:
+        df = pd.concat([df, pd.DataFrame(estimated).rename(columns={'year': 'fiscal_year'})],
+                       ignore_index=True)
+    if prices:
+        df = align_prices(df, price_frame(prices))
+    
+    df = df.reindex(columns=['symbol', 'fiscal_year'] + PANEL_COLUMNS)
+    df = df.astype({column: 'float64' for column in PANEL_COLUMNS})
+    df['fiscal_year'] = df['fiscal_year'].astype('int64')
+    return df.set_index(['symbol', 'fiscal_year']).sort_index()
+
+# ============= Fetching =============
+
+def _price_history(symbol: str, years: int, after_year: int = None) -> pd.DataFrame:
+    """Monthly bars from the shared price cache, which fetches only uncached months"""
+    start_date = datetime.now() - timedelta(days=365 * years)
+    if after_year is not None:
+        # Years up to after_year are already stored; keep one earlier
+        # month so a fiscal year ending at its first bar still aligns
+        start_date = max(start_date, datetime(after_year, 12, 1))
+    return get_price_cache().get(symbol, start_date, interval='1mo')
+
+async def _asymbol_data(symbol: str, years: int, after_year: int = None) -> Dict[str, Any]:
+    """
+    Raw statements and prices for one symbol
+    Income, balance and monthly prices are fetched concurrently on the
+    yfinance worker pool; prices only after after_year when that year is
+    already stored.
+    """
+    # Yahoo limits statements to 5 years; served from the local statement
+    # store until a new filing is due
+    limit = min(years, 5)
+    statements = asyncio.gather(
+        run_upstream('yfinance', fetch_statement, symbol, 'income', 'yfinance', 'annual', limit),
+        run_upstream('yfinance', fetch_statement, symbol, 'balance', 'yfinance', 'annual', limit)
+    )
+    # Always fetched, so every stored year gets its year-end prices; the
+    # shared price cache keeps repeat requests off the network
+    prices = asyncio.ensure_future(run_upstream('yfinance', _price_history, symbol, years, after_year))
+    
+    try:
+        income, balance = await statements
+    except Exception:
+        prices.cancel()
+        # Simplified calculation from current key statistics
+        stats = await run_upstream('yfinance', get_data_source().key_metrics, symbol, provider='yfinance')
+        return {"estimated": estimated_rows(stats)}
+    
+    data = {"income": income or [], "balance": balance or []}
+    try:
+        data["prices"] = await prices
+    except Exception:
+        pass
+    return data
+
+async def abuild_roic_panel(symbols: List[str], years: int = 10, concurrency: int = None,
+                            since: Dict[str, int] = None) -> pd.DataFrame:
+    """
+    Historical ROIC for many symbols as one tidy DataFrame
+    
+    Indexed by (symbol, fiscal_year) with PANEL_COLUMNS as float columns.
+    Symbols are fetched concurrently (concurrency, default
+    ROIC_PANEL_CONCURRENCY) and the ratios computed once for the whole
+    panel; symbols that failed or returned nothing are listed with their
+    error in df.attrs['errors'], and symbols whose rows are current-year
+    estimates (no statements) in df.attrs['estimated']. since maps
+    symbols to their latest stored fiscal year, so only newer prices are
+    fetched for them.
+    """
+    since = since or {}
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+    income: Dict[str, List[Any]] = {}
+    balance: Dict[str, List[Any]] = {}
+    prices: Dict[str, pd.DataFrame] = {}
+    estimated: List[Dict[str, Any]] = []
+    errors: Dict[str, str] = {}
     
+    async for symbol, result in bounded_as_completed(
+        lambda symbol: _asymbol_data(symbol, years, since.get(symbol)), symbols,
+        concurrency or PANEL_CONCURRENCY
+    ):
+        if isinstance(result, Exception):
+            errors[symbol] = str(result)[:200]
+        elif result.get("estimated"):
+            estimated.extend(dict(row, symbol=symbol) for row in result["estimated"])
+        elif result.get("income") or result.get("balance"):
+            income[symbol] = result["income"]
+            balance[symbol] = result["balance"]
+            prices[symbol] = result.get("prices")
+        else:
+            errors[symbol] = "No data"
+    
+    df = _panel_frame(income, balance, prices, estimated)
+    df.attrs['errors'] = errors
+    df.attrs['estimated'] = sorted({row['symbol'] for row in estimated})
     return df
 
+def build_roic_panel(symbols: List[str], years: int = 10, concurrency: int = None) -> pd.DataFrame:
+    """Synchronous wrapper around abuild_roic_panel"""
+    return run_sync(abuild_roic_panel(symbols, years, concurrency))
+
+async def aupdate_history(symbols: List[str], years: int = 10, concurrency: int = None,
+                          store: HistoryStore = None) -> pd.DataFrame:
+    """
+    Bring the stored history of symbols up to date and return it
+    
+    Only fiscal years not stored yet are appended; statements come from
+    the statement store (no network until a filing is due). Symbols whose
+    stored history already reaches back far enough only fetch prices from
+    the year after the latest stored one; the others are fetched in full
+    so older years are backfilled. Current-year estimates (no statements)
+    are returned but not stored, and neither are fiscal years of the
+    current calendar year: their calendar_year_end_price is only final
+    once the year has closed, so they are recomputed until then.
+    """
+    store = store or get_history_store()
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+    current_year = datetime.now().year
+    from_year = current_year - years
+    covered = store.covered_from(symbols)
+    latest = store.latest_years(symbols)
+    since = {symbol: latest[symbol] for symbol, first in covered.items() if first <= from_year}
+    panel = await abuild_roic_panel(symbols, years, concurrency, since=since)
+    
+    estimated_symbols = set(panel.attrs.get('estimated', []))
+    estimated = panel.index.get_level_values('symbol').isin(estimated_symbols)
+    held = estimated | (panel.index.get_level_values('fiscal_year') >= current_year)
+    
+    def store_panel():
+        store.append(panel[~held])
+        # Years the upstream had no data for are not asked for again
+        failed = panel.attrs.get('errors', {})
+        for symbol in symbols:
+            if symbol not in since and symbol not in failed and symbol not in estimated_symbols:
+                store.mark_covered(symbol, from_year)
+    
+    await asyncio.get_running_loop().run_in_executor(None, store_panel)
+    
+    df = store.load(symbols, since_year=from_year)
+    df = pd.concat([df[~df.index.isin(panel.index[held])], panel[held]]).sort_index()
+    df.attrs['errors'] = panel.attrs.get('errors', {})
+    return df
+
+def update_history(symbols: List[str], years: int = 10, concurrency: int = None,
+                   store: HistoryStore = None) -> pd.DataFrame:
+    """Synchronous wrapper around aupdate_history"""
+    return run_sync(aupdate_history(symbols, years, concurrency, store))
+
+def calculate_historical_roic(symbol: str, years: int = 10) -> pd.DataFrame:
+    """
+    Calculate historical ROIC for the past N years
+    One row per year with a 'year' column, oldest first. Served from the
+    history store; only years newer than the stored ones are fetched.
+    """
+    panel = update_history([symbol], years)
+    if panel.empty:
+        return pd.DataFrame()
+    df = panel.xs(panel.index.get_level_values('symbol')[0], level='symbol').reset_index()
+    # Columns the symbol had no data for at all are left out
+    return df.rename(columns={'fiscal_year': 'year'}).dropna(axis=1, how='all')
+
 def display_historical_roic(symbol: str, years: int = 10):
     """
     Display historical ROIC analysis with quality trends
     """
+    print(f"\n{'='*80}")
+    print(f"  📊 HISTORICAL ROIC ANALYSIS: {symbol}")
+    if symbol == "600519.SS":
+        print(f"  贵州茅台 (Kweichow Moutai)")
+    print(f"  Period: {years} Years")
+    print('='*80)
+    print(f"\n⏳ Fetching {years} years of financial data...")
+    
     df = calculate_historical_roic(symbol, years)
     
+    if not df.empty:
+        print(f"✅ Retrieved {len(df)} years of financial data")
+        if years > 5 and len(df) < years:
+            print(f"📊 Note: Fundamental data limited to {len(df)} years")
+    
     if df.empty:
         print("\n❌ No historical data available")
         return df
@@ -212,37 +365,29 @@ def display_historical_roic(symbol: str, years: int = 10):
     print("="*80)
     
     for _, row in df.iterrows():
-        year = row.get('year', 'N/A')
-        roic = row.get('roic')
-        profit_margin = row.get('profit_margin')
+        # Fields missing for the year (NaN, e.g. no balance sheet) are skipped
+        values = row.dropna()
+        # iterrows upcasts the year to float along with the numeric columns
+        year = int(values['year']) if 'year' in values else 'N/A'
+        roic = values.get('roic')
+        profit_margin = values.get('profit_margin')
         
         print(f"\n📅 Year {year}:")
         print("-" * 40)
         
         if roic:
-            print(f"ROIC: {roic:.2f}%", end="")
-            
             # Quality assessment
-            if roic > 30:
-                print(" ⭐⭐⭐⭐⭐ Exceptional")
-            elif roic > 20:
-                print(" ⭐⭐⭐⭐⭐ Excellent")
-            elif roic > 15:
-                print(" ⭐⭐⭐⭐ Very Good")
-            elif roic > 10:
-                print(" ⭐⭐⭐ Good")
-            else:
-                print(" ⭐⭐ Fair")
+            print(f"ROIC: {roic:.2f}% {quality_label(roic)}")
         
         if profit_margin:
             print(f"Profit Margin: {profit_margin:.1f}%")
         
-        if row.get('revenue'):
-            revenue_b = row['revenue'] / 1e9
+        if values.get('revenue'):
+            revenue_b = values['revenue'] / 1e9
             print(f"Revenue: ¥{revenue_b:.1f}B CNY")
         
-        if row.get('net_income'):
-            income_b = row['net_income'] / 1e9
+        if values.get('net_income'):
+            income_b = values['net_income'] / 1e9
             print(f"Net Income: ¥{income_b:.1f}B CNY")
     
     # Calculate trends
@@ -250,41 +395,40 @@ def display_historical_roic(symbol: str, years: int = 10):
     print("📈 TREND ANALYSIS")
     print("="*80)
     
-    if 'roic' in df.columns:
-        roic_values = df['roic'].dropna()
-        if len(roic_values) > 0:
-            avg_roic = roic_values.mean()
-            latest_roic = roic_values.iloc[-1] if len(roic_values) > 0 else None
-            
-            print(f"\nAverage ROIC ({len(roic_values)} years): {avg_roic:.2f}%")
-            
-            if latest_roic:
-                print(f"Latest ROIC: {latest_roic:.2f}%")
-                
-                if len(roic_values) > 1:
-                    first_roic = roic_values.iloc[0]
-                    change = latest_roic - first_roic
-                    
-                    if change > 0:
-                        print(f"Trend: ↗️ Improving (+{change:.1f}% over period)")
-                    elif change < -5:
-                        print(f"Trend: ↘️ Declining ({change:.1f}% over period)")
-                    else:
-                        print(f"Trend: → Stable (±{abs(change):.1f}% over period)")
-            
-            # Quality consistency
-            high_quality_years = len(roic_values[roic_values > 20])
-            consistency = (high_quality_years / len(roic_values)) * 100
-            
-            print(f"\nQuality Consistency:")
-            print(f"Years with ROIC > 20%: {high_quality_years}/{len(roic_values)} ({consistency:.0f}%)")
-            
-            if consistency > 80:
-                print("Assessment: ✅ Consistently High Quality Business")
-            elif consistency > 50:
-                print("Assessment: ⚠️ Generally Good Quality")
-            else:
-                print("Assessment: ❌ Quality Concerns")
+    summary = quality_summary(df.assign(symbol=symbol, fiscal_year=df['year']).set_index(['symbol', 'fiscal_year'])) \
+        if 'roic' in df.columns else pd.DataFrame()
+    if not summary.empty:
+        stats = summary.iloc[0]
+        years_with_roic = int(stats['years'])
+        
+        print(f"\nAverage ROIC ({years_with_roic} years): {stats['roic_mean']:.2f}%")
+        print(f"{ROLLING_WINDOW}-Year Average ROIC: {stats['roic_window_mean']:.2f}%")
+        print(f"Latest ROIC: {stats['roic_latest']:.2f}%")
+        
+        if stats['roic_trend'] == "Improving":
+            print(f"Trend: ↗️ Improving ({stats['roic_slope']:+.1f}% per year)")
+        elif stats['roic_trend'] == "Declining":
+            print(f"Trend: ↘️ Declining ({stats['roic_slope']:+.1f}% per year)")
+        elif stats['roic_trend'] == "Stable":
+            print(f"Trend: → Stable ({stats['roic_slope']:+.1f}% per year)")
+        
+        if years_with_roic > 1:
+            print(f"Volatility: {stats['roic_volatility']:.1f}% (std. dev.)")
+            print(f"Drawdown from peak: {stats['drawdown']:.1f}% (worst {stats['max_drawdown']:.1f}%)")
+        
+        # Quality consistency
+        consistency = stats['consistency'] * 100
+        high_quality_years = round(stats['consistency'] * years_with_roic)
+        
+        print(f"\nQuality Consistency:")
+        print(f"Years with ROIC > {CONSISTENCY_THRESHOLD:.0f}%: {high_quality_years}/{years_with_roic} ({consistency:.0f}%)")
+        
+        if consistency > 80:
+            print("Assessment: ✅ Consistently High Quality Business")
+        elif consistency > 50:
+            print("Assessment: ⚠️ Generally Good Quality")
+        else:
+            print("Assessment: ❌ Quality Concerns")
     
     # Special notes for Chinese stocks
     if symbol.endswith('.SS') or symbol.endswith('.SZ'):
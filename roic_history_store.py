@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+ROIC History Store
+Append-only Parquet dataset of yearly fundamentals, partitioned by symbol
+and fiscal year
+
+    <ROIC_HISTORY_DIR>/symbol=AAPL/fiscal_year=2024/part-<run>-0.parquet
+
+A fiscal year is written once and never rewritten: each run appends only
+the years not yet stored for the symbol, which are read from the
+directory names without opening any file. Callers therefore append only
+final years (roic_historical holds back estimates and fiscal years whose
+calendar year has not closed). The first year a symbol's
+history has been requested from is kept in symbol=<S>/_coverage.json, so
+a later request reaching further back backfills the older years, while
+years the upstream simply does not have are not asked for again. Loads
+are memory-mapped and read only the requested columns and the partitions
+matching the symbol/year filter. Requires pyarrow.
+"""
+
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from roic_statement_store import DEFAULT_CACHE_DIR
+
+DEFAULT_HISTORY_DIR = os.path.expanduser(
+    os.environ.get('ROIC_HISTORY_DIR', os.path.join(DEFAULT_CACHE_DIR, "history"))
+)
+
+INDEX_COLUMNS = ['symbol', 'fiscal_year']
+
+# Per-symbol file recording the first year the stored history covers;
+# the leading underscore keeps it out of dataset discovery
+COVERAGE_FILE = "_coverage.json"
+
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(
+        pa.schema([("symbol", pa.string()), ("fiscal_year", pa.int64())]), flavor="hive"
+    )
+
+
+class HistoryStore:
+    """Hive-partitioned Parquet dataset of (symbol, fiscal_year) panels"""
+
+    def __init__(self, root: str = None):
+        self.root = root or DEFAULT_HISTORY_DIR
+        self._lock = threading.Lock()
+        self.rows_appended = 0
+        self.rows_skipped = 0
+
+    # ---- bookkeeping ----
+
+    def _partition_value(self, name: str, key: str) -> Optional[str]:
+        prefix = f"{key}="
+        return unquote(name[len(prefix):]) if name.startswith(prefix) else None
+
+    def _symbol_dir(self, symbol: str) -> str:
+        # Same segment encoding pyarrow applies to hive partition values
+        return f"symbol={quote(symbol, safe='')}"
+
+    def symbols(self) -> List[str]:
+        """Symbols with at least one stored year"""
+        if not os.path.isdir(self.root):
+            return []
+        values = (self._partition_value(name, "symbol") for name in os.listdir(self.root))
+        return sorted(value for value in values if value)
+
+    def stored_years(self, symbols: Iterable[str] = None) -> Dict[str, Set[int]]:
+        """Stored fiscal years per symbol, from partition directory names"""
+        stored = {}
+        for symbol in (symbols if symbols is not None else self.symbols()):
+            symbol = symbol.strip().upper()
+            directory = os.path.join(self.root, self._symbol_dir(symbol))
+            if not os.path.isdir(directory):
+                continue
+            years = {
+                int(value) for value in
+                (self._partition_value(name, "fiscal_year") for name in os.listdir(directory))
+                if value and value.lstrip("-").isdigit()
+            }
+            if years:
+                stored[symbol] = years
+        return stored
+
+    def latest_years(self, symbols: Iterable[str] = None) -> Dict[str, int]:
+        """Newest stored fiscal year per symbol"""
+        return {symbol: max(years) for symbol, years in self.stored_years(symbols).items()}
+
+    def covered_from(self, symbols: Iterable[str] = None) -> Dict[str, int]:
+        """
+        First fiscal year each symbol's history has been fetched from
+        (the oldest stored year when no request reached further back)
+        """
+        covered = {}
+        for symbol, years in self.stored_years(symbols).items():
+            path = os.path.join(self.root, self._symbol_dir(symbol), COVERAGE_FILE)
+            try:
+                with open(path, 'r') as f:
+                    covered[symbol] = min(int(json.load(f)["from_year"]), min(years))
+            except (OSError, ValueError, KeyError, TypeError):
+                covered[symbol] = min(years)
+        return covered
+
+    def mark_covered(self, symbol: str, from_year: int):
+        """Record that the symbol's history has been fetched back to from_year"""
+        symbol = symbol.strip().upper()
+        directory = os.path.join(self.root, self._symbol_dir(symbol))
+        if not os.path.isdir(directory):
+            return
+        with self._lock:
+            current = self.covered_from([symbol]).get(symbol)
+            if current is not None and current <= from_year:
+                return
+            tmp = os.path.join(directory, f"{COVERAGE_FILE}.{uuid.uuid4().hex}.tmp")
+            with open(tmp, 'w') as f:
+                json.dump({"from_year": int(from_year)}, f)
+            os.replace(tmp, os.path.join(directory, COVERAGE_FILE))
+
+    # ---- writing ----
+
+    def append(self, panel: pd.DataFrame) -> int:
+        """
+        Store the years of a (symbol, fiscal_year) panel that are not
+        stored yet (older or newer); returns the number of rows written
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        if panel.empty:
+            return 0
+        df = panel.reset_index() if panel.index.names == INDEX_COLUMNS else panel.copy()
+
+        with self._lock:
+            stored = self.stored_years(df['symbol'].unique())
+            stored_keys = pd.MultiIndex.from_tuples(
+                [(symbol, year) for symbol, years in stored.items() for year in years], names=INDEX_COLUMNS
+            ) if stored else pd.MultiIndex.from_arrays([[], []], names=INDEX_COLUMNS)
+            new = df[~pd.MultiIndex.from_frame(df[INDEX_COLUMNS]).isin(stored_keys)]
+            self.rows_skipped += len(df) - len(new)
+            if new.empty:
+                return 0
+
+            os.makedirs(self.root, exist_ok=True)
+            ds.write_dataset(
+                pa.Table.from_pandas(new, preserve_index=False),
+                self.root,
+                format="parquet",
+                partitioning=_partitioning(),
+                # Unique per run, so appends never overwrite earlier parts
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+                # At most one partition per row
+                max_partitions=max(len(new), 1024)
+            )
+            self.rows_appended += len(new)
+            return len(new)
+
+    # ---- reading ----
+
+    def _files(self, symbols: Iterable[str] = None, since_year: int = None) -> List[str]:
+        """Parquet files of the partitions matching symbols / since_year"""
+        if symbols is None:
+            symbols = self.symbols()
+        files = []
+        for symbol in dict.fromkeys(symbol.strip().upper() for symbol in symbols):
+            directory = os.path.join(self.root, self._symbol_dir(symbol))
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                year = self._partition_value(name, "fiscal_year")
+                if year is None or (since_year is not None and int(year) < since_year):
+                    continue
+                partition = os.path.join(directory, name)
+                files.extend(
+                    os.path.join(partition, file) for file in os.listdir(partition) if file.endswith(".parquet")
+                )
+        return files
+
+    @staticmethod
+    def _schema(files: List[str]):
+        """
+        Dataset schema covering columns added over time
+        Runs only ever add columns, so the oldest and newest files together
+        carry every one; reading two footers is much cheaper than all.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        by_age = sorted(files, key=os.path.getmtime)
+        schemas = [pq.read_schema(path) for path in dict.fromkeys((by_age[0], by_age[-1]))]
+        schemas.append(_partitioning().schema)
+        return pa.unify_schemas(schemas, promote_options="permissive").remove_metadata()
+
+    def load(self, symbols: Iterable[str] = None, columns: List[str] = None,
+             since_year: int = None) -> pd.DataFrame:
+        """
+        Stored panel indexed by (symbol, fiscal_year)
+        Only the given columns and the partitions matching symbols /
+        since_year are read; files are memory-mapped. Columns a file was
+        written without come back as NaN.
+        """
+        import pyarrow.dataset as ds
+        from pyarrow import fs
+
+        files = self._files(symbols, since_year)
+        if not files:
+            return pd.DataFrame(columns=INDEX_COLUMNS + list(columns or [])).set_index(INDEX_COLUMNS)
+
+        # Files come from the pruned partition directories, so unrelated
+        # symbols are not even listed
+        schema = self._schema(files)
+        dataset = ds.dataset(
+            files, schema=schema, format="parquet", partitioning=_partitioning(),
+            partition_base_dir=self.root, filesystem=fs.LocalFileSystem(use_mmap=True)
+        )
+        wanted = None if columns is None else INDEX_COLUMNS + [c for c in columns if c not in INDEX_COLUMNS]
+        df = dataset.to_table(columns=[c for c in wanted if c in schema.names] if wanted else None).to_pandas()
+        if wanted:
+            df = df.reindex(columns=wanted)
+        # Concurrent writers can both append a year; keep one copy
+        df = df.drop_duplicates(INDEX_COLUMNS, keep='last')
+        df['symbol'] = df['symbol'].astype(str)
+        return df.set_index(INDEX_COLUMNS).sort_index()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "symbols": len(self.symbols()),
+            "rows_appended": self.rows_appended,
+            "rows_skipped": self.rows_skipped
+        }
+
+
+_default_store: Optional[HistoryStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Process-wide history store under ROIC_HISTORY_DIR"""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = HistoryStore()
+    return _default_store
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+ROIC HTTP Response Cache
+ASGI middleware that caches GET responses per route + query with TTLs
+taken from the widget refresh rates, and answers conditional requests
+
+Cached responses carry a strong ETag and Cache-Control: max-age set to
+the remaining TTL; a matching If-None-Match gets 304 Not Modified, so a
+dashboard polling dozens of tiles re-downloads nothing and triggers no
+upstream fetches until its entries expire.
+"""
+
+import hashlib
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from roic_cache_backends import make_cache, register_cache_type
+from roic_telemetry import register_cache
+
+# Response headers NOT kept with a cached body: hop-by-hop ones, plus
+# those rewritten on every replay (date, length, caching validators)
+UNCACHED_HEADERS = (
+    b"connection", b"keep-alive", b"proxy-authenticate", b"proxy-authorization", b"te",
+    b"trailer", b"transfer-encoding", b"upgrade", b"date", b"content-length",
+    b"etag", b"cache-control", b"age", b"x-cache", b"set-cookie"
+)
+
+
+def widget_cache_rules(widgets: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    """Map each widget endpoint to its refresh_rate (seconds)"""
+    return {
+        widget["endpoint"]: float(widget["refresh_rate"])
+        for widget in widgets.values()
+        if widget.get("endpoint") and widget.get("refresh_rate")
+    }
+
+
+def make_etag(body: bytes) -> str:
+    """Strong validator derived from the response bytes"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+
+@register_cache_type
+class CachedResponse:
+    """Body and metadata of one cached response"""
+
+    __slots__ = ("status", "headers", "body", "etag", "stored_at", "expires_at")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, ttl: float):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = make_etag(body)
+        # Wall-clock times: entries may be read back by another process
+        self.stored_at = time.time()
+        self.expires_at = self.stored_at + ttl
+
+    def to_cache(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_cache(cls, fields: Dict[str, Any]) -> "CachedResponse":
+        entry = cls.__new__(cls)
+        for slot in cls.__slots__:
+            setattr(entry, slot, fields[slot])
+        return entry
+
+    def max_age(self) -> int:
+        return max(round(self.expires_at - time.time()), 0)
+
+    def age(self) -> int:
+        return int(time.time() - self.stored_at)
+
+
+class ResponseCacheMiddleware:
+    """
+    Cache successful GET/HEAD responses for routes listed in `rules`
+
+    rules maps a path prefix (e.g. "/api/v1/roic/metrics") to a TTL in
+    seconds; the longest matching prefix wins and unlisted routes pass
+    through untouched. Requests sending Cache-Control: no-cache skip the
+    lookup and refresh the entry; responses marked no-store are not kept.
+    """
+
+    def __init__(self, app, rules: Dict[str, float], max_entries: int = None):
+        self.app = app
+        # Longest prefix first so the most specific rule wins
+        self.rules = sorted(rules.items(), key=lambda rule: len(rule[0]), reverse=True)
+        # Shared across worker processes when ROIC_CACHE_BACKEND is sqlite/redis
+        self.cache = make_cache(
+            "http", max_entries=max_entries or int(os.environ.get('ROIC_HTTP_CACHE_MAX_ENTRIES', '4096'))
+        )
+        self.not_modified = 0
+        self.stores = 0
+        _middlewares.append(self)
+        register_cache("http", self.cache.stats)
+
+    def ttl_for(self, path: str) -> Optional[float]:
+        for prefix, ttl in self.rules:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return ttl
+        return None
+
+    @staticmethod
+    def _header(scope, name: bytes) -> Optional[str]:
+        for key, value in scope.get("headers", ()):
+            if key == name:
+                return value.decode("latin-1")
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+
+        ttl = self.ttl_for(scope["path"])
+        if not ttl:
+            return await self.app(scope, receive, send)
+
+        query = scope.get("query_string", b"").decode("latin-1")
+        key = (scope["path"], "&".join(sorted(query.split("&"))) if query else "")
+        if_none_match = self._header(scope, b"if-none-match")
+        no_cache = "no-cache" in (self._header(scope, b"cache-control") or "")
+
+        entry = None if no_cache else self.cache.get(key)
+        if entry is not None:
+            return await self._send_cached(entry, if_none_match, send, scope["method"], b"HIT")
+
+        # Miss: buffer the downstream response so it can be hashed and stored
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        body = b"".join(chunks)
+        headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in UNCACHED_HEADERS]
+        entry = CachedResponse(start.get("status", 500), headers, body, ttl)
+
+        no_store = any(
+            k.lower() == b"cache-control" and b"no-store" in v.lower() for k, v in start.get("headers", [])
+        )
+        if entry.status != 200 or no_store:
+            # Errors and no-store responses are passed through unchanged, never cached
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        self.cache.set(key, entry, ttl=ttl)
+        self.stores += 1
+        for listener in _store_listeners:
+            try:
+                listener(key[0], key[1], entry.body, entry.etag)
+            except Exception as e:
+                print(f"HTTP cache listener error: {str(e)[:100]}")
+        await self._send_cached(entry, if_none_match, send, scope["method"], b"MISS")
+
+    async def _send_cached(self, entry: CachedResponse, if_none_match: Optional[str], send,
+                           method: str, cache_status: bytes):
+        headers = [
+            (b"etag", entry.etag.encode()),
+            (b"cache-control", f"max-age={entry.max_age()}".encode()),
+            (b"age", str(entry.age()).encode()),
+            (b"x-cache", cache_status),
+        ]
+
+        if etag_matches(if_none_match, entry.etag):
+            self.not_modified += 1
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers = entry.headers + headers + [(b"content-length", str(len(entry.body)).encode())]
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if method == "HEAD" else entry.body})
+
+    def invalidate(self, path_prefix: str = None):
+        """Drop cached responses under a path prefix, or all of them"""
+        if path_prefix is None:
+            self.cache.invalidate()
+            return
+        for key in [key for key in self.cache.keys() if key[0].startswith(path_prefix)]:
+            self.cache.invalidate(key)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        # Entry TTLs come from the rules, not the cache default
+        stats.pop("ttl", None)
+        stats.update({
+            "rules": dict(self.rules),
+            "not_modified": self.not_modified,
+            "stores": self.stores
+        })
+        return stats
+
+
+# Middleware instances created by Starlette when an app builds its stack
+_middlewares: List[ResponseCacheMiddleware] = []
+
+# Called as listener(path, query, body, etag) whenever a response is stored
+_store_listeners: List[Callable[[str, str, bytes, str], None]] = []
+
+
+def on_store(listener: Callable[[str, str, bytes, str], None]):
+    """Register a callback for freshly computed (stored) responses"""
+    if listener not in _store_listeners:
+        _store_listeners.append(listener)
+
+
+def http_cache_stats() -> List[Dict[str, Any]]:
+    """Counters of every response cache in the process"""
+    return [middleware.stats() for middleware in _middlewares]
+
+
+def invalidate_http_cache(path_prefix: str = None):
+    """Drop cached responses in every response cache in the process"""
+    for middleware in _middlewares:
+        middleware.invalidate(path_prefix)
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+ROIC Watchlist Prewarm
+Keeps widget responses for a watchlist of symbols warm by re-requesting
+them through the app shortly before their cache entries expire
+
+Refreshes go through the full ASGI stack with Cache-Control: no-cache,
+so the response cache, snapshot cache and statement store are all
+refreshed the same way an interactive request would. Each refresh is
+rescheduled at (1 - lead) of its TTL minus a random jitter, and all
+refreshes share one token-bucket budget, so refresh load stays spread
+out instead of arriving in bursts.
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import random
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from roic_concurrency import RateLimiter
+
+DEFAULT_WATCHLIST_FILE = os.path.join(os.path.expanduser("~"), ".openbb", "roic_watchlist.txt")
+
+
+class Watchlist:
+    """
+    Ordered set of symbols backed by a file
+
+    Plain text (one symbol per line, # comments) or a JSON list when the
+    path ends in .json. Set the path with ROIC_WATCHLIST_FILE.
+    """
+
+    def __init__(self, path: str = None, symbols: Iterable[str] = ()):
+        self.path = path
+        self._symbols: Dict[str, None] = {}
+        self._mtime = self._file_mtime()
+        self.add(symbols)
+
+    @classmethod
+    def from_env(cls) -> "Watchlist":
+        path = os.environ.get('ROIC_WATCHLIST_FILE', DEFAULT_WATCHLIST_FILE)
+        return cls(path, cls.load(path))
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.path) if self.path else None
+        except OSError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """Re-read the file if another process saved it since we last looked"""
+        mtime = self._file_mtime()
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        self.replace(self.load(self.path))
+        return True
+
+    @staticmethod
+    def load(path: str) -> List[str]:
+        if not path or not os.path.exists(path):
+            return []
+        try:
+            with open(path, 'r') as f:
+                if path.endswith(".json"):
+                    return list(json.load(f))
+                return [line.split("#")[0].strip() for line in f]
+        except Exception as e:
+            print(f"Watchlist load error ({path}): {str(e)[:100]}")
+            return []
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'w') as f:
+            if self.path.endswith(".json"):
+                json.dump(self.symbols(), f, indent=2)
+            else:
+                f.write("\n".join(self.symbols()) + "\n")
+        self._mtime = self._file_mtime()
+
+    def add(self, symbols: Iterable[str]) -> List[str]:
+        """Add symbols, returning the ones that were new"""
+        added = []
+        for symbol in symbols:
+            symbol = (symbol or "").strip().upper()
+            if symbol and symbol not in self._symbols:
+                self._symbols[symbol] = None
+                added.append(symbol)
+        return added
+
+    def remove(self, symbol: str) -> bool:
+        symbol = symbol.strip().upper()
+        if symbol not in self._symbols:
+            return False
+        del self._symbols[symbol]
+        return True
+
+    def replace(self, symbols: Iterable[str]):
+        self._symbols.clear()
+        self.add(symbols)
+
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._symbols
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+
+async def asgi_request(app, path: str, headers: Dict[str, str] = None) -> Tuple[int, bytes]:
+    """Issue an in-process GET through an ASGI app, returning (status, body)"""
+    query = ""
+    if "?" in path:
+        path, query = path.split("?", 1)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"prewarm")] + [
+            (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()
+        ],
+        "client": None,
+        "server": None,
+    }
+    status = {}
+    chunks: List[bytes] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status.get("code", 500), b"".join(chunks)
+
+
+async def asgi_get(app, path: str, headers: Dict[str, str] = None) -> int:
+    """Issue an in-process GET through an ASGI app, returning the status code"""
+    status, _ = await asgi_request(app, path, headers)
+    return status
+
+
+class PrewarmScheduler:
+    """
+    Jittered refresh-ahead scheduler for (endpoint, symbol) pairs
+
+    rules maps each endpoint to its TTL (the widget refresh_rate); every
+    watchlist symbol is refreshed on every endpoint, as is every symbol
+    pinned by a live subscription (see pin/unpin). Tunables (env):
+        ROIC_PREWARM_RATE         refreshes/second across everything (default 2)
+        ROIC_PREWARM_CONCURRENCY  refreshes in flight (default 4)
+        ROIC_PREWARM_LEAD         refresh at (1 - lead) of the TTL (default 0.2)
+        ROIC_PREWARM_JITTER       extra random lead, fraction of TTL (default 0.1)
+
+    With several worker processes pass lock_path: only the worker holding
+    the lock refreshes the watchlist (the others keep just their pinned
+    symbols warm), and it picks up watchlist edits saved by any worker.
+    The others retry the lock every leader_retry seconds, so one of them
+    takes over when the leader exits.
+    """
+
+    def __init__(self, app, rules: Dict[str, float], watchlist: Watchlist,
+                 rate: float = None, concurrency: int = None, lead: float = None,
+                 jitter: float = None, path_for: Callable[[str, str], str] = None,
+                 lock_path: str = None):
+        self.app = app
+        self.rules = dict(rules)
+        self.watchlist = watchlist
+        self.budget = RateLimiter(
+            rate if rate is not None else float(os.environ.get('ROIC_PREWARM_RATE', '2')),
+            burst=1
+        )
+        self.concurrency = concurrency or int(os.environ.get('ROIC_PREWARM_CONCURRENCY', '4'))
+        self.lead = lead if lead is not None else float(os.environ.get('ROIC_PREWARM_LEAD', '0.2'))
+        self.jitter = jitter if jitter is not None else float(os.environ.get('ROIC_PREWARM_JITTER', '0.1'))
+        self.path_for = path_for or (lambda endpoint, symbol: f"{endpoint}/{symbol}")
+        # Failed refreshes are retried after this many seconds (or the TTL if shorter)
+        self.retry_delay = 30.0
+        # Longest sleep between checks of the watchlist file
+        self.poll_interval = 5.0
+        self.lock_path = lock_path
+        self.leader = True
+        self._lock_file = None
+        # Seconds between attempts to take over the lock from another worker
+        self.leader_retry = 30.0
+        self._next_claim = 0.0
+
+        self._heap: List[Tuple[float, str, str]] = []
+        self._scheduled = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refreshing = set()
+        # Symbols kept warm on behalf of push subscribers, with refcounts
+        self._pinned: Counter = Counter()
+
+        self.refreshed = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+
+    # ---- lifecycle ----
+
+    def _claim_leadership(self) -> bool:
+        """Take the cross-process prewarm lock without waiting"""
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _retry_leadership(self):
+        """Try the lock again once leader_retry has passed since the last try"""
+        if self.leader or not self.lock_path or time.monotonic() < self._next_claim:
+            return
+        self._next_claim = time.monotonic() + self.leader_retry
+        self.leader = self._claim_leadership()
+        if self.leader:
+            print("Prewarm: took over watchlist refreshes")
+
+    async def start(self):
+        if self._task is None:
+            if self.lock_path:
+                self.leader = self._claim_leadership()
+                self._next_claim = time.monotonic() + self.leader_retry
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            for task in list(self._refreshing):
+                task.cancel()
+            await asyncio.gather(self._task, *self._refreshing, return_exceptions=True)
+            self._task = None
+            self._heap.clear()
+            self._scheduled.clear()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def notify(self):
+        """Pick up watchlist changes now instead of at the next wakeup"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def pin(self, symbols: Iterable[str]):
+        """Keep symbols refreshed while something is subscribed to them"""
+        self._pinned.update(symbol.strip().upper() for symbol in symbols)
+        self.notify()
+
+    def unpin(self, symbols: Iterable[str]):
+        self._pinned.subtract(symbol.strip().upper() for symbol in symbols)
+        self._pinned = +self._pinned
+
+    def _watched(self) -> List[str]:
+        return self.watchlist.symbols() if self.leader else []
+
+    def _tracked(self, symbol: str) -> bool:
+        return (self.leader and symbol in self.watchlist) or symbol in self._pinned
+
+    # ---- scheduling ----
+
+    def _next_due(self, ttl: float) -> float:
+        return time.monotonic() + ttl * (1 - self.lead) - random.uniform(0, ttl * self.jitter)
+
+    def _schedule_new(self):
+        now = time.monotonic()
+        watched = self._watched()
+        pinned = [symbol for symbol in self._pinned if not (self.leader and symbol in self.watchlist)]
+        for symbol in watched + pinned:
+            for endpoint, ttl in self.rules.items():
+                item = (endpoint, symbol)
+                if item not in self._scheduled:
+                    self._scheduled.add(item)
+                    # New symbols warm up right away, lightly spread out
+                    heapq.heappush(self._heap, (now + random.uniform(0, 1.0), endpoint, symbol))
+
+    async def _run(self):
+        while True:
+            self._retry_leadership()
+            self.watchlist.reload_if_changed()
+            self._schedule_new()
+            self._wakeup.clear()
+
+            delay = self._heap[0][0] - time.monotonic() if self._heap else self.poll_interval
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due, endpoint, symbol = heapq.heappop(self._heap)
+            if not self._tracked(symbol):
+                self._scheduled.discard((endpoint, symbol))
+                continue
+
+            await self.budget.acquire_async()
+            await self._slots.acquire()
+            task = asyncio.ensure_future(self._refresh(endpoint, symbol))
+            self._refreshing.add(task)
+            task.add_done_callback(self._refreshing.discard)
+
+    async def _refresh(self, endpoint: str, symbol: str):
+        ttl = self.rules[endpoint]
+        try:
+            status = await asyncio.wait_for(
+                asgi_get(self.app, self.path_for(endpoint, symbol), {"cache-control": "no-cache"}),
+                timeout=ttl
+            )
+            if status != 200:
+                raise RuntimeError(f"HTTP {status}")
+            self.refreshed += 1
+            due = self._next_due(ttl)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            self.last_error = f"{endpoint}/{symbol}: {str(e)[:100]}"
+            due = time.monotonic() + min(self.retry_delay, ttl)
+        finally:
+            self._slots.release()
+        heapq.heappush(self._heap, (due, endpoint, symbol))
+        self.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        next_due = self._heap[0][0] - time.monotonic() if self._heap else None
+        return {
+            "running": self.running(),
+            "leader": self.leader,
+            "watchlist": len(self.watchlist),
+            "pinned": len(self._pinned),
+            "scheduled": len(self._scheduled),
+            "in_flight": len(self._refreshing),
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "last_error": self.last_error,
+            "next_due_in": round(next_due, 1) if next_due is not None else None,
+            "rate": self.budget.rate,
+            "rules": self.rules
+        }
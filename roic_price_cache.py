@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+ROIC Price History Cache
+Price bars per (symbol, interval) kept as one date-indexed DataFrame and
+extended incrementally
+
+A request for a date range is answered from memory when the cached span
+covers it; otherwise only the missing head and/or tail is fetched and
+spliced in. The newest bar is refetched once the span is older than
+ROIC_PRICE_CACHE_TTL seconds (default 900), since the current bar keeps
+changing until its period closes. Spans are also saved as Parquet under
+ROIC_CACHE_DIR/prices (when pyarrow is installed) so CLI runs and nightly
+jobs extend yesterday's data instead of downloading it again.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import pandas as pd
+
+from roic_data_sources import get_data_source
+from roic_statement_store import DEFAULT_CACHE_DIR
+from roic_telemetry import register_cache
+
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+# Range requested when the caller gives no start date
+DEFAULT_LOOKBACK_DAYS = 365
+
+
+def _day(value: Any) -> Optional[pd.Timestamp]:
+    return pd.Timestamp(value).normalize() if value is not None else None
+
+
+def bars_frame(bars: List[Any]) -> pd.DataFrame:
+    """Date-indexed OHLCV frame from price bar records"""
+    frame = pd.DataFrame(
+        {column: [getattr(bar, column, None) for bar in bars] for column in PRICE_COLUMNS},
+        index=pd.DatetimeIndex([pd.Timestamp(bar.date) for bar in bars], name="date"),
+        dtype="float64"
+    )
+    frame = frame[~frame.index.duplicated(keep="last")]
+    return frame.sort_index()
+
+
+class _Span:
+    """Cached bars plus the date range they are known to cover"""
+
+    __slots__ = ("frame", "start", "end", "refreshed_at")
+
+    def __init__(self, frame: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp, refreshed_at: float):
+        self.frame = frame
+        self.start = start
+        self.end = end
+        self.refreshed_at = refreshed_at
+
+
+class PriceHistoryCache:
+    """
+    Shared price history keyed by (symbol, interval)
+
+    Tunables (env):
+        ROIC_PRICE_CACHE_TTL          seconds before the open bar is refetched (default 900)
+        ROIC_PRICE_CACHE_MAX_ENTRIES  spans kept in memory (default 2048)
+    """
+
+    def __init__(self, directory: str = None, ttl: float = None, max_entries: int = None,
+                 provider: str = 'yfinance'):
+        self.directory = directory or os.path.join(DEFAULT_CACHE_DIR, "prices")
+        self.ttl = ttl if ttl is not None else float(os.environ.get('ROIC_PRICE_CACHE_TTL', '900'))
+        self.max_entries = max_entries or int(os.environ.get('ROIC_PRICE_CACHE_MAX_ENTRIES', '2048'))
+        self.provider = provider
+        self._entries: "OrderedDict[Tuple[str, str], _Span]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+        self.evictions = 0
+
+    # ---- storage ----
+
+    def _path(self, key: Tuple[str, str]) -> str:
+        symbol, interval = key
+        return os.path.join(self.directory, f"{quote(symbol, safe='')}_{interval}.parquet")
+
+    def _key_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _load(self, key: Tuple[str, str]) -> Optional[_Span]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            frame = pd.read_parquet(path)
+            meta = frame.attrs.get("span", {})
+            frame.attrs = {}
+            return _Span(frame, _day(meta["start"]), _day(meta["end"]), float(meta["refreshed_at"]))
+        except Exception as e:
+            print(f"Price cache load error ({key[0]}): {str(e)[:100]}")
+            return None
+
+    def _save(self, key: Tuple[str, str], span: _Span):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            frame = span.frame.copy()
+            frame.attrs = {"span": {"start": span.start.isoformat(), "end": span.end.isoformat(),
+                                    "refreshed_at": span.refreshed_at}}
+            tmp = self._path(key) + ".tmp"
+            frame.to_parquet(tmp)
+            os.replace(tmp, self._path(key))
+        except ImportError:
+            # No pyarrow: the cache still works, in memory only
+            pass
+        except Exception as e:
+            print(f"Price cache save error ({key[0]}): {str(e)[:100]}")
+
+    def _remember(self, key: Tuple[str, str], span: _Span):
+        with self._lock:
+            self._entries[key] = span
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # ---- fetching ----
+
+    def _fetch(self, symbol: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        bars = get_data_source().price_history(
+            symbol,
+            start_date=start.strftime('%Y-%m-%d'),
+            end_date=end.strftime('%Y-%m-%d'),
+            interval=interval,
+            provider=self.provider
+        )
+        return bars_frame(bars or [])
+
+    def get(self, symbol: str, start: Any = None, end: Any = None, interval: str = '1d') -> pd.DataFrame:
+        """
+        Bars dated within [start, end] (end defaults to today, start to a
+        year before end), fetching only what the cached span is missing
+        """
+        today = pd.Timestamp.now().normalize()
+        end = min(_day(end) or today, today)
+        start = _day(start) or end - pd.Timedelta(days=DEFAULT_LOOKBACK_DAYS)
+        key = (symbol.strip().upper(), interval)
+
+        with self._key_lock(key):
+            with self._lock:
+                span = self._entries.get(key)
+            if span is None:
+                span = self._load(key)
+
+            if span is None:
+                self.misses += 1
+                span = _Span(self._fetch(key[0], interval, start, end), start, end, time.time())
+                self._save(key, span)
+            else:
+                changed = False
+                if start < span.start:
+                    head = self._fetch(key[0], interval, start, span.start - pd.Timedelta(days=1))
+                    if len(head):
+                        span.frame = pd.concat([head, span.frame[span.frame.index > head.index.max()]])
+                    span.start = start
+                    changed = True
+                open_bar_stale = span.end >= today and time.time() - span.refreshed_at > self.ttl
+                if end > span.end or open_bar_stale:
+                    # Refetch from the last cached bar: it may have been still open
+                    tail_start = span.frame.index.max() if len(span.frame) else span.end
+                    tail = self._fetch(key[0], interval, min(tail_start, span.end), end)
+                    if len(tail):
+                        span.frame = pd.concat([span.frame[span.frame.index < tail.index.min()], tail])
+                    span.end = max(end, span.end)
+                    span.refreshed_at = time.time()
+                    changed = True
+                if changed:
+                    self.extensions += 1
+                    self._save(key, span)
+                else:
+                    self.hits += 1
+            self._remember(key, span)
+
+            frame = span.frame
+            return frame[(frame.index >= start) & (frame.index <= end)].copy()
+
+    def latest_close(self, symbol: str, interval: str = '1d') -> Optional[float]:
+        """Close of the most recent bar in the last two weeks, if any"""
+        frame = self.get(symbol, pd.Timestamp.now() - pd.Timedelta(days=14), interval=interval)
+        closes = frame["close"].dropna()
+        return float(closes.iloc[-1]) if len(closes) else None
+
+    def invalidate(self, symbol: str = None):
+        """Forget cached spans (in memory and on disk) for a symbol, or all of them"""
+        with self._lock:
+            keys = [key for key in self._entries if symbol is None or key[0] == symbol.strip().upper()]
+            for key in keys:
+                del self._entries[key]
+        if os.path.isdir(self.directory):
+            prefix = None if symbol is None else f"{quote(symbol.strip().upper(), safe='')}_"
+            for name in os.listdir(self.directory):
+                if name.endswith(".parquet") and (prefix is None or name.startswith(prefix)):
+                    os.remove(os.path.join(self.directory, name))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.extensions
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "backend": "memory",
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "extensions": self.extensions,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "ttl": self.ttl
+        }
+
+
+_default_cache: Optional[PriceHistoryCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_price_cache() -> PriceHistoryCache:
+    """Process-wide price history cache under ROIC_CACHE_DIR/prices"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = PriceHistoryCache()
+                register_cache("prices", _default_cache.stats)
+    return _default_cache
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+ROIC Widget Push Hub
+Server-sent events / WebSocket subscriptions that push widget deltas
+only when a recomputed response actually changed
+
+Clients subscribe to (widget, symbol) pairs. The hub listens to the HTTP
+response cache: whenever a widget response is recomputed and stored
+(interactive request or prewarm refresh), its JSON is diffed against the
+last value sent and only the changed fields are pushed. Subscribed
+symbols are pinned in the prewarm scheduler so they keep being
+recomputed while anyone is listening.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from roic_http_cache import on_store
+from roic_prewarm import asgi_request
+
+# Fields that change on every recompute without meaning new numbers
+VOLATILE_KEYS = ("date",)
+
+
+def json_delta(old: Any, new: Any) -> Any:
+    """
+    Changed part of `new` relative to `old`
+    Dicts are diffed key by key (removed keys map to None); any other
+    value is replaced whole. An empty dict means nothing changed.
+    """
+    if not (isinstance(old, dict) and isinstance(new, dict)):
+        return new
+    delta = {}
+    for key, value in new.items():
+        if key not in old:
+            delta[key] = value
+        elif old[key] != value:
+            delta[key] = json_delta(old[key], value) if isinstance(value, dict) else value
+    for key in old.keys() - new.keys():
+        delta[key] = None
+    return delta
+
+
+def merge_delta(base: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold a newer delta into a pending one (in place)"""
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_delta(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _strip_volatile(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    return value
+
+
+class Subscription:
+    """
+    One client's set of (widget, symbol) pairs and its pending events
+
+    Pending events are coalesced per path: a slow client gets one merged
+    delta per widget instead of an ever-growing queue.
+    """
+
+    def __init__(self):
+        self.paths: Dict[str, Tuple[str, str]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+
+    def offer(self, path: str, event: Dict[str, Any]):
+        pending = self._pending.get(path)
+        if pending is not None and pending["type"] == event["type"] == "delta":
+            merge_delta(pending["data"], event["data"])
+            pending["etag"] = event["etag"]
+        elif pending is not None and pending["type"] == "snapshot":
+            # Not delivered yet: the client still needs the full value
+            pending["data"] = merge_delta(pending["data"], event["data"])
+            pending["etag"] = event["etag"]
+        else:
+            self._pending[path] = event
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def next_events(self, timeout: float = None) -> List[Dict[str, Any]]:
+        """Wait for pending events (empty list on timeout or close)"""
+        if not self._pending and not self.closed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        events = list(self._pending.values())
+        self._pending.clear()
+        self.sent += len(events)
+        return events
+
+
+class PushHub:
+    """
+    Fan widget changes out to subscribers
+
+    widgets is the WIDGETS_CONFIG mapping (widget id -> config with an
+    "endpoint"); prewarm, when given, keeps subscribed symbols refreshed.
+    Tunables (env):
+        ROIC_PUSH_HEARTBEAT        seconds between keep-alives (default 15)
+        ROIC_PUSH_MAX_SUBSCRIPTIONS widget/symbol pairs per client (default 200)
+    """
+
+    def __init__(self, app, widgets: Dict[str, Dict[str, Any]], prewarm=None,
+                 heartbeat: float = None, max_paths: int = None):
+        self.app = app
+        self.endpoints = {
+            widget_id: widget["endpoint"].rstrip("/")
+            for widget_id, widget in widgets.items() if widget.get("endpoint")
+        }
+        self.prewarm = prewarm
+        self.heartbeat = heartbeat or float(os.environ.get('ROIC_PUSH_HEARTBEAT', '15'))
+        self.max_paths = max_paths or int(os.environ.get('ROIC_PUSH_MAX_SUBSCRIPTIONS', '200'))
+
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        # Last value pushed per path: (etag, parsed body without volatile keys)
+        self._values: Dict[str, Tuple[str, Any]] = {}
+        self._clients: Set[Subscription] = set()
+
+        self.published = 0
+        self.unchanged = 0
+        on_store(self.publish)
+
+    # ---- subscriptions ----
+
+    def resolve(self, symbols: Iterable[str], widgets: Iterable[str] = None) -> Dict[str, Tuple[str, str]]:
+        """Map symbols x widgets to response paths, validating widget ids"""
+        widgets = list(widgets) if widgets else list(self.endpoints)
+        unknown = [widget for widget in widgets if widget not in self.endpoints]
+        if unknown:
+            raise ValueError(f"Unknown widgets: {', '.join(unknown)}")
+        paths = {}
+        for symbol in symbols:
+            symbol = (symbol or "").strip().upper()
+            if symbol:
+                for widget in widgets:
+                    paths[f"{self.endpoints[widget]}/{symbol}"] = (widget, symbol)
+        return paths
+
+    def open(self) -> Subscription:
+        subscription = Subscription()
+        self._clients.add(subscription)
+        return subscription
+
+    async def subscribe(self, subscription: Subscription, symbols: Iterable[str],
+                        widgets: Iterable[str] = None):
+        """Add pairs to a subscription and queue a snapshot of each"""
+        paths = {
+            path: pair for path, pair in self.resolve(symbols, widgets).items()
+            if path not in subscription.paths
+        }
+        if len(subscription.paths) + len(paths) > self.max_paths:
+            raise ValueError(f"Too many subscriptions (max {self.max_paths} widget/symbol pairs)")
+
+        for path, pair in paths.items():
+            subscription.paths[path] = pair
+            self._subscribers.setdefault(path, set()).add(subscription)
+        if self.prewarm is not None:
+            self.prewarm.pin(symbol for _, symbol in paths.values())
+
+        # Pairs someone already follows get the last pushed value right away;
+        # new ones are loaded through the app and sent as their first value
+        for path in paths:
+            if path in self._values:
+                etag, data = self._values[path]
+                self._send([subscription], "snapshot", path, data, etag)
+        await asyncio.gather(*(self._load(path) for path in paths if path not in self._values))
+
+    def unsubscribe(self, subscription: Subscription, symbols: Iterable[str] = None,
+                    widgets: Iterable[str] = None):
+        """Drop pairs from a subscription (all of them when symbols is None)"""
+        if symbols is None:
+            paths = list(subscription.paths)
+        else:
+            paths = [path for path in self.resolve(symbols, widgets) if path in subscription.paths]
+
+        for path in paths:
+            _, symbol = subscription.paths.pop(path)
+            subscribers = self._subscribers.get(path)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[path]
+                    self._values.pop(path, None)
+            if self.prewarm is not None:
+                self.prewarm.unpin([symbol])
+
+    def close(self, subscription: Subscription):
+        self.unsubscribe(subscription)
+        self._clients.discard(subscription)
+        subscription.close()
+
+    def close_all(self):
+        for subscription in list(self._clients):
+            self.close(subscription)
+
+    async def _load(self, path: str):
+        try:
+            status, body = await asgi_request(self.app, path)
+            # A cache miss was already published by the store listener
+            if status == 200 and path in self._subscribers and path not in self._values:
+                self._update(path, body, None)
+        except Exception as e:
+            print(f"Push snapshot error ({path}): {str(e)[:100]}")
+
+    # ---- publishing ----
+
+    def _send(self, subscriptions: Iterable[Subscription], kind: str, path: str,
+              data: Any, etag: Optional[str]):
+        encoded = json.dumps(data)
+        for subscription in subscriptions:
+            widget, symbol = subscription.paths[path]
+            # Each subscriber gets its own copy: pending events are merged in place
+            subscription.offer(path, {"type": kind, "widget": widget, "symbol": symbol,
+                                      "path": path, "etag": etag, "data": json.loads(encoded)})
+
+    def publish(self, path: str, query: str, body: bytes, etag: str = None):
+        """Response cache listener: push the delta if a subscribed value changed"""
+        if query or path not in self._subscribers:
+            return
+        self._update(path, body, etag)
+
+    def _update(self, path: str, body: bytes, etag: Optional[str]):
+        try:
+            new = _strip_volatile(json.loads(body))
+        except ValueError:
+            return
+
+        previous = self._values.get(path)
+        self._values[path] = (etag, new)
+        if previous is None:
+            kind, delta = "snapshot", new
+        else:
+            kind, delta = "delta", json_delta(previous[1], new)
+            if delta == {}:
+                self.unchanged += 1
+                return
+
+        self.published += 1
+        self._send(list(self._subscribers[path]), kind, path, delta, etag)
+
+    # ---- transports ----
+
+    async def sse(self, subscription: Subscription) -> AsyncIterator[str]:
+        """text/event-stream frames for a subscription until it is closed"""
+        try:
+            yield f"retry: {int(self.heartbeat * 1000)}\n\n"
+            while not subscription.closed:
+                events = await subscription.next_events(timeout=self.heartbeat)
+                if not events:
+                    # Comment line keeps proxies from timing the stream out
+                    yield ": keep-alive\n\n"
+                for event in events:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            self.close(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "paths": len(self._subscribers),
+            "published": self.published,
+            "unchanged": self.unchanged
+        }
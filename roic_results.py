@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+ROIC Result Types
+Slotted per-symbol records and column-oriented batches for provider results
+
+ROICMetrics/ROICForecast behave as mappings with the same keys
+the provider always returned ("roic", "1_year_target", ...), so existing
+.get()/[] callers keep working. MetricsBatch/ForecastBatch hold one NumPy
+array per field and hand pandas those arrays without copying; they also
+serialize to Arrow IPC, Parquet or column-oriented JSON for batch APIs.
+"""
+
+import io
+import json
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Wire formats for batches, by name
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "json": "application/json",
+}
+
+
+class _Record(Mapping):
+    """
+    Fixed-field result with __slots__ storage
+    KEYS maps the public key to the slot that holds it.
+    """
+
+    __slots__ = ()
+    KEYS: Dict[str, str] = {}
+    NUMERIC: tuple = ()
+
+    def __init__(self, **values):
+        for key, slot in self.KEYS.items():
+            setattr(self, slot, values.get(key))
+        unknown = set(values) - set(self.KEYS)
+        if unknown:
+            raise TypeError(f"Unknown fields for {type(self).__name__}: {sorted(unknown)}")
+
+    def __getitem__(self, key: str) -> Any:
+        slot = self.KEYS.get(key)
+        if slot is None:
+            raise KeyError(key)
+        return getattr(self, slot)
+
+    def __setitem__(self, key: str, value: Any):
+        slot = self.KEYS.get(key)
+        if slot is None:
+            raise KeyError(key)
+        setattr(self, slot, value)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __copy__(self):
+        clone = object.__new__(type(self))
+        for slot in self.__slots__:
+            setattr(clone, slot, getattr(self, slot))
+        return clone
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{key}={value!r}" for key, value in self.items() if value is not None)
+        return f"{type(self).__name__}({fields})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+
+class ROICMetrics(_Record):
+    """ROIC and quality metrics for one symbol"""
+
+    __slots__ = ("symbol", "provider", "date", "roic", "quality_score", "moat_rating",
+                 "fair_value", "margin_of_safety", "roic_5y_avg", "roic_trend")
+    KEYS = {slot: slot for slot in __slots__}
+    NUMERIC = ("roic", "quality_score", "fair_value", "margin_of_safety", "roic_5y_avg")
+
+
+class ROICForecast(_Record):
+    """Quality-based price forecast for one symbol"""
+
+    __slots__ = ("symbol", "current_price", "roic", "quality_score", "moat_rating",
+                 "implied_growth_rate", "target_1y", "target_2y", "target_3y")
+    KEYS = {
+        "symbol": "symbol",
+        "current_price": "current_price",
+        "roic": "roic",
+        "quality_score": "quality_score",
+        "moat_rating": "moat_rating",
+        "implied_growth_rate": "implied_growth_rate",
+        "1_year_target": "target_1y",
+        "2_year_target": "target_2y",
+        "3_year_target": "target_3y",
+    }
+    NUMERIC = ("current_price", "roic", "quality_score", "implied_growth_rate",
+               "1_year_target", "2_year_target", "3_year_target")
+
+
+class _Batch:
+    """
+    Column-oriented results: one array per field, one row per symbol
+    Numeric fields are float64 (NaN for missing), the rest object arrays.
+    """
+
+    RECORD = _Record
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    @classmethod
+    def empty(cls):
+        return cls.from_records([])
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping]):
+        records = list(records)
+        columns = {}
+        for key in cls.RECORD.KEYS:
+            values = [record.get(key) for record in records]
+            if key in cls.RECORD.NUMERIC:
+                columns[key] = np.array(
+                    [np.nan if value is None else value for value in values], dtype=float
+                )
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+                columns[key] = column
+        return cls(columns)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.columns[key]
+
+    def record(self, index: int):
+        """Materialise one row as a slotted record"""
+        values = {}
+        for key, column in self.columns.items():
+            value = column[index]
+            if key in self.RECORD.NUMERIC:
+                value = None if np.isnan(value) else float(value)
+            values[key] = value
+        return self.RECORD(**values)
+
+    def __iter__(self) -> Iterator[_Record]:
+        for index in range(len(self)):
+            yield self.record(index)
+
+    def symbols(self) -> List[str]:
+        return list(self.columns["symbol"])
+
+    def mask(self, keep: np.ndarray):
+        """New batch with the rows where keep is True"""
+        return type(self)({key: column[keep] for key, column in self.columns.items()})
+
+    def valid(self):
+        """Rows that have a ROIC value"""
+        return self.mask(~np.isnan(self.columns["roic"]))
+
+    def sort_by(self, key: str, descending: bool = True):
+        """New batch sorted on one column (missing values last)"""
+        column = self.columns[key]
+        if key in self.RECORD.NUMERIC:
+            order = np.argsort(np.where(np.isnan(column), -np.inf if descending else np.inf, column),
+                               kind='stable')
+        else:
+            order = np.argsort(column.astype(str), kind='stable')
+        if descending:
+            order = order[::-1]
+        return type(self)({name: values[order] for name, values in self.columns.items()})
+
+    def to_pandas(self):
+        """DataFrame backed by the batch arrays (no copy of numeric columns)"""
+        import pandas as pd
+        return pd.DataFrame(self.columns, copy=False)
+
+    def to_arrow(self, metadata: Dict[str, str] = None):
+        """pyarrow.Table of the batch (requires pyarrow)"""
+        import pyarrow as pa
+        table = pa.table({key: pa.array(column, from_pandas=True) for key, column in self.columns.items()})
+        return table.replace_schema_metadata(metadata) if metadata else table
+
+    def to_ipc(self, metadata: Dict[str, str] = None) -> bytes:
+        """Arrow IPC stream bytes (requires pyarrow)"""
+        import pyarrow as pa
+        table = self.to_arrow(metadata)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def to_parquet(self, metadata: Dict[str, str] = None) -> bytes:
+        """Parquet file bytes (requires pyarrow)"""
+        import pyarrow.parquet as pq
+        buffer = io.BytesIO()
+        pq.write_table(self.to_arrow(metadata), buffer)
+        return buffer.getvalue()
+
+    def to_columns(self) -> Dict[str, Any]:
+        """Column-oriented JSON-ready dict, missing values as None"""
+        data = {}
+        for key, column in self.columns.items():
+            if key in self.RECORD.NUMERIC:
+                data[key] = [None if np.isnan(value) else float(value) for value in column]
+            else:
+                data[key] = column.tolist()
+        return {"columns": list(self.columns), "count": len(self), "data": data}
+
+    def serialize(self, fmt: str = "json", errors: Dict[str, str] = None) -> Tuple[bytes, str]:
+        """
+        Encode as "arrow", "parquet" or "json", returning (body, media type)
+        Per-symbol errors travel in the schema metadata (Arrow/Parquet) or
+        an "errors" member (JSON).
+        """
+        errors = errors or {}
+        if fmt == "arrow":
+            return self.to_ipc({"errors": json.dumps(errors)}), MEDIA_TYPES["arrow"]
+        if fmt == "parquet":
+            return self.to_parquet({"errors": json.dumps(errors)}), MEDIA_TYPES["parquet"]
+        if fmt == "json":
+            # Same encoder as the backends' JSON responses (ROIC_JSON)
+            from roic_encoding import dumps
+            payload = self.to_columns()
+            payload["errors"] = errors
+            return dumps(payload), MEDIA_TYPES["json"]
+        raise ValueError(f"Unknown batch format: {fmt} (expected one of {', '.join(MEDIA_TYPES)})")
+
+    def __copy__(self):
+        return type(self)(dict(self.columns))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} symbols)"
+
+
+class MetricsBatch(_Batch):
+    """Metrics for many symbols"""
+
+    RECORD = ROICMetrics
+
+
+class ForecastBatch(_Batch):
+    """Forecasts for many symbols"""
+
+    RECORD = ROICForecast
+
+
+def to_batch(records: Iterable[Optional[Mapping]], batch_type=MetricsBatch):
+    """Build a batch from records, skipping None entries"""
+    return batch_type.from_records(record for record in records if record is not None)
+
+
+def read_batch(body: bytes, fmt: str = "json"):
+    """
+    Decode a serialized batch into (DataFrame, {symbol: error})
+    Arrow streams are read without copying the column buffers where
+    pandas allows it.
+    """
+    import pandas as pd
+    if fmt in ("arrow", "parquet"):
+        import pyarrow as pa
+        if fmt == "arrow":
+            table = pa.ipc.open_stream(body).read_all()
+        else:
+            import pyarrow.parquet as pq
+            table = pq.read_table(pa.BufferReader(body))
+        metadata = table.schema.metadata or {}
+        errors = json.loads(metadata.get(b"errors", b"{}"))
+        return table.to_pandas(), errors
+    if fmt == "json":
+        payload = json.loads(body)
+        frame = pd.DataFrame(payload["data"], columns=payload["columns"])
+        return frame, payload.get("errors", {})
+    raise ValueError(f"Unknown batch format: {fmt} (expected one of {', '.join(MEDIA_TYPES)})")
+
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+ROIC Market Scanner
+In-memory universe snapshot with rankings that are maintained one symbol
+at a time, so /market/movers answers from memory without sorting
+
+Each ranking is a sorted index of (-score, symbol) keys. Refreshing a
+symbol removes its old key and inserts the new one by binary search; the
+top K is then a slice of the first K keys. Unlike a heap, the sorted
+index also supports removing or re-scoring any symbol and reading the
+bottom of the ranking (e.g. biggest losers).
+"""
+
+import asyncio
+import math
+import os
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from roic_concurrency import bounded_as_completed
+
+# Symbols scanned when ROIC_SCAN_UNIVERSE is not set
+DEFAULT_UNIVERSE = (
+    "AAPL", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "TSLA", "AVGO", "ORCL", "ADBE",
+    "CRM", "CSCO", "INTC", "AMD", "QCOM", "TXN", "IBM", "NFLX", "V", "MA",
+    "JPM", "BAC", "WFC", "GS", "BRK-B", "JNJ", "PFE", "MRK", "ABBV", "LLY",
+    "UNH", "PG", "KO", "PEP", "COST", "WMT", "HD", "MCD", "NKE", "DIS",
+    "XOM", "CVX", "CAT", "DE", "HON", "GE", "UPS", "LIN", "TMO", "ACN",
+)
+
+# Ranking name -> ScanRow field it orders by (highest first)
+RANKINGS = {
+    "quality": "quality_score",
+    "roic": "roic",
+    "change": "change_percent",
+    "upside": "quality_upside",
+}
+
+
+def load_universe(spec: str = None) -> List[str]:
+    """
+    Symbols from ROIC_SCAN_UNIVERSE: a comma separated list, or the path
+    of a file with one symbol per line (# comments allowed)
+    """
+    spec = spec if spec is not None else os.environ.get('ROIC_SCAN_UNIVERSE', '')
+    if not spec.strip():
+        return list(DEFAULT_UNIVERSE)
+    path = os.path.expanduser(spec.strip())
+    if os.path.isfile(path):
+        with open(path, 'r') as f:
+            symbols = [line.split("#")[0].strip() for line in f]
+    else:
+        symbols = spec.split(",")
+    seen = {}
+    for symbol in symbols:
+        symbol = symbol.strip().upper()
+        if symbol:
+            seen[symbol] = None
+    return list(seen)
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+class ScanRow:
+    """Latest scan values for one symbol"""
+
+    __slots__ = ("symbol", "roic", "quality_score", "price", "change_percent",
+                 "target_1y", "upside", "quality_upside", "updated_at")
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.roic = None
+        self.quality_score = None
+        self.price = None
+        self.change_percent = None
+        self.target_1y = None
+        self.upside = None
+        self.quality_upside = None
+        self.updated_at = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class RankedIndex:
+    """Symbols ordered by one score, best first, updated one symbol at a time"""
+
+    def __init__(self):
+        self._keys: List[Tuple[float, str]] = []
+        self._by_symbol: Dict[str, Tuple[float, str]] = {}
+
+    def update(self, symbol: str, score: Optional[float]):
+        """Re-rank one symbol; a missing score drops it from the ranking"""
+        old = self._by_symbol.pop(symbol, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, old)]
+        if score is not None:
+            key = (-score, symbol)
+            insort(self._keys, key)
+            self._by_symbol[symbol] = key
+
+    def remove(self, symbol: str):
+        self.update(symbol, None)
+
+    def top(self, k: int) -> List[str]:
+        return [symbol for _, symbol in self._keys[:k]]
+
+    def bottom(self, k: int) -> List[str]:
+        return [symbol for _, symbol in reversed(self._keys[-k:])] if k > 0 else []
+
+    def rank(self, symbol: str) -> Optional[int]:
+        """1-based position of a symbol, None if unranked"""
+        key = self._by_symbol.get(symbol)
+        return bisect_left(self._keys, key) + 1 if key is not None else None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class MarketScanner:
+    """
+    Universe snapshot plus incrementally maintained rankings
+
+    A background loop re-scans the universe every ROIC_SCAN_INTERVAL
+    seconds (default 300) with ROIC_SCAN_CONCURRENCY symbols in flight
+    (default 8). Each finished symbol updates the rankings immediately,
+    so results improve while a pass is still running.
+    """
+
+    def __init__(self, provider, universe: Iterable[str] = None,
+                 interval: float = None, concurrency: int = None):
+        self.provider = provider
+        self.universe = list(universe) if universe is not None else load_universe()
+        self.interval = interval or float(os.environ.get('ROIC_SCAN_INTERVAL', '300'))
+        self.concurrency = concurrency or int(os.environ.get('ROIC_SCAN_CONCURRENCY', '8'))
+        self.rows: Dict[str, ScanRow] = {}
+        self.indexes = {name: RankedIndex() for name in RANKINGS}
+        self._task: Optional[asyncio.Task] = None
+        self.passes = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.last_pass_seconds: Optional[float] = None
+
+    # ---- snapshot ----
+
+    def update(self, symbol: str, **values):
+        """Set fields for a symbol, recompute derived scores and re-rank it"""
+        row = self.rows.get(symbol)
+        if row is None:
+            row = self.rows[symbol] = ScanRow(symbol)
+        for field, value in values.items():
+            setattr(row, field, _number(value))
+
+        if row.price and row.target_1y:
+            row.upside = (row.target_1y / row.price - 1) * 100
+            # Upside discounted by business quality: a 20% upside on a
+            # quality-50 name ranks with a 10% upside on a quality-100 one
+            row.quality_upside = row.upside * (row.quality_score or 0) / 100
+        else:
+            row.upside = row.quality_upside = None
+        row.updated_at = time.time()
+
+        for name, field in RANKINGS.items():
+            self.indexes[name].update(symbol, getattr(row, field))
+
+    def remove(self, symbol: str):
+        self.rows.pop(symbol, None)
+        for index in self.indexes.values():
+            index.remove(symbol)
+
+    def top(self, by: str = "quality", limit: int = 10, ascending: bool = False) -> List[ScanRow]:
+        """Best (or, ascending, worst) `limit` rows of a ranking"""
+        index = self.indexes.get(by)
+        if index is None:
+            raise ValueError(f"Unknown ranking '{by}', use one of {', '.join(RANKINGS)}")
+        symbols = index.bottom(limit) if ascending else index.top(limit)
+        return [self.rows[symbol] for symbol in symbols]
+
+    # ---- refresh ----
+
+    async def refresh(self, symbol: str):
+        """Fetch one symbol's forecast and quote, then re-rank it"""
+        forecast, quote = await asyncio.gather(
+            self.provider.aget_forecast(symbol),
+            self.provider.aget_quote(symbol)
+        )
+        price = getattr(quote, 'last_price', None) if quote is not None else None
+        prev_close = getattr(quote, 'prev_close', None) if quote is not None else None
+        if price and prev_close:
+            change = (price / prev_close - 1) * 100
+        else:
+            change = getattr(quote, 'change_percent', None) if quote is not None else None
+
+        self.update(
+            symbol,
+            roic=forecast.get("roic"),
+            quality_score=forecast.get("quality_score"),
+            price=price or forecast.get("current_price"),
+            change_percent=change,
+            target_1y=forecast.get("1_year_target")
+        )
+
+    async def scan_once(self):
+        """One pass over the universe"""
+        started = time.perf_counter()
+        async for symbol, result in bounded_as_completed(self.refresh, self.universe, self.concurrency):
+            if isinstance(result, Exception):
+                self.failed += 1
+                print(f"Scan error ({symbol}): {str(result)[:100]}")
+            else:
+                self.refreshed += 1
+        for symbol in [symbol for symbol in self.rows if symbol not in self.universe]:
+            self.remove(symbol)
+        self.passes += 1
+        self.last_pass_seconds = time.perf_counter() - started
+
+    async def _run(self):
+        while True:
+            try:
+                await self.scan_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Scan pass failed: {str(e)[:100]}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "universe": len(self.universe),
+            "scanned": len(self.rows),
+            "passes": self.passes,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "last_pass_seconds": self.last_pass_seconds,
+            "ranked": {name: len(index) for name, index in self.indexes.items()}
+        }
+
+    def collect_metrics(self):
+        """Scrape-time /metrics families for the universe scan"""
+        stats = self.stats()
+        yield ("roic_scanner_running", "gauge", "1 while the background scan loop runs",
+               [({}, int(stats["running"]))])
+        yield ("roic_scanner_universe", "gauge", "Symbols in the scanned universe", [({}, stats["universe"])])
+        yield ("roic_scanner_scanned", "gauge", "Symbols with a current scan row", [({}, stats["scanned"])])
+        yield ("roic_scanner_passes_total", "counter", "Completed passes over the universe", [({}, stats["passes"])])
+        yield ("roic_scanner_refreshes_total", "counter", "Symbol refreshes by outcome", [
+            ({"result": "ok"}, stats["refreshed"]), ({"result": "failed"}, stats["failed"])
+        ])
+        yield ("roic_scanner_last_pass_seconds", "gauge", "Duration of the last completed pass",
+               [({}, stats["last_pass_seconds"])])
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+ROIC Quality Scoring Engine
+Vectorized quality score, moat, implied growth and price targets from
+shared threshold tables
+
+Every entry point (provider, CLI, backends, master forecast, historical
+display) reads the same tables below, so a threshold change is one edit
+and rescoring a whole universe is a single NumPy pass.
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# ROIC tier boundaries (%); a value must be strictly greater than a bound
+# to reach the next tier, matching the original if/elif ladders
+ROIC_TIER_BOUNDS = np.array([5.0, 10.0, 15.0, 20.0, 30.0])
+
+# Per-tier tables, index 0 = ROIC <= 5% ... index 5 = ROIC > 30%
+QUALITY_SCORES = np.array([30, 50, 65, 75, 85, 95])
+QUALITY_LABELS = np.array([
+    "⭐ Poor",
+    "⭐⭐ Fair",
+    "⭐⭐⭐ Good",
+    "⭐⭐⭐⭐ Very Good",
+    "⭐⭐⭐⭐⭐ Excellent",
+    "⭐⭐⭐⭐⭐ Exceptional",
+], dtype=object)
+INVESTMENT_GRADES = np.array([
+    "D (Low quality)",
+    "C (Below average)",
+    "B (Average quality)",
+    "B+ (Good quality)",
+    "A (High quality)",
+    "A+ (Premium business)",
+], dtype=object)
+MOAT_RATINGS = np.array(["None", "None", "None", "Narrow", "Wide", "Wide"], dtype=object)
+IMPLIED_GROWTH = np.array([5.0, 7.0, 10.0, 12.0, 15.0, 18.0])
+CONFIDENCE_LEVELS = np.array(["Low", "Low", "Low", "Medium", "Medium-High", "High"], dtype=object)
+FORECAST_RATINGS = np.array(["Neutral", "Neutral", "Neutral", "Hold", "Buy", "Strong Buy"], dtype=object)
+
+# Letter grades from quality score (score >= bound reaches the next grade)
+SCORE_GRADE_BOUNDS = np.array([50, 60, 70, 80, 90])
+SCORE_GRADES = np.array(["D", "C", "B", "B+", "A", "A+"], dtype=object)
+
+# Combined score = quality * QUALITY_WEIGHT + P/E score * (1 - QUALITY_WEIGHT)
+QUALITY_WEIGHT = 0.6
+NEUTRAL_PE_SCORE = 50.0
+
+TARGET_YEARS = (1, 2, 3)
+
+
+def _as_float(values) -> np.ndarray:
+    """Array of floats with None mapped to NaN"""
+    return np.asarray(values if values is not None else [], dtype=float)
+
+
+def roic_tiers(roic) -> np.ndarray:
+    """Tier index (0-5) per ROIC value, -1 where ROIC is missing"""
+    roic = _as_float(roic)
+    tiers = np.searchsorted(ROIC_TIER_BOUNDS, roic, side='left')
+    return np.where(np.isnan(roic), -1, tiers)
+
+
+def _lookup(table: np.ndarray, tiers: np.ndarray, missing: Any) -> np.ndarray:
+    out = table[np.clip(tiers, 0, None)]
+    if out.dtype == object:
+        out = out.copy()
+        out[tiers < 0] = missing
+        return out
+    return np.where(tiers < 0, missing, out)
+
+
+def score_grades(scores) -> np.ndarray:
+    """Letter grade per quality score, None where missing"""
+    scores = _as_float(scores)
+    grades = SCORE_GRADES[np.searchsorted(SCORE_GRADE_BOUNDS, np.nan_to_num(scores), side='right')]
+    grades[np.isnan(scores)] = None
+    return grades
+
+
+def pe_scores(pe) -> np.ndarray:
+    """Valuation score from P/E: lower is better, neutral when unknown/negative"""
+    pe = _as_float(pe)
+    return np.where(pe > 0, np.maximum(0.0, 100.0 - pe * 2), NEUTRAL_PE_SCORE)
+
+
+def score_universe(roic, pe=None, price=None) -> Dict[str, np.ndarray]:
+    """
+    Score many symbols in one vectorized pass
+
+    roic, pe and price are equally long array-likes (None/NaN for missing).
+    Returns a dict of arrays: tier, quality_score, quality_label,
+    investment_grade, grade, moat_rating, implied_growth_rate, and when
+    price is given 1/2/3_year_target, when pe is given combined_score.
+    """
+    tiers = roic_tiers(roic)
+    quality = _lookup(QUALITY_SCORES.astype(float), tiers, np.nan)
+    growth = _lookup(IMPLIED_GROWTH, tiers, np.nan)
+
+    result = {
+        "tier": tiers,
+        "quality_score": quality,
+        "quality_label": _lookup(QUALITY_LABELS, tiers, "N/A"),
+        "investment_grade": _lookup(INVESTMENT_GRADES, tiers, "N/A"),
+        "grade": score_grades(quality),
+        "moat_rating": _lookup(MOAT_RATINGS, tiers, "Unknown"),
+        "implied_growth_rate": growth,
+        "confidence_level": _lookup(CONFIDENCE_LEVELS, tiers, None),
+        "forecast_rating": _lookup(FORECAST_RATINGS, tiers, "N/A"),
+    }
+
+    if price is not None:
+        price = _as_float(price)
+        factor = 1 + growth / 100
+        for years in TARGET_YEARS:
+            result[f"{years}_year_target"] = price * factor ** years
+
+    if pe is not None:
+        result["combined_score"] = quality * QUALITY_WEIGHT + pe_scores(pe) * (1 - QUALITY_WEIGHT)
+
+    return result
+
+
+def rescore(df, roic_col: str = "roic", pe_col: str = None, price_col: str = None):
+    """Return a copy of a DataFrame with every score column recomputed"""
+    df = df.copy()
+    scores = score_universe(
+        df[roic_col].to_numpy(dtype=float),
+        pe=df[pe_col].to_numpy(dtype=float) if pe_col else None,
+        price=df[price_col].to_numpy(dtype=float) if price_col else None
+    )
+    for column, values in scores.items():
+        df[column] = values
+    return df
+
+
+# ============= Scalar helpers (same tables, one value) =============
+
+def _tier(roic: Optional[float]) -> int:
+    if roic is None:
+        return -1
+    return int(roic_tiers([roic])[0])
+
+
+def quality_score(roic: Optional[float]) -> Optional[int]:
+    """Quality score (30-95) for a single ROIC, None when missing"""
+    tier = _tier(roic)
+    return int(QUALITY_SCORES[tier]) if tier >= 0 else None
+
+
+def quality_label(roic: Optional[float]) -> str:
+    """Star rating label for a single ROIC"""
+    tier = _tier(roic)
+    return QUALITY_LABELS[tier] if tier >= 0 else "N/A"
+
+
+def investment_grade(roic: Optional[float]) -> str:
+    """Investment grade description for a single ROIC"""
+    tier = _tier(roic)
+    return INVESTMENT_GRADES[tier] if tier >= 0 else "N/A"
+
+
+def moat_rating(roic: Optional[float]) -> str:
+    """Wide/Narrow/None moat for a single ROIC"""
+    tier = _tier(roic)
+    return MOAT_RATINGS[tier] if tier >= 0 else "Unknown"
+
+
+def implied_growth(roic: Optional[float], default: Optional[float] = None) -> Optional[float]:
+    """Quality-implied annual growth rate (%) for a single ROIC"""
+    tier = _tier(roic)
+    return int(IMPLIED_GROWTH[tier]) if tier >= 0 else default
+
+
+def confidence(roic: Optional[float]) -> Optional[tuple]:
+    """(confidence level, forecast rating) for a single ROIC"""
+    tier = _tier(roic)
+    return (CONFIDENCE_LEVELS[tier], FORECAST_RATINGS[tier]) if tier >= 0 else None
+
+
+def score_grade(score: Optional[float]) -> str:
+    """Letter grade for a single quality score"""
+    if score is None:
+        return "N/A"
+    return score_grades([score])[0]
+
+
+def combined_score(quality: Optional[float], pe: Optional[float]) -> Optional[float]:
+    """Quality/valuation blend for a single symbol"""
+    if quality is None:
+        return None
+    return float(quality * QUALITY_WEIGHT + pe_scores([pe])[0] * (1 - QUALITY_WEIGHT))
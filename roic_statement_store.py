@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+ROIC Statement Store
+Persistent on-disk cache of financial statements with fiscal-period-aware staleness
+
+Statements only change when a company files, so instead of a blanket TTL a
+stored statement stays fresh until its last period_ending plus the period
+length and the expected filing lag. Once a filing is overdue the network is
+re-checked at most once per recheck interval.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from roic_data_sources import Record, get_data_source, to_date, to_dict, to_record
+
+DEFAULT_CACHE_DIR = os.path.expanduser(os.environ.get('ROIC_CACHE_DIR', '~/.openbb/roic_cache'))
+
+# Days between consecutive period ends
+PERIOD_LENGTH_DAYS = {
+    "annual": 365,
+    "quarter": 91,
+}
+
+# Days after period end before the filing usually shows up in the data feeds
+FILING_LAG_DAYS = {
+    "annual": 90,
+    "quarter": 45,
+}
+
+# Rows come back as the same attribute-access records the data sources use
+StatementRecord = Record
+
+# Upsert condition: the stored row has the same latest period and at least
+# as much history (as many records, or the same count from a full fetch)
+KEEP_STORED_SQL = """(
+    statements.last_period_ending IS excluded.last_period_ending
+    AND (json_array_length(statements.records) > json_array_length(excluded.records)
+         OR (json_array_length(statements.records) = json_array_length(excluded.records)
+             AND statements.fetched_limit IS NULL))
+)"""
+
+
+class StatementStore:
+    """
+    SQLite-backed financial statement store
+
+    One row per (symbol, statement, provider, period) holding the JSON
+    encoded records plus the bookkeeping needed to decide staleness.
+    """
+
+    def __init__(self, path: str = None, recheck_interval: float = None, fallback_ttl: float = None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "statements.db")
+        # Seconds between network re-checks once a filing is overdue
+        self.recheck_interval = recheck_interval if recheck_interval is not None else \
+            float(os.environ.get('ROIC_STATEMENT_RECHECK', str(24 * 3600)))
+        # Used only when records carry no period_ending
+        self.fallback_ttl = fallback_ttl if fallback_ttl is not None else 7 * 24 * 3600
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS statements (
+                    symbol TEXT NOT NULL,
+                    statement TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    records TEXT NOT NULL,
+                    last_period_ending TEXT,
+                    fetched_limit INTEGER,
+                    fetched_at REAL NOT NULL,
+                    checked_at REAL NOT NULL,
+                    PRIMARY KEY (symbol, statement, provider, period)
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, WAL mode so readers never block"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def expected_next_filing(self, last_period_ending: date, period: str = 'annual') -> date:
+        """Date after which a newer statement should be available"""
+        length = PERIOD_LENGTH_DAYS.get(period, PERIOD_LENGTH_DAYS["annual"])
+        lag = FILING_LAG_DAYS.get(period, FILING_LAG_DAYS["annual"])
+        return last_period_ending + timedelta(days=length + lag)
+
+    def _is_fresh(self, row: sqlite3.Row, period: str, now: float) -> bool:
+        last_period_ending = to_date(row["last_period_ending"])
+        if last_period_ending is None:
+            return now - row["fetched_at"] < self.fallback_ttl
+
+        if date.today() < self.expected_next_filing(last_period_ending, period):
+            return True
+
+        # Filing overdue - only hit the network once per recheck interval
+        return now - row["checked_at"] < self.recheck_interval
+
+    def _row(self, symbol: str, statement: str, provider: str, period: str) -> Optional[sqlite3.Row]:
+        return self._connect().execute(
+            "SELECT * FROM statements WHERE symbol=? AND statement=? AND provider=? AND period=?",
+            (symbol, statement, provider, period)
+        ).fetchone()
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, symbol: str, statement: str, provider: str = 'yfinance', period: str = 'annual',
+            limit: int = None, allow_stale: bool = False) -> Optional[List[StatementRecord]]:
+        """
+        Return stored records, or None if missing/stale/too short for limit
+        A full-history request (limit None) is only served from a full fetch.
+        """
+        row = self._row(symbol, statement, provider, period)
+        if row is None:
+            self._count(False)
+            return None
+
+        records = json.loads(row["records"])
+        fetched_limit = row["fetched_limit"]
+        if limit is None:
+            covers_limit = fetched_limit is None
+        else:
+            covers_limit = len(records) >= limit or fetched_limit is None or fetched_limit >= limit
+        if not allow_stale and (not covers_limit or not self._is_fresh(row, period, time.time())):
+            self._count(False)
+            return None
+
+        self._count(True)
+        records = [to_record(r) for r in records]
+        return records[:limit] if limit else records
+
+    def put(self, symbol: str, statement: str, records: List[Any], provider: str = 'yfinance',
+            period: str = 'annual', limit: int = None):
+        """
+        Store records, keeping the original fetch time if nothing new was filed
+        For the same latest period, a shorter fetch (smaller limit) never
+        replaces a longer stored history.
+        """
+        rows = [to_dict(r) for r in records]
+        period_endings = [to_date(r.get("period_ending")) for r in rows]
+        period_endings = [p for p in period_endings if p is not None]
+        last_period_ending = max(period_endings).isoformat() if period_endings else None
+        now = time.time()
+
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                INSERT INTO statements
+                    (symbol, statement, provider, period, records, last_period_ending,
+                     fetched_limit, fetched_at, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (symbol, statement, provider, period) DO UPDATE SET
+                    records=CASE WHEN {keep_stored} THEN statements.records ELSE excluded.records END,
+                    fetched_limit=CASE WHEN {keep_stored} THEN statements.fetched_limit
+                        ELSE excluded.fetched_limit END,
+                    checked_at=excluded.checked_at,
+                    fetched_at=CASE
+                        WHEN statements.last_period_ending IS excluded.last_period_ending
+                        THEN statements.fetched_at ELSE excluded.fetched_at END,
+                    last_period_ending=excluded.last_period_ending
+            """.format(keep_stored=KEEP_STORED_SQL), (symbol, statement, provider, period, json.dumps(rows, default=str),
+                  last_period_ending, limit, now, now))
+
+    def invalidate(self, symbol: str = None):
+        """Drop one symbol's statements, or the whole store"""
+        conn = self._connect()
+        with conn:
+            if symbol is None:
+                conn.execute("DELETE FROM statements")
+            else:
+                conn.execute("DELETE FROM statements WHERE symbol=?", (symbol.upper(),))
+
+    def stats(self) -> Dict[str, Any]:
+        """Store size and hit/miss counters"""
+        count = self._connect().execute("SELECT COUNT(*) FROM statements").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / total) if total else 0.0
+        }
+
+
+_default_store: Optional[StatementStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_statement_store() -> StatementStore:
+    """Process-wide statement store under ~/.openbb/roic_cache"""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = StatementStore()
+    return _default_store
+
+
+def fetch_statement(symbol: str, statement: str, provider: str = 'yfinance', period: str = 'annual',
+                    limit: int = None, store: StatementStore = None) -> List[Any]:
+    """
+    Get income/balance statements, touching the network only when stale
+
+    statement is 'income' or 'balance'.
+    """
+    store = store or get_statement_store()
+    symbol = symbol.strip().upper()
+
+    records = store.get(symbol, statement, provider, period, limit)
+    if records is not None:
+        return records
+
+    try:
+        source = get_data_source()
+        results = getattr(source, statement)(symbol, provider=provider, period=period, limit=limit)
+    except Exception:
+        # Serve whatever we have rather than nothing when the upstream fails
+        stale = store.get(symbol, statement, provider, period, limit, allow_stale=True)
+        if stale is not None:
+            return stale
+        raise
+
+    if results:
+        store.put(symbol, statement, results, provider, period, limit)
+    return results
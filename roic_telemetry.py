@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+ROIC Telemetry
+Prometheus-style counters, gauges and latency histograms for the
+backends, the MCP server and every upstream call site
+
+Metrics are rendered in the Prometheus text exposition format (0.0.4) by
+the /metrics routes, without needing prometheus_client. Modules that own
+runtime state (caches, worker pools, request coalescing) register
+collectors that are read at scrape time, so nothing is double-counted.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans cache hits (~ms) to slow upstream round-trips
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# A collector returns metric families:
+# (name, type, help, [(labels, value), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """Metrics and scrape-time collectors rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Telemetry collector error: {str(e)[:100]}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("", self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self._lock:
+            return [("", self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Bucketed observations with _bucket/_sum/_count series"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., +Inf count, sum]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                out.append(("_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            out.append(("_sum", labels, state[-1]))
+            out.append(("_count", labels, cumulative))
+        return out
+
+
+def add_collector(collector: Callable[[], Iterable[Family]]):
+    """Register a scrape-time collector on the default registry"""
+    REGISTRY.add_collector(collector)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ============= Caches =============
+
+_caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]) -> str:
+    """
+    Export a cache's stats() as roic_cache_* series labelled cache=<name>
+    Returns the label used (suffixed if the name is already taken).
+    """
+    label, n = name, 1
+    while label in _caches and _caches[label] != stats:
+        n += 1
+        label = f"{name}_{n}"
+    _caches[label] = stats
+    return label
+
+
+def _collect_caches() -> Iterable[Family]:
+    rows = []
+    for name, stats in list(_caches.items()):
+        try:
+            rows.append((name, stats()))
+        except Exception as e:
+            print(f"Telemetry cache stats error ({name}): {str(e)[:100]}")
+    series = (
+        ("roic_cache_hits_total", "counter", "Cache lookups answered from the cache", "hits"),
+        ("roic_cache_misses_total", "counter", "Cache lookups that missed", "misses"),
+        ("roic_cache_evictions_total", "counter", "Entries evicted to stay under the size cap", "evictions"),
+        ("roic_cache_entries", "gauge", "Entries currently cached", "entries"),
+        ("roic_cache_hit_ratio", "gauge", "hits / (hits + misses) since start", "hit_ratio"),
+    )
+    for name, kind, help_text, field in series:
+        yield name, kind, help_text, [
+            ({"cache": cache, "backend": stats.get("backend", "memory")}, stats.get(field))
+            for cache, stats in rows
+        ]
+
+
+REGISTRY.add_collector(_collect_caches)
+
+
+# ============= Upstream calls =============
+
+UPSTREAM_LATENCY = Histogram(
+    "roic_upstream_request_duration_seconds",
+    "Latency of calls to data upstreams (roic.ai, yfinance, polygon, finviz, fred, ...)",
+    ("upstream", "operation")
+)
+UPSTREAM_ERRORS = Counter(
+    "roic_upstream_errors_total",
+    "Failed upstream calls (exceptions and error responses)",
+    ("upstream", "operation")
+)
+
+
+@contextmanager
+def upstream_call(upstream: str, operation: str):
+    """Time one upstream call; an exception also counts as an error"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(upstream=upstream, operation=operation)
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, upstream=upstream, operation=operation)
+
+
+def record_upstream_error(upstream: str, operation: str):
+    """Count an upstream failure that did not raise (e.g. an HTTP 5xx)"""
+    UPSTREAM_ERRORS.inc(upstream=upstream, operation=operation)
+
+
+# ============= HTTP requests =============
+
+HTTP_LATENCY = Histogram(
+    "roic_http_request_duration_seconds",
+    "Request latency per route, including response cache hits",
+    ("app", "method", "route", "status")
+)
+HTTP_IN_FLIGHT = Gauge(
+    "roic_http_requests_in_flight",
+    "Requests currently being served",
+    ("app",)
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and in-flight requests per route
+
+    Routes are labelled with their path template ("/api/v1/roic/metrics/{symbol}")
+    so symbols do not explode the label set; pass the app's router so
+    requests answered before routing (response cache hits) are labelled too.
+    """
+
+    def __init__(self, app, app_name: str, router=None):
+        self.app = app
+        self.app_name = app_name
+        self.router = router
+
+    def _route(self, scope) -> str:
+        route = scope.get("route")
+        if route is None and self.router is not None:
+            from starlette.routing import Match
+            for candidate in self.router.routes:
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    route = candidate
+                    break
+        return getattr(route, "path", None) or "<unmatched>"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(app=self.app_name)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(app=self.app_name)
+            HTTP_LATENCY.observe(
+                time.perf_counter() - start,
+                app=self.app_name, method=scope["method"],
+                route=self._route(scope), status=status["code"]
+            )
+
+
+def metrics_response():
+    """Starlette response with the current metrics"""
+    from starlette.responses import Response
+    return Response(render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+History Update Tester
+Checks which rows update_history persists: statement years are stored,
+current-year estimates and fiscal years whose calendar year has not
+closed yet are returned but never written to the history store
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import date
+
+# Isolated caches and stores for this run
+WORK_DIR = tempfile.mkdtemp(prefix="roic_history_test_")
+os.environ['ROIC_CACHE_DIR'] = WORK_DIR
+os.environ['ROIC_HISTORY_DIR'] = os.path.join(WORK_DIR, "history")
+
+from roic_data_sources import FixtureDataSource, set_data_source
+from roic_history_store import HistoryStore
+from roic_historical import update_history
+
+CURRENT_YEAR = date.today().year
+
+
+class NoStatementsSource(FixtureDataSource):
+    """Fixtures, except that statements for EST fail like an upstream outage"""
+
+    def income(self, symbol, *args, **kwargs):
+        if symbol.upper() == "EST":
+            raise ConnectionError("statements unavailable")
+        return super().income(symbol, *args, **kwargs)
+
+    def balance(self, symbol, *args, **kwargs):
+        if symbol.upper() == "EST":
+            raise ConnectionError("statements unavailable")
+        return super().balance(symbol, *args, **kwargs)
+
+
+def write_fixture(root: str, dataset: str, symbol: str, rows: list):
+    os.makedirs(os.path.join(root, dataset), exist_ok=True)
+    with open(os.path.join(root, dataset, f"{symbol}.json"), 'w') as f:
+        json.dump(rows, f)
+
+
+def build_fixtures(root: str):
+    # EST: only key metrics, and without return_on_equity
+    write_fixture(root, "metrics", "EST", [{"symbol": "EST", "profit_margin": 0.2}])
+
+    # JUN: June fiscal years up to the current one, monthly closes until now
+    years = range(CURRENT_YEAR - 3, CURRENT_YEAR + 1)
+    write_fixture(root, "income", "JUN", [
+        {"period_ending": f"{year}-06-30", "total_revenue": 1000.0 + year, "operating_income": 200.0,
+         "net_income": 150.0}
+        for year in reversed(years)
+    ])
+    write_fixture(root, "balance", "JUN", [
+        {"period_ending": f"{year}-06-30", "total_assets": 1000.0, "current_liabilities": 200.0}
+        for year in reversed(years)
+    ])
+    months = [(year, month) for year in range(CURRENT_YEAR - 4, CURRENT_YEAR + 1) for month in range(1, 13)
+              if date(year, month, 1) <= date.today()]
+    write_fixture(root, "price_history", "JUN", [
+        {"date": f"{year}-{month:02d}-01", "open": 10.0, "high": 10.0, "low": 10.0, "close": 10.0 + month,
+         "volume": 1.0}
+        for year, month in months
+    ])
+
+
+def test_estimates_not_stored(store: HistoryStore):
+    """Estimated rows are returned but neither stored nor marked as covered"""
+    df = update_history(["EST"], years=5, store=store)
+    assert (("EST", CURRENT_YEAR)) in df.index, df
+    assert df.loc[("EST", CURRENT_YEAR), "profit_margin"] == 20.0
+    assert not store.stored_years(["EST"]).get("EST"), store.stored_years(["EST"])
+    assert "EST" not in store.covered_from(["EST"]), store.covered_from(["EST"])
+
+
+def test_open_calendar_year_not_stored(store: HistoryStore):
+    """Fiscal years of the current calendar year are returned but not stored"""
+    df = update_history(["JUN"], years=5, store=store)
+    stored = store.stored_years(["JUN"]).get("JUN", set())
+    assert CURRENT_YEAR not in stored, stored
+    assert CURRENT_YEAR - 1 in stored, stored
+    assert ("JUN", CURRENT_YEAR) in df.index, df
+    assert df.loc[("JUN", CURRENT_YEAR - 1), "calendar_year_end_price"] == 22.0
+    # A second run still recomputes the open year instead of reading a frozen row
+    again = update_history(["JUN"], years=5, store=store)
+    assert ("JUN", CURRENT_YEAR) in again.index
+    assert CURRENT_YEAR not in store.stored_years(["JUN"]).get("JUN", set())
+
+
+def main():
+    build_fixtures(os.path.join(WORK_DIR, "fixtures"))
+    set_data_source(NoStatementsSource(os.path.join(WORK_DIR, "fixtures")))
+    store = HistoryStore(os.path.join(WORK_DIR, "history"))
+
+    tests = [test_estimates_not_stored, test_open_calendar_year_not_stored]
+    failed = 0
+    for test in tests:
+        try:
+            test(store)
+            print(f"✅ {test.__doc__}")
+        except BaseException as e:
+            failed += 1
+            print(f"❌ {test.__doc__}: {type(e).__name__} {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
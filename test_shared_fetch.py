@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Shared Upstream Fetch Cancellation Tester
+Checks that cancelling one caller of ROICProvider._shared does not cancel
+the queued upstream job the other callers are waiting on
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+# One worker, so the shared job is still queued when a caller gives up
+os.environ['ROIC_UPSTREAM_WORKERS_SHARED_TEST'] = '1'
+
+from openbb_roic_provider import ROICProvider
+
+
+async def test_queued_job_survives_cancel():
+    """Other callers still get the result when one caller of a queued job is cancelled"""
+    provider, release, calls = ROICProvider(), threading.Event(), []
+
+    def blocker():
+        release.wait(5)
+
+    def fetch(value):
+        calls.append(value)
+        return {"value": value}
+
+    busy = asyncio.ensure_future(provider._shared(("busy",), "shared-test", blocker))
+    await asyncio.sleep(0.01)
+    first = asyncio.ensure_future(provider._shared(("quote", "AAPL"), "shared-test", fetch, "shared"))
+    second = asyncio.ensure_future(provider._shared(("quote", "AAPL"), "shared-test", fetch, "shared"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.sleep(0.01)
+    release.set()
+    assert await second == {"value": "shared"}
+    assert first.cancelled(), "cancelled caller should see its own cancellation"
+    assert calls == ["shared"], f"expected one upstream call, got {calls}"
+    await busy
+
+
+async def test_errors_shared():
+    """An upstream error still reaches every caller of the shared job"""
+    provider = ROICProvider()
+
+    def failing():
+        raise ValueError("upstream down")
+
+    results = await asyncio.gather(
+        *(provider._shared(("quote", "TSLA"), "shared-test", failing) for _ in range(3)),
+        return_exceptions=True
+    )
+    assert all(isinstance(r, ValueError) for r in results), results
+
+
+def main():
+    tests = [test_queued_job_survives_cancel, test_errors_shared]
+    failed = 0
+    for test in tests:
+        try:
+            asyncio.run(test())
+            print(f"✅ {test.__doc__}")
+        except BaseException as e:
+            failed += 1
+            print(f"❌ {test.__doc__}: {type(e).__name__} {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
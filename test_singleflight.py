@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+SingleFlight Cancellation Tester
+Checks that cancelling one caller of a coalesced fetch does not cancel
+the other callers sharing it
+"""
+
+import asyncio
+import sys
+
+from roic_concurrency import SingleFlight
+
+
+async def slow_fetch(calls: list, value: str, delay: float = 0.05) -> dict:
+    calls.append(value)
+    await asyncio.sleep(delay)
+    return {"value": value}
+
+
+async def test_leader_cancelled():
+    """Follower still gets the result when the leader's caller is cancelled"""
+    flight, calls = SingleFlight(), []
+    leader = asyncio.ensure_future(flight.do("AAPL", slow_fetch, calls, "shared"))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("AAPL", slow_fetch, calls, "shared"))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    result = await follower
+    assert leader.cancelled(), "leader caller should see its own cancellation"
+    assert result == {"value": "shared"}, result
+    assert calls == ["shared"], f"expected one upstream call, got {calls}"
+
+
+async def test_follower_cancelled():
+    """Leader and other followers still get the result when one follower is cancelled"""
+    flight, calls = SingleFlight(), []
+    leader = asyncio.ensure_future(flight.do("MSFT", slow_fetch, calls, "shared"))
+    await asyncio.sleep(0)
+    quitter = asyncio.ensure_future(flight.do("MSFT", slow_fetch, calls, "shared"))
+    stayer = asyncio.ensure_future(flight.do("MSFT", slow_fetch, calls, "shared"))
+    await asyncio.sleep(0.01)
+    quitter.cancel()
+    assert await leader == {"value": "shared"}
+    assert await stayer == {"value": "shared"}
+    assert calls == ["shared"], f"expected one upstream call, got {calls}"
+
+
+async def test_run_cancelled():
+    """Followers retry when the shared run itself is cancelled"""
+    flight, calls = SingleFlight(), []
+
+    async def fetch():
+        calls.append("run")
+        if len(calls) == 1:
+            asyncio.current_task().cancel()
+        await asyncio.sleep(0.01)
+        return "fresh"
+
+    leader = asyncio.ensure_future(flight.do("NVDA", fetch))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("NVDA", fetch))
+    assert await follower == "fresh"
+    assert leader.done() and leader.cancelled()
+    assert calls == ["run", "run"], calls
+    assert flight.in_flight() == 0
+
+
+async def test_errors_shared():
+    """An upstream error still reaches every caller"""
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    results = await asyncio.gather(*(flight.do("TSLA", failing) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results), results
+    assert flight.stats()["leaders"] == 1
+
+
+def main():
+    tests = [test_leader_cancelled, test_follower_cancelled, test_run_cancelled, test_errors_shared]
+    failed = 0
+    for test in tests:
+        try:
+            asyncio.run(test())
+            print(f"✅ {test.__doc__}")
+        except BaseException as e:
+            failed += 1
+            print(f"❌ {test.__doc__}: {type(e).__name__} {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())